@@ -0,0 +1,250 @@
+"""
+Live operations dashboard for admins
+Socket.IO namespace /admin: admins join the dashboard room and receive the
+current aggregates (orders by status, orders waiting for manual vendor
+assignment, in-store orders waiting for cash approval, print queue depth,
+vendors online) instead of polling the order lists.
+
+Aggregates are kept up to date from order, in-store and print-queue
+transitions as they happen. Pushes are throttled to one per interval. Each
+worker only sees its own transitions, so while admins are connected to a
+worker it reloads the counts from the database every resync interval to pick
+up the rest. Every worker publishes the vendors connected to it in
+worker_presence, and vendors online is the union over all live workers.
+"""
+
+from typing import Dict, Any, Optional, Callable, Awaitable, Iterable, Set
+from collections import Counter
+from datetime import datetime, timezone, timedelta
+from jose import jwt, JWTError
+import asyncio
+import logging
+import time
+import uuid
+import socketio
+from socketio.exceptions import ConnectionRefusedError
+from auth import SECRET_KEY, ALGORITHM
+from models import OrderStatus, UserRole
+from notifications import load_notification_settings
+import socketio_manager
+from socketio_manager import sio
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "/admin"
+ROOM = "dashboard"
+ADMIN_ROLES = {UserRole.SUPER_ADMIN.value, UserRole.SUPERVISOR.value}
+# Orders in these states do not move again, so their ids need not be remembered
+FINAL_STATUSES = {OrderStatus.DELIVERED.value, OrderStatus.PICKED_UP.value, OrderStatus.CANCELLED.value}
+PRINT_QUEUE_OPEN = ["queued", "processing"]
+
+SETTINGS = load_notification_settings().get('adminDashboard', {})
+
+class OperationsDashboard:
+    """Incrementally maintained operations counts, pushed at most once per ``min_interval_s``"""
+
+    def __init__(
+        self,
+        push: Callable[[Dict[str, Any]], Awaitable[None]],
+        local_vendors: Callable[[], Iterable[str]],
+        min_interval_s: float = 1.0,
+        max_tracked_orders: int = 20000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.push = push
+        self.local_vendors = local_vendors
+        self.min_interval_s = min_interval_s
+        self.max_tracked_orders = max_tracked_orders
+        self.clock = clock
+        self.worker_id = uuid.uuid4().hex
+        # Vendors connected to other workers, as of their last presence update
+        self._remote_vendors: Set[str] = set()
+        self.orders_by_status: Counter = Counter()
+        # order id -> status, for orders that can still change (and delivery tracking id -> order id)
+        self._open_orders: Dict[str, str] = {}
+        self._tracking: Dict[str, str] = {}
+        self.counts = {"manual_assignments": 0, "instore_pending_approval": 0, "print_queue_depth": 0}
+        self._last_push = float('-inf')
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._pending: set = set()
+        self.stats = {"changes": 0, "pushes": 0, "resyncs": 0}
+
+    async def load(self, database):
+        """Rebuild every count from the database"""
+        by_status = await database.orders.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ]).to_list(None)
+        # Only the newest open orders are remembered; a transition of an older one is
+        # counted without its previous status until the next resync
+        open_orders = await database.orders.find(
+            {"status": {"$nin": list(FINAL_STATUSES)}}, {"_id": 0, "id": 1, "status": 1, "delivery_tracking_id": 1}
+        ).sort("created_at", -1).limit(self.max_tracked_orders).to_list(self.max_tracked_orders)
+
+        self.orders_by_status = Counter({row['_id']: row['count'] for row in by_status if row['_id']})
+        self._open_orders = {order['id']: order['status'] for order in open_orders}
+        self._tracking = {
+            order['delivery_tracking_id']: order['id'] for order in open_orders if order.get('delivery_tracking_id')
+        }
+        self.counts = {
+            "manual_assignments": await database.orders.count_documents({"need_manual_assign": True}),
+            "instore_pending_approval": await database.instore_orders.count_documents({"payment_status": "pending"}),
+            "print_queue_depth": await database.print_queue.count_documents({"status": {"$in": PRINT_QUEUE_OPEN}})
+        }
+        self.stats['resyncs'] += 1
+        await self.load_presence(database)
+        self.changed()
+
+    async def publish_presence(self, database, ttl_s: float):
+        """Record the vendors connected to this worker; the entry expires unless refreshed"""
+        await database.worker_presence.update_one(
+            {"_id": self.worker_id},
+            {"$set": {
+                "vendors": list(self.local_vendors()),
+                "expires_at": datetime.now(timezone.utc) + timedelta(seconds=ttl_s)
+            }},
+            upsert=True
+        )
+
+    async def load_presence(self, database):
+        """Reload the vendors connected to the other live workers"""
+        workers = await database.worker_presence.find(
+            {"_id": {"$ne": self.worker_id}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+            {"_id": 0, "vendors": 1}
+        ).to_list(None)
+        remote = {vendor_id for worker in workers for vendor_id in worker.get('vendors', [])}
+        if remote != self._remote_vendors:
+            self._remote_vendors = remote
+            self.changed()
+
+    def vendors_online(self) -> int:
+        """Distinct vendors connected to any worker"""
+        if not self._remote_vendors:
+            return sum(1 for _ in self.local_vendors())
+        return len(self._remote_vendors.union(self.local_vendors()))
+
+    def order_status_changed(self, order_id: str, status: str, tracking_id: Optional[str] = None):
+        """An order moved to ``status`` (or was created in it)"""
+        if tracking_id:
+            self._tracking[tracking_id] = order_id
+        previous = self._open_orders.get(order_id)
+        if previous == status:
+            return
+        if previous is not None:
+            self.orders_by_status[previous] = max(self.orders_by_status[previous] - 1, 0)
+        self.orders_by_status[status] += 1
+        if status in FINAL_STATUSES:
+            self._open_orders.pop(order_id, None)
+        else:
+            self._open_orders[order_id] = status
+        self.changed()
+
+    def delivery_status_changed(self, tracking_id: str, status: str):
+        """A delivery webhook moved the order behind ``tracking_id`` to ``status``"""
+        order_id = self._tracking.get(tracking_id)
+        if status in FINAL_STATUSES:
+            self._tracking.pop(tracking_id, None)
+        if order_id is None:
+            # Not seen by this worker: count it now, the next resync settles the old status
+            self.orders_by_status[status] += 1
+            self.changed()
+            return
+        self.order_status_changed(order_id, status)
+
+    def adjust(self, name: str, delta: int):
+        """Move one of ``counts`` by ``delta`` (never below zero)"""
+        self.counts[name] = max(self.counts[name] + delta, 0)
+        self.changed()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "orders_by_status": {status: count for status, count in self.orders_by_status.items() if count},
+            **self.counts,
+            "vendors_online": self.vendors_online(),
+            "at": datetime.now(timezone.utc).isoformat()
+        }
+
+    def changed(self):
+        """Schedule a push: right away if the last one is old enough, else when the interval is up"""
+        self.stats['changes'] += 1
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        delay = max(self._last_push + self.min_interval_s - self.clock(), 0)
+        self._timer = loop.call_later(delay, self._push_soon)
+
+    def _push_soon(self):
+        self._timer = None
+        self._last_push = self.clock()
+        task = asyncio.ensure_future(self._push())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _push(self):
+        self.stats['pushes'] += 1
+        try:
+            await self.push(self.snapshot())
+        except Exception as e:
+            logger.error(f"Admin dashboard push failed: {e}")
+
+def _has_local_admins() -> bool:
+    return bool(sio.manager.rooms.get(NAMESPACE, {}).get(ROOM))
+
+async def _push_to_admins(snapshot: Dict[str, Any]):
+    # Local admins only: with a message bus every worker would otherwise push its own view to all of them
+    if _has_local_admins():
+        await sio.emit('dashboard', snapshot, room=ROOM, namespace=NAMESPACE, ignore_queue=True)
+
+dashboard = OperationsDashboard(
+    _push_to_admins,
+    lambda: socketio_manager.connections.vendors(),
+    min_interval_s=SETTINGS.get('pushIntervalMs', 1000) / 1000,
+    max_tracked_orders=SETTINGS.get('maxTrackedOrders', 20000)
+)
+# Set when the first admin connects to this worker, whose counts are not resynced while nobody watches
+_admin_joined = asyncio.Event()
+
+class AdminNamespace(socketio.AsyncNamespace):
+    async def on_connect(self, sid, environ, auth):
+        """Admin tokens only; the current aggregates are sent straight away"""
+        token = (auth or {}).get('token')
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]) if isinstance(token, str) else {}
+        except JWTError:
+            claims = {}
+        if claims.get('role') not in ADMIN_ROLES:
+            raise ConnectionRefusedError('admin token required')
+
+        if not _has_local_admins():
+            _admin_joined.set()
+        await self.enter_room(sid, ROOM)
+        await self.emit('dashboard', dashboard.snapshot(), to=sid)
+
+sio.register_namespace(AdminNamespace(NAMESPACE))
+
+async def run_resync_loop(database):
+    """Publish this worker's vendors; while admins are connected here, also reload the other
+    workers' vendors and (every resync interval, or when the first admin joins) the counts"""
+    resync_s = SETTINGS.get('resyncSeconds', 60)
+    presence_s = SETTINGS.get('presenceSeconds', 15)
+    await database.worker_presence.create_index("expires_at", expireAfterSeconds=0)
+    last_load = float('-inf')
+    while True:
+        admin_joined = _admin_joined.is_set()
+        _admin_joined.clear()
+        try:
+            await dashboard.publish_presence(database, ttl_s=presence_s * 3)
+            if _has_local_admins():
+                if admin_joined or time.monotonic() - last_load >= resync_s:
+                    last_load = time.monotonic()
+                    await dashboard.load(database)
+                else:
+                    await dashboard.load_presence(database)
+        except Exception as e:
+            logger.error(f"Admin dashboard resync failed: {e}")
+        try:
+            await asyncio.wait_for(_admin_joined.wait(), presence_s)
+        except asyncio.TimeoutError:
+            pass
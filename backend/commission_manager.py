@@ -9,6 +9,7 @@ from typing import Optional
 from datetime import datetime, timezone
 import os
 from jose import jwt, JWTError
+from notification_templates import get_template_registry, render_template
 
 router = APIRouter(prefix="/api/admin", tags=["commission"])
 
@@ -103,29 +104,28 @@ async def update_commission_settings(
         upsert=True
     )
     
-    # Create notification for all vendors
-    notification_text = (
-        f"⚠️ {commission_type.replace('_', ' ').title()} Updated\n"
-        f"Old: {old_percentage}%\n"
-        f"New: {new_percentage}%\n"
-        f"Effective immediately for all new payouts."
-    )
-    
-    vendors = await db.vendors.find({}).to_list(length=None)
+    # Create notification for all vendors, rendered once per locale
+    values = {
+        "commission_label": commission_type.replace('_', ' ').title(),
+        "old_percentage": old_percentage,
+        "new_percentage": new_percentage
+    }
+    templates = get_template_registry()
+    titles = templates.render_locales("commission_change_title", **values)
+    messages = templates.render_locales("commission_change", **values)
     
-    for vendor in vendors:
-        notification = {
-            "id": f"notif_{datetime.now(timezone.utc).timestamp()}_{vendor['id']}",
-            "vendor_id": vendor["id"],
-            "type": "commission_change",
-            "title": f"{commission_type.replace('_', ' ').title()} Changed",
-            "message": notification_text,
-            "old_percentage": old_percentage,
-            "new_percentage": new_percentage,
-            "read": False,
-            "created_at": datetime.now(timezone.utc).isoformat()
-        }
-        await db.notifications.insert_one(notification)
+    # One broadcast document for all vendors, merged into each inbox on read
+    from vendor_notifications import create_broadcast
+    await create_broadcast({
+        "type": "commission_change",
+        "title": titles[templates.default_locale],
+        "message": messages[templates.default_locale],
+        "translations": {locale: {"title": titles[locale], "message": messages[locale]} for locale in messages},
+        "old_percentage": old_percentage,
+        "new_percentage": new_percentage,
+        "created_by": token["id"]
+    })
+    vendors_notified = await db.vendors.estimated_document_count()
     
     # Log audit trail
     audit_log = {
@@ -144,7 +144,7 @@ async def update_commission_settings(
         "message": f"{commission_type.replace('_', ' ').title()} updated from {old_percentage}% to {new_percentage}%",
         "old_percentage": old_percentage,
         "new_percentage": new_percentage,
-        "vendors_notified": len(vendors)
+        "vendors_notified": vendors_notified
     }
 
 @router.post("/vendor-commission")
@@ -178,25 +178,21 @@ async def update_vendor_commission(
     )
     
     # Notify vendor
-    notification_text = (
-        f"⚠️ Your Commission Rate Updated\n"
-        f"Old: {old_commission or 'Global'}%\n"
-        f"New: {data.commission_percentage}%\n"
-        f"This is a custom rate set specifically for your store."
+    locale = vendor.get("preferred_language")
+    notification_text = render_template(
+        "vendor_commission_change", locale,
+        old_percentage=old_commission or 'Global',
+        new_percentage=data.commission_percentage
     )
     
-    notification = {
-        "id": f"notif_{datetime.now(timezone.utc).timestamp()}_{data.vendor_id}",
-        "vendor_id": data.vendor_id,
+    from vendor_notifications import add_vendor_notification
+    await add_vendor_notification(data.vendor_id, {
         "type": "commission_change",
-        "title": "Your Commission Rate Changed",
+        "title": render_template("vendor_commission_change_title", locale),
         "message": notification_text,
         "old_percentage": old_commission,
-        "new_percentage": data.commission_percentage,
-        "read": False,
-        "created_at": datetime.now(timezone.utc).isoformat()
-    }
-    await db.notifications.insert_one(notification)
+        "new_percentage": data.commission_percentage
+    })
     
     return {
         "success": True,
@@ -0,0 +1,108 @@
+"""
+Socket connection registry
+Two-way index between vendors and their Socket.IO sids: connect, disconnect and
+lookups in either direction are O(1), and a vendor may have several devices
+"""
+
+from typing import Dict, Optional, Set, Union, Iterator
+
+def vendor_room(vendor_id: str) -> str:
+    """Socket.IO room joined by every connection of a vendor"""
+    return f"vendor:{vendor_id}"
+
+class ConnectionRegistry:
+    """vendor -> sids and sid -> vendor.
+
+    Most vendors have one device, so their entry is the bare sid string; a set
+    is only allocated once a second device connects (and dropped again when it
+    leaves), keeping the per-connection cost to roughly two dict slots.
+    """
+
+    __slots__ = ("_sids", "_vendors")
+
+    def __init__(self):
+        self._sids: Dict[str, Union[str, Set[str]]] = {}
+        self._vendors: Dict[str, str] = {}
+
+    def add(self, vendor_id: str, sid: str) -> bool:
+        """Register a connection; True if it is the vendor's first"""
+        previous = self._vendors.get(sid)
+        if previous is not None and previous != vendor_id:
+            self.remove(sid)
+        self._vendors[sid] = vendor_id
+
+        current = self._sids.get(vendor_id)
+        if current is None:
+            self._sids[vendor_id] = sid
+            return True
+        if isinstance(current, str):
+            if current != sid:
+                self._sids[vendor_id] = {current, sid}
+        else:
+            current.add(sid)
+        return False
+
+    def remove(self, sid: str) -> Optional[str]:
+        """Forget a connection; returns its vendor (None for unknown sids)"""
+        vendor_id = self._vendors.pop(sid, None)
+        if vendor_id is None:
+            return None
+
+        current = self._sids.get(vendor_id)
+        if isinstance(current, str):
+            del self._sids[vendor_id]
+        elif current is not None:
+            current.discard(sid)
+            if len(current) == 1:
+                self._sids[vendor_id] = next(iter(current))
+        return vendor_id
+
+    def vendor_for(self, sid: str) -> Optional[str]:
+        return self._vendors.get(sid)
+
+    def sids_for(self, vendor_id: str) -> Set[str]:
+        current = self._sids.get(vendor_id)
+        if current is None:
+            return set()
+        return {current} if isinstance(current, str) else set(current)
+
+    def is_connected(self, vendor_id: str) -> bool:
+        return vendor_id in self._sids
+
+    def vendors(self) -> Iterator[str]:
+        return iter(self._sids)
+
+    @property
+    def vendor_count(self) -> int:
+        return len(self._sids)
+
+    def __len__(self) -> int:
+        return len(self._vendors)
+
+    def __contains__(self, vendor_id: str) -> bool:
+        return vendor_id in self._sids
+
+def memory_per_connection(connections: int = 10000, devices_per_vendor: int = 1) -> float:
+    """Bytes allocated per registered connection (sid strings excluded)"""
+    import tracemalloc
+
+    sids = [f"sid-{i:020d}" for i in range(connections)]
+    vendors = [f"vendor_{i // devices_per_vendor:08x}" for i in range(connections)]
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    registry = ConnectionRegistry()
+    for vendor_id, sid in zip(vendors, sids):
+        registry.add(vendor_id, sid)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return used / connections
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Connection registry memory per connection")
+    parser.add_argument("--connections", type=int, default=10000)
+    args = parser.parse_args()
+
+    for devices in (1, 2):
+        print(f"{devices} device(s) per vendor: {memory_per_connection(args.connections, devices):.0f} bytes/connection")
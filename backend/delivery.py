@@ -2,6 +2,7 @@ import json
 from pathlib import Path
 from typing import List, Dict, Any, Optional
 from models import VendorLocation
+import numpy as np
 import math
 import uuid
 
@@ -26,6 +27,42 @@ def calculate_distance(lat1: float, lon1: float, lat2: float, lon2: float) -> fl
     
     return R * c
 
+def load_quoting_settings() -> Dict[str, Any]:
+    """Load quote fan-out settings (timeouts, deadline, hedging) from config"""
+    with open(CONFIG_PATH, 'r') as f:
+        data = json.load(f)
+    return data.get('quoting', {})
+
+def load_quote_cache_settings() -> Dict[str, Any]:
+    """Load quote cache settings (TTL, stale window, size) from config"""
+    with open(CONFIG_PATH, 'r') as f:
+        data = json.load(f)
+    return data.get('quoteCache', {})
+
+def partner_config_version() -> str:
+    """Cheap version tag for the partner config, changes whenever the file is rewritten"""
+    stat = CONFIG_PATH.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
+def quote_from_rate_card(partner: Dict[str, Any], distance_km: float) -> Optional[Dict[str, Any]]:
+    """Price a trip from the partner's configured rate card, None if out of range"""
+    if distance_km > partner['maxDistanceKm']:
+        return None
+    
+    cost = max(
+        partner['baseRate'] + (distance_km * partner['perKmRate']),
+        partner['minCharge']
+    )
+    
+    return {
+        "partner_id": partner['id'],
+        "partner_name": partner['name'],
+        "cost": round(cost, 2),
+        "estimated_time_minutes": partner['estimatedTimeMinutes'],
+        "distance_km": round(distance_km, 2),
+        "mode": partner['mode']
+    }
+
 def get_delivery_quotes(pickup_location: VendorLocation, delivery_location: VendorLocation) -> List[Dict[str, Any]]:
     """Get delivery quotes from all enabled partners (simulated)"""
     partners = load_delivery_partners()
@@ -41,36 +78,112 @@ def get_delivery_quotes(pickup_location: VendorLocation, delivery_location: Vend
         if not partner['enabled']:
             continue
         
-        if distance_km > partner['maxDistanceKm']:
-            continue
-        
-        # Calculate quote
-        cost = max(
-            partner['baseRate'] + (distance_km * partner['perKmRate']),
-            partner['minCharge']
-        )
-        
-        quotes.append({
-            "partner_id": partner['id'],
-            "partner_name": partner['name'],
-            "cost": round(cost, 2),
-            "estimated_time_minutes": partner['estimatedTimeMinutes'],
-            "distance_km": round(distance_km, 2),
-            "mode": partner['mode']
-        })
+        quote = quote_from_rate_card(partner, distance_km)
+        if quote:
+            quotes.append(quote)
     
     # Sort by cost (cheapest first)
     quotes.sort(key=lambda x: x['cost'])
     return quotes
 
+def calculate_distances(latitude: float, longitude: float, latitudes: np.ndarray, longitudes: np.ndarray) -> np.ndarray:
+    """Vectorized haversine distance (km) from one point to many"""
+    R = 6371
+    lat1_rad = np.radians(latitude)
+    lat2_rad = np.radians(latitudes)
+    delta_lat = lat2_rad - lat1_rad
+    delta_lon = np.radians(longitudes - longitude)
+    
+    a = np.sin(delta_lat / 2) ** 2 + np.cos(lat1_rad) * np.cos(lat2_rad) * np.sin(delta_lon / 2) ** 2
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    
+    return R * c
+
+def get_cheapest_vendor_quote(
+    vendors: List[Dict[str, Any]],
+    delivery_location: VendorLocation,
+    partners: Optional[List[Dict[str, Any]]] = None
+) -> Optional[Dict[str, Any]]:
+    """Cheapest (vendor, partner) delivery combination across candidate vendors
+    
+    ``vendors`` are vendor documents with at least ``id`` and ``location``. One
+    batched distance computation feeds a vendors x partners rate-card cost
+    matrix; the minimum is the quote. Ties go to the nearer vendor.
+    """
+    if partners is None:
+        partners = load_delivery_partners()
+    partners = [p for p in partners if p['enabled']]
+    # A vendor without coordinates cannot be quoted, but must not fail everyone else's quote
+    vendors = [
+        v for v in vendors
+        if isinstance(v.get('location'), dict) and v['location'].get('latitude') is not None
+        and v['location'].get('longitude') is not None
+    ]
+    if not vendors or not partners:
+        return None
+    
+    latitudes = np.array([v['location']['latitude'] for v in vendors], dtype=float)
+    longitudes = np.array([v['location']['longitude'] for v in vendors], dtype=float)
+    distances = calculate_distances(delivery_location.latitude, delivery_location.longitude, latitudes, longitudes)
+    
+    base_rate = np.array([p['baseRate'] for p in partners], dtype=float)
+    per_km_rate = np.array([p['perKmRate'] for p in partners], dtype=float)
+    min_charge = np.array([p['minCharge'] for p in partners], dtype=float)
+    max_distance = np.array([p['maxDistanceKm'] for p in partners], dtype=float)
+    
+    costs = np.maximum(base_rate + distances[:, None] * per_km_rate, min_charge)
+    costs[distances[:, None] > max_distance] = np.inf
+    
+    # Stable tie-break on distance: order rows nearest-first before taking the argmin
+    by_distance = np.argsort(distances, kind="stable")
+    flat_index = int(np.argmin(costs[by_distance]))
+    vendor_index = int(by_distance[flat_index // len(partners)])
+    partner_index = flat_index % len(partners)
+    
+    if not np.isfinite(costs[vendor_index, partner_index]):
+        return None
+    
+    vendor = vendors[vendor_index]
+    partner = partners[partner_index]
+    distance_km = float(distances[vendor_index])
+    
+    return {
+        "vendor_id": vendor['id'],
+        "vendor_name": vendor.get('shop_name') or vendor.get('name'),
+        "partner_id": partner['id'],
+        "partner_name": partner['name'],
+        "cost": round(float(costs[vendor_index, partner_index]), 2),
+        "estimated_time_minutes": partner['estimatedTimeMinutes'],
+        "distance_km": round(distance_km, 2),
+        "mode": partner['mode'],
+        "candidates": len(vendors)
+    }
+
 def select_cheapest_partner(quotes: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
     """Select the cheapest available partner"""
     if not quotes:
         return None
     return quotes[0]
 
-def book_delivery(partner_id: str, order_id: str, pickup_location: VendorLocation, delivery_location: VendorLocation) -> Dict[str, Any]:
-    """Book delivery with selected partner (simulated)"""
+def load_consolidation_settings() -> Dict[str, Any]:
+    """Load multi-drop consolidation settings from config"""
+    with open(CONFIG_PATH, 'r') as f:
+        data = json.load(f)
+    return data.get('consolidation', {})
+
+def book_delivery(
+    partner_id: str,
+    order_id: str,
+    pickup_location: VendorLocation,
+    delivery_location: VendorLocation,
+    drops: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """Book delivery with selected partner (simulated)
+    
+    With ``drops`` (ordered ``{"order_id", "location"}`` stops) this books one
+    multi-drop trip: ``order_id`` is the trip reference, ``delivery_location``
+    the final stop, and every drop gets its own tracking id.
+    """
     partners = load_delivery_partners()
     partner = next((p for p in partners if p['id'] == partner_id), None)
     
@@ -80,7 +193,7 @@ def book_delivery(partner_id: str, order_id: str, pickup_location: VendorLocatio
     if partner['mode'] == 'SIMULATED':
         # Simulated booking
         tracking_id = f"{partner_id}_{uuid.uuid4().hex[:8]}"
-        return {
+        booking = {
             "status": "booked",
             "tracking_id": tracking_id,
             "partner_id": partner_id,
@@ -88,6 +201,16 @@ def book_delivery(partner_id: str, order_id: str, pickup_location: VendorLocatio
             "estimated_delivery_time_minutes": partner['estimatedTimeMinutes'],
             "mode": "SIMULATED"
         }
+        if drops:
+            booking["drops"] = [
+                {
+                    "order_id": drop['order_id'],
+                    "sequence": sequence,
+                    "tracking_id": f"{tracking_id}-{sequence}"
+                }
+                for sequence, drop in enumerate(drops, start=1)
+            ]
+        return booking
     else:
         # Real integration would go here
         raise NotImplementedError(f"LIVE mode not implemented for {partner_id}")
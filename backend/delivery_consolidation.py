@@ -0,0 +1,400 @@
+"""
+Multi-drop delivery consolidation
+Groups ReadyForDelivery orders per vendor inside a time window, routes them
+with nearest-neighbour + 2-opt over the geo distance matrix, and books one
+multi-drop trip per route
+"""
+
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime, timedelta, timezone
+from pymongo import UpdateOne
+import asyncio
+import logging
+import random
+import uuid
+from models import VendorLocation, OrderStatus
+from delivery import (
+    load_delivery_partners, load_consolidation_settings, calculate_distance,
+    quote_from_rate_card, book_delivery
+)
+from order_tracking import publish_order_status
+
+logger = logging.getLogger(__name__)
+
+def build_distance_matrix(points: List[Tuple[float, float]]) -> List[List[float]]:
+    """Symmetric haversine distance matrix (km) over (lat, lon) points"""
+    size = len(points)
+    matrix = [[0.0] * size for _ in range(size)]
+    for i in range(size):
+        for j in range(i + 1, size):
+            distance = calculate_distance(points[i][0], points[i][1], points[j][0], points[j][1])
+            matrix[i][j] = distance
+            matrix[j][i] = distance
+    return matrix
+
+def route_length(route: List[int], matrix: List[List[float]]) -> float:
+    """Length of an open path starting at the depot (index 0)"""
+    length = 0.0
+    previous = 0
+    for node in route:
+        length += matrix[previous][node]
+        previous = node
+    return length
+
+def nearest_neighbour_routes(matrix: List[List[float]], max_stops: int, max_trip_km: float) -> List[List[int]]:
+    """Split stops 1..n into capacitated routes, always extending to the nearest stop"""
+    unvisited = set(range(1, len(matrix)))
+    routes = []
+
+    while unvisited:
+        route = []
+        current = 0
+        length = 0.0
+        while unvisited and len(route) < max_stops:
+            nearest = min(unvisited, key=lambda node: matrix[current][node])
+            if route and length + matrix[current][nearest] > max_trip_km:
+                break
+            length += matrix[current][nearest]
+            route.append(nearest)
+            unvisited.remove(nearest)
+            current = nearest
+        routes.append(route)
+
+    return routes
+
+def two_opt(route: List[int], matrix: List[List[float]]) -> List[int]:
+    """Improve an open depot-rooted path by reversing segments until no gain"""
+    best = list(route)
+    improved = True
+
+    while improved:
+        improved = False
+        for i in range(len(best) - 1):
+            before = best[i - 1] if i > 0 else 0
+            for j in range(i + 1, len(best)):
+                after = best[j + 1] if j + 1 < len(best) else None
+                removed = matrix[before][best[i]] + (matrix[best[j]][after] if after is not None else 0.0)
+                added = matrix[before][best[j]] + (matrix[best[i]][after] if after is not None else 0.0)
+                if added < removed - 1e-9:
+                    best[i:j + 1] = reversed(best[i:j + 1])
+                    improved = True
+
+    return best
+
+def plan_routes(
+    depot: VendorLocation,
+    drops: List[Dict[str, Any]],
+    max_stops: int,
+    max_trip_km: float
+) -> List[Dict[str, Any]]:
+    """Plan multi-drop routes for one vendor; drops are ``{"order_id", "location"}``"""
+    points = [(depot.latitude, depot.longitude)] + [
+        (drop['location'].latitude, drop['location'].longitude) for drop in drops
+    ]
+    matrix = build_distance_matrix(points)
+
+    routes = []
+    for route in nearest_neighbour_routes(matrix, max_stops, max_trip_km):
+        route = two_opt(route, matrix)
+        routes.append({
+            "drops": [drops[node - 1] for node in route],
+            "distance_km": route_length(route, matrix),
+            "direct_km": [matrix[0][node] for node in route]
+        })
+    return routes
+
+def quote_route(
+    partners: List[Dict[str, Any]],
+    distance_km: float,
+    stops: int,
+    per_stop_charge: float
+) -> Optional[Dict[str, Any]]:
+    """Cheapest partner quote for a multi-drop route (extra charge per additional stop)"""
+    quotes = []
+    for partner in partners:
+        if not partner['enabled']:
+            continue
+        quote = quote_from_rate_card(partner, distance_km)
+        if quote:
+            quote['cost'] = round(quote['cost'] + per_stop_charge * (stops - 1), 2)
+            quotes.append(quote)
+    return min(quotes, key=lambda q: q['cost']) if quotes else None
+
+def individual_cost(partners: List[Dict[str, Any]], distance_km: float) -> Optional[float]:
+    """Cheapest single-drop cost for one order (the pre-consolidation baseline)"""
+    quote = quote_route(partners, distance_km, 1, 0.0)
+    return quote['cost'] if quote else None
+
+def is_dispatchable(ready_times: List[datetime], now: datetime, window: timedelta, max_stops: int) -> bool:
+    """A vendor's batch goes out once its oldest order has waited a full window or a trip is full"""
+    return len(ready_times) >= max_stops or min(ready_times) <= now - window
+
+def _parse_time(value: Any) -> datetime:
+    if isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+READY_UNBOOKED = {
+    "status": OrderStatus.READY_FOR_DELIVERY.value,
+    "fulfillment_type": "Delivery",
+    "delivery_tracking_id": None
+}
+
+async def _claim_orders(db, order_ids: List[str], run_id: str, at: str, stale_before: str) -> List[Dict[str, Any]]:
+    """Mark still-unbooked orders as taken by this run (each update is atomic, so no two workers get one order)"""
+    await db.orders.update_many(
+        {
+            **READY_UNBOOKED,
+            "id": {"$in": order_ids},
+            # A claim left by a run that died is taken over once stale
+            "$or": [{"consolidation_claim": None}, {"consolidation_claimed_at": {"$lt": stale_before}}]
+        },
+        {"$set": {"consolidation_claim": run_id, "consolidation_claimed_at": at}}
+    )
+    return await db.orders.find(
+        {"consolidation_claim": run_id},
+        {"_id": 0, "id": 1, "assigned_vendor_id": 1, "customer_location": 1, "updated_at": 1}
+    ).to_list(None)
+
+async def consolidate_ready_deliveries(db, now: Optional[datetime] = None) -> Dict[str, Any]:
+    """Book multi-drop trips for every vendor whose ready batch is due"""
+    settings = load_consolidation_settings()
+    partners = load_delivery_partners()
+    now = now or datetime.now(timezone.utc)
+    window = timedelta(minutes=settings.get('windowMinutes', 20))
+    max_stops = settings.get('maxStopsPerTrip', 5)
+    max_trip_km = settings.get('maxTripKm', 20)
+    per_stop_charge = settings.get('perStopCharge', 10.0)
+    claim_timeout = timedelta(seconds=settings.get('claimTimeoutSeconds', 600))
+    report = {"trips": 0, "orders": 0, "cost": 0.0, "individual_cost": 0.0, "km": 0.0, "individual_km": 0.0}
+
+    orders = await db.orders.find(
+        READY_UNBOOKED,
+        {"_id": 0, "id": 1, "assigned_vendor_id": 1, "customer_location": 1, "updated_at": 1}
+    ).to_list(None)
+
+    by_vendor: Dict[str, List[Dict[str, Any]]] = {}
+    for order in orders:
+        if order.get('assigned_vendor_id') and order.get('customer_location') and order.get('updated_at'):
+            by_vendor.setdefault(order['assigned_vendor_id'], []).append(order)
+
+    due_ids = []
+    for vendor_id, vendor_orders in by_vendor.items():
+        try:
+            if is_dispatchable([_parse_time(o['updated_at']) for o in vendor_orders], now, window, max_stops):
+                due_ids.extend(o['id'] for o in vendor_orders)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Skipping consolidation for vendor {vendor_id}: bad updated_at ({e})")
+    if not due_ids:
+        return report
+
+    run_id = f"consolidation_{uuid.uuid4().hex[:12]}"
+    at = now.isoformat()
+    claimed = await _claim_orders(db, due_ids, run_id, at, (now - claim_timeout).isoformat())
+    try:
+        due: Dict[str, List[Dict[str, Any]]] = {}
+        for order in claimed:
+            due.setdefault(order['assigned_vendor_id'], []).append(order)
+
+        vendors = await db.vendors.find(
+            {"id": {"$in": list(due.keys())}},
+            {"_id": 0, "id": 1, "location": 1}
+        ).to_list(None)
+
+        updates = []
+        # (trip, route) for every trip booked with a partner, before knowing which orders it got
+        planned = []
+        for vendor in vendors:
+            vendor_id = vendor['id']
+            try:
+                depot = VendorLocation(**vendor['location'])
+                drops = [
+                    {"order_id": o['id'], "location": VendorLocation(**o['customer_location'])}
+                    for o in due[vendor_id]
+                ]
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning(f"Skipping consolidation for vendor {vendor_id}: bad location ({e})")
+                continue
+
+            for route in plan_routes(depot, drops, max_stops, max_trip_km):
+                quote = quote_route(partners, route['distance_km'], len(route['drops']), per_stop_charge)
+                if not quote:
+                    logger.warning(f"No partner covers a {route['distance_km']:.1f}km route for vendor {vendor_id}")
+                    continue
+
+                trip_id = f"trip_{uuid.uuid4().hex[:12]}"
+                booking = book_delivery(
+                    quote['partner_id'], trip_id, depot, route['drops'][-1]['location'], drops=route['drops']
+                )
+                for drop in booking['drops']:
+                    updates.append(UpdateOne(
+                        # Still ours and still unbooked: a manual booking or status change in between wins
+                        {**READY_UNBOOKED, "id": drop['order_id'], "consolidation_claim": run_id},
+                        {
+                            "$set": {
+                                "delivery_partner_id": quote['partner_id'],
+                                "delivery_tracking_id": drop['tracking_id'],
+                                "delivery_trip_id": trip_id,
+                                "delivery_sequence": drop['sequence'],
+                                "status": OrderStatus.OUT_FOR_DELIVERY.value,
+                                "updated_at": at
+                            },
+                            "$unset": {"consolidation_claim": "", "consolidation_claimed_at": ""},
+                            "$push": {"statusHistory": {
+                                "status": OrderStatus.OUT_FOR_DELIVERY.value,
+                                "by": "system",
+                                "note": f"Out for delivery on trip {trip_id} (stop {drop['sequence']} of {len(booking['drops'])})",
+                                "at": at
+                            }}
+                        }
+                    ))
+
+                planned.append(({
+                    "id": trip_id,
+                    "vendor_id": vendor_id,
+                    "partner_id": quote['partner_id'],
+                    "tracking_id": booking['tracking_id'],
+                    "drops": booking['drops'],
+                    "distance_km": round(route['distance_km'], 2),
+                    "cost": quote['cost'],
+                    "created_at": at
+                }, route))
+
+        booked_ids = set()
+        if updates:
+            await db.orders.bulk_write(updates, ordered=False)
+            # An order whose claim or state changed in between was not booked: trips and status
+            # pushes are built only from the orders that now carry one of this run's trips
+            booked = await db.orders.find(
+                {"delivery_trip_id": {"$in": [trip['id'] for trip, _ in planned]}}, {"_id": 0, "id": 1}
+            ).to_list(None)
+            booked_ids = {order['id'] for order in booked}
+            if len(booked_ids) < len(updates):
+                logger.warning(f"{len(updates) - len(booked_ids)} consolidated orders changed before booking was saved")
+
+        trips = []
+        for trip, route in planned:
+            # booking['drops'] follow route['drops'], so indexes line up with route['direct_km']
+            kept = [i for i, drop in enumerate(trip['drops']) if drop['order_id'] in booked_ids]
+            if not kept:
+                continue
+            direct_km = [route['direct_km'][i] for i in kept]
+            baseline = sum(individual_cost(partners, km) or 0.0 for km in direct_km)
+            trip['drops'] = [trip['drops'][i] for i in kept]
+            trip['individual_cost'] = round(baseline, 2)
+            trip['individual_km'] = round(sum(direct_km), 2)
+            trips.append(trip)
+
+            report['trips'] += 1
+            report['orders'] += len(kept)
+            report['cost'] += trip['cost']
+            report['individual_cost'] += baseline
+            report['km'] += route['distance_km']
+            report['individual_km'] += sum(direct_km)
+
+        if trips:
+            await db.delivery_trips.insert_many(trips)
+            for trip in trips:
+                for drop in trip['drops']:
+                    await publish_order_status(
+                        drop['order_id'], OrderStatus.OUT_FOR_DELIVERY.value, tracking_id=drop['tracking_id']
+                    )
+    finally:
+        # Orders this run did not book go back for the next one
+        await db.orders.update_many(
+            {"consolidation_claim": run_id},
+            {"$unset": {"consolidation_claim": "", "consolidation_claimed_at": ""}}
+        )
+
+    logger.info(f"Consolidated {report['orders']} deliveries into {report['trips']} trips")
+    return {k: round(v, 2) if isinstance(v, float) else v for k, v in report.items()}
+
+async def run_consolidation_loop(db):
+    """Periodically dispatch due batches (started on app startup when enabled; safe in every worker)"""
+    interval = load_consolidation_settings().get('intervalSeconds', 60)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await consolidate_ready_deliveries(db)
+        except Exception as e:
+            logger.error(f"Delivery consolidation error: {e}")
+
+def synthetic_day_report(
+    num_vendors: int = 5,
+    num_orders: int = 300,
+    hotspots_per_vendor: int = 3,
+    seed: int = 42
+) -> Dict[str, Any]:
+    """Replay a synthetic day of ready orders through the dispatcher and compare to one trip per order"""
+    settings = load_consolidation_settings()
+    partners = load_delivery_partners()
+    window = timedelta(minutes=settings.get('windowMinutes', 20))
+    interval = timedelta(seconds=settings.get('intervalSeconds', 60))
+    max_stops = settings.get('maxStopsPerTrip', 5)
+    max_trip_km = settings.get('maxTripKm', 20)
+    per_stop_charge = settings.get('perStopCharge', 10.0)
+    rng = random.Random(seed)
+
+    def near(latitude: float, longitude: float, spread_deg: float) -> VendorLocation:
+        return VendorLocation(
+            latitude=latitude + rng.gauss(0, spread_deg),
+            longitude=longitude + rng.gauss(0, spread_deg),
+            address="synthetic",
+            city="Bangalore",
+            pincode="560001"
+        )
+
+    start = datetime(2024, 1, 1, 9, 0, tzinfo=timezone.utc)
+    vendors = []
+    for _ in range(num_vendors):
+        depot = near(12.97, 77.59, 0.05)
+        hotspots = [near(depot.latitude, depot.longitude, 0.02) for _ in range(hotspots_per_vendor)]
+        vendors.append((depot, hotspots))
+
+    pending: Dict[int, List[Dict[str, Any]]] = {i: [] for i in range(num_vendors)}
+    arrivals = sorted(
+        (start + timedelta(minutes=rng.uniform(0, 600)), rng.randrange(num_vendors)) for _ in range(num_orders)
+    )
+
+    totals = {"trips": 0, "orders": 0, "cost": 0.0, "individual_cost": 0.0, "km": 0.0, "individual_km": 0.0}
+    now = start
+    next_arrival = 0
+    end = start + timedelta(hours=11)
+
+    while now <= end:
+        while next_arrival < len(arrivals) and arrivals[next_arrival][0] <= now:
+            ready_at, vendor_index = arrivals[next_arrival]
+            hotspot = rng.choice(vendors[vendor_index][1])
+            pending[vendor_index].append({
+                "order_id": f"synthetic_{next_arrival}",
+                "location": near(hotspot.latitude, hotspot.longitude, 0.003),
+                "ready_at": ready_at
+            })
+            next_arrival += 1
+
+        for vendor_index, drops in pending.items():
+            if not drops or not is_dispatchable([d['ready_at'] for d in drops], now, window, max_stops):
+                continue
+            for route in plan_routes(vendors[vendor_index][0], drops, max_stops, max_trip_km):
+                quote = quote_route(partners, route['distance_km'], len(route['drops']), per_stop_charge)
+                if not quote:
+                    continue
+                totals['trips'] += 1
+                totals['orders'] += len(route['drops'])
+                totals['cost'] += quote['cost']
+                totals['km'] += route['distance_km']
+                totals['individual_km'] += sum(route['direct_km'])
+                totals['individual_cost'] += sum(individual_cost(partners, km) or 0.0 for km in route['direct_km'])
+            pending[vendor_index] = []
+
+        now += interval
+
+    totals['cost_saved'] = totals['individual_cost'] - totals['cost']
+    totals['km_saved'] = totals['individual_km'] - totals['km']
+    totals['cost_saved_pct'] = 100 * totals['cost_saved'] / totals['individual_cost'] if totals['individual_cost'] else 0.0
+    totals['km_saved_pct'] = 100 * totals['km_saved'] / totals['individual_km'] if totals['individual_km'] else 0.0
+    return {k: round(v, 2) if isinstance(v, float) else v for k, v in totals.items()}
+
+if __name__ == "__main__":
+    for key, value in synthetic_day_report().items():
+        print(f"{key:>16}: {value}")
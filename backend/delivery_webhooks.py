@@ -0,0 +1,237 @@
+"""
+Delivery webhook ingestion
+Callbacks are queued, de-duplicated on (tracking id, status, timestamp), applied
+to orders in periodic bulk_write batches, and acknowledged once their batch is
+written, so a crash before the write leaves the partner to redeliver them
+"""
+
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+import asyncio
+import logging
+import uuid
+from models import OrderStatus
+
+logger = logging.getLogger(__name__)
+
+# Partner delivery status -> order status (other statuses only update delivery_status)
+DELIVERY_STATUS_MAP = {
+    "Delivered": OrderStatus.DELIVERED.value,
+    "InTransit": OrderStatus.OUT_FOR_DELIVERY.value
+}
+
+class IngestQueueFull(Exception):
+    """Raised when the ingest queue is at capacity (partner should retry)"""
+
+class InvalidDeliveryEvent(ValueError):
+    """Raised for a callback without a usable tracking id / status"""
+
+class DeliveryEventNotStored(Exception):
+    """Raised when a callback's batch could not be written (partner should retry)"""
+
+class DeliveryWebhookIngestor:
+    def __init__(
+        self,
+        batch_size: int = 500,
+        flush_interval_s: float = 0.5,
+        max_queue: int = 20000,
+        dedupe_window: int = 100000,
+        on_applied: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None
+    ):
+        self.batch_size = batch_size
+        self.on_applied = on_applied
+        self.flush_interval_s = flush_interval_s
+        self.dedupe_window = dedupe_window
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._seen: "OrderedDict[Tuple[str, str, str], None]" = OrderedDict()
+        self._retry: List[Tuple[str, Tuple[str, str, str], Dict[str, Any], str]] = []
+        self._waiters: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self._db = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"accepted": 0, "duplicates": 0, "applied": 0, "unmatched": 0, "batches": 0}
+
+    @staticmethod
+    def event_key(payload: Dict[str, Any]) -> Tuple[str, str, str]:
+        """(tracking id, status, timestamp) identity of a partner callback"""
+        if not isinstance(payload, dict):
+            raise InvalidDeliveryEvent("payload must be a JSON object")
+        if not payload.get('tracking_id') or not isinstance(payload['tracking_id'], str):
+            raise InvalidDeliveryEvent("tracking_id is required")
+        if not isinstance(payload.get('status') or "", str):
+            raise InvalidDeliveryEvent("status must be a string")
+        timestamp = payload.get('timestamp') or payload.get('event_time') or payload.get('at') or ""
+        return (payload['tracking_id'], payload.get('status') or "", str(timestamp))
+
+    def submit(self, partner: str, payload: Dict[str, Any]) -> bool:
+        """Queue a callback; returns False when it is a duplicate (InvalidDeliveryEvent for a malformed one)"""
+        key = self.event_key(payload)
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            self.stats['duplicates'] += 1
+            return False
+
+        try:
+            self.queue.put_nowait((partner, key, payload, datetime.now(timezone.utc).isoformat()))
+        except asyncio.QueueFull:
+            raise IngestQueueFull(f"Delivery webhook queue full ({self.queue.maxsize})")
+
+        self._seen[key] = None
+        if len(self._seen) > self.dedupe_window:
+            self._seen.popitem(last=False)
+        self.stats['accepted'] += 1
+        return True
+
+    async def accept(self, partner: str, payload: Dict[str, Any]) -> bool:
+        """Submit and wait until the callback's batch is written, so it is safe to acknowledge;
+        False for a duplicate"""
+        key = self.event_key(payload)
+        queued = self.submit(partner, payload)
+        if queued:
+            self._waiters[key] = asyncio.get_running_loop().create_future()
+        # A duplicate of a callback still waiting for its batch waits for the same write
+        waiter = self._waiters.get(key)
+        if waiter is not None:
+            await asyncio.shield(waiter)
+        return queued
+
+    def _settle(self, batch, error: Optional[Exception] = None):
+        for _, key, _, _ in batch:
+            waiter = self._waiters.pop(key, None)
+            if waiter is not None and not waiter.done():
+                if error is None:
+                    waiter.set_result(None)
+                else:
+                    waiter.set_exception(error)
+
+    async def ensure_indexes(self, db):
+        await db.orders.create_index("delivery_tracking_id")
+
+    async def start(self, db):
+        """Create indexes and start the periodic flusher"""
+        self._db = db
+        await self.ensure_indexes(db)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher and apply whatever is still queued"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await self.flush()
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Delivery webhook flush error: {e}")
+
+    async def flush(self) -> int:
+        """Apply all queued events in batches; returns number of events applied"""
+        applied = 0
+        # A batch whose write failed goes first; replaying it is safe (history event_key filter)
+        batch, self._retry = self._retry, []
+        while batch or not self.queue.empty():
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            applied += await self._apply(batch)
+            batch = []
+        return applied
+
+    def build_operations(
+        self,
+        batch: List[Tuple[str, Tuple[str, str, str], Dict[str, Any], str]],
+        batch_id: Optional[str] = None
+    ) -> List[UpdateOne]:
+        """One conditional update per event: status change and history entry (tagged with ``batch_id``) in the same write"""
+        operations = []
+        for partner, key, payload, received_at in batch:
+            tracking_id, status, timestamp = key
+            event_key = "|".join(key)
+            new_status = DELIVERY_STATUS_MAP.get(status)
+
+            # The history filter makes replays after a restart no-ops as well
+            query = {"delivery_tracking_id": tracking_id, "statusHistory.event_key": {"$ne": event_key}}
+            if new_status == OrderStatus.OUT_FOR_DELIVERY.value:
+                # A late InTransit must not move a delivered order backwards
+                query["status"] = {"$ne": OrderStatus.DELIVERED.value}
+
+            update_set = {"delivery_status": status, "updated_at": received_at}
+            if new_status:
+                update_set["status"] = new_status
+
+            operations.append(UpdateOne(query, {
+                "$set": update_set,
+                "$push": {"statusHistory": {
+                    "status": new_status or status,
+                    "by": partner,
+                    "note": f"Delivery partner update: {status}",
+                    "at": timestamp or received_at,
+                    "event_key": event_key,
+                    "batch": batch_id
+                }}
+            }))
+        return operations
+
+    async def _apply(self, batch) -> int:
+        if not batch:
+            return 0
+        batch_id = uuid.uuid4().hex
+        operations = self.build_operations(batch, batch_id)
+        try:
+            # Ordered so that several updates for one tracking id land in arrival order
+            result = await self._db.orders.bulk_write(operations, ordered=True)
+        except Exception as e:
+            # Kept for the next flush, and the partner is told to retry as well (replays are no-ops)
+            self._retry.extend(batch)
+            for _, key, _, _ in batch:
+                self._seen.pop(key, None)
+            self._settle(batch, DeliveryEventNotStored(f"Delivery batch not written: {e}"))
+            raise
+        self._settle(batch)
+        self.stats['batches'] += 1
+        self.stats['applied'] += result.modified_count
+        self.stats['unmatched'] += len(operations) - result.matched_count
+
+        if self.on_applied and result.modified_count:
+            try:
+                await self.on_applied(await self.applied_events(batch, batch_id))
+            except Exception as e:
+                logger.error(f"Delivery webhook on_applied hook error: {e}")
+
+        return result.modified_count
+
+    async def applied_events(self, batch, batch_id: str) -> List[Dict[str, Any]]:
+        """Events of this batch that changed an order (replays, unknown tracking ids and
+        guarded updates wrote no history entry), in arrival order, with their order id"""
+        orders = await self._db.orders.find(
+            {"delivery_tracking_id": {"$in": list({key[0] for _, key, _, _ in batch})}, "statusHistory.batch": batch_id},
+            {"_id": 0, "id": 1, "statusHistory": 1}
+        ).to_list(None)
+        applied = {
+            entry['event_key']: order['id']
+            for order in orders
+            for entry in order.get('statusHistory', [])
+            if entry.get('batch') == batch_id
+        }
+
+        events = []
+        for _, key, _, received_at in batch:
+            order_id = applied.get("|".join(key))
+            if order_id:
+                events.append({
+                    "order_id": order_id,
+                    "tracking_id": key[0],
+                    "delivery_status": key[1],
+                    "status": DELIVERY_STATUS_MAP.get(key[1]),
+                    "at": key[2] or received_at
+                })
+        return events
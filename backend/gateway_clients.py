@@ -0,0 +1,293 @@
+"""
+Async payment gateway clients
+One pooled keep-alive HTTP client per gateway with timeouts, retries with
+jittered backoff and a circuit breaker, so LIVE calls never block the event loop
+"""
+
+from typing import Dict, Any, Optional, Callable, Tuple
+import asyncio
+import logging
+import random
+import time
+import uuid
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying (the request was not processed or may succeed later)
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+# Safe to repeat whatever happened to the first attempt
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+# Errors raised before the request reached the gateway
+NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+class CircuitOpenError(Exception):
+    """Raised while a gateway's circuit is open"""
+
+class GatewayError(Exception):
+    """Raised when a gateway call fails after retries"""
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures; one trial call is let through after ``reset_timeout_s``"""
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout_s: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout_s = reset_timeout_s
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial_in_flight = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if self.clock() - self.opened_at >= self.reset_timeout_s:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self._trial_in_flight = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self._trial_in_flight or self.failures >= self.failure_threshold:
+            self.opened_at = self.clock()
+        self._trial_in_flight = False
+
+def build_order_request(gateway_id: str, order_id: str, amount: float, currency: str) -> Tuple[str, Dict[str, Any]]:
+    """(path, body) of the gateway's create-order call"""
+    if gateway_id == 'razorpay':
+        return "/v1/orders", {"amount": int(round(amount * 100)), "currency": currency, "receipt": order_id}
+    if gateway_id == 'paytm':
+        return "/theia/api/v1/initiateTransaction", {
+            "body": {"orderId": order_id, "txnAmount": {"value": f"{amount:.2f}", "currency": currency}}
+        }
+    if gateway_id == 'payu':
+        return "/payment-links", {"invoiceNumber": order_id, "subAmount": round(amount, 2), "currency": currency}
+    raise ValueError(f"Unknown gateway: {gateway_id}")
+
+def parse_order_response(gateway_id: str, data: Dict[str, Any]) -> Tuple[str, Optional[str]]:
+    """(gateway session id, payment url) from the create-order response"""
+    if gateway_id == 'razorpay':
+        return data['id'], data.get('short_url')
+    if gateway_id == 'paytm':
+        return data['body']['txnToken'], None
+    if gateway_id == 'payu':
+        return data['result']['paymentLinkId'], data['result'].get('paymentLink')
+    raise ValueError(f"Unknown gateway: {gateway_id}")
+
+class GatewayClient:
+    def __init__(
+        self,
+        gateway_id: str,
+        base_url: str,
+        auth: Optional[Tuple[str, str]] = None,
+        timeout_s: float = 5.0,
+        max_connections: int = 50,
+        max_keepalive_connections: int = 20,
+        max_retries: int = 2,
+        backoff_base_s: float = 0.1,
+        backoff_max_s: float = 2.0,
+        breaker: Optional[CircuitBreaker] = None
+    ):
+        self.gateway_id = gateway_id
+        self.base_url = base_url
+        self.auth = auth
+        self.timeout_s = timeout_s
+        self.limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive_connections)
+        self.max_retries = max_retries
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.breaker = breaker or CircuitBreaker()
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "rejected": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url, auth=self.auth, limits=self.limits, timeout=self.timeout_s
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def _backoff(self, attempt: int) -> float:
+        """Full jitter: uniform over [0, base * 2^attempt], capped"""
+        return random.uniform(0, min(self.backoff_max_s, self.backoff_base_s * (2 ** attempt)))
+
+    async def request(
+        self,
+        method: str,
+        path: str,
+        json: Optional[Dict[str, Any]] = None,
+        idempotency_key: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """JSON request with retries; raises CircuitOpenError or GatewayError.
+
+        A non-idempotent call without an ``idempotency_key`` is only retried
+        when it never reached the gateway (connect errors, 429): a timeout or
+        5xx may follow a create that went through.
+        """
+        if not self.breaker.allow():
+            self.stats['rejected'] += 1
+            raise CircuitOpenError(f"{self.gateway_id} circuit open")
+
+        repeatable = method.upper() in IDEMPOTENT_METHODS or idempotency_key is not None
+        headers = {"Idempotency-Key": idempotency_key} if idempotency_key else None
+        last_error = None
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                self.stats['retries'] += 1
+                await asyncio.sleep(self._backoff(attempt - 1))
+
+            self.stats['requests'] += 1
+            try:
+                response = await self.client.request(method, path, json=json, headers=headers)
+            except (httpx.TimeoutException, httpx.TransportError) as e:
+                last_error = e
+                if repeatable or isinstance(e, NOT_SENT_ERRORS):
+                    continue
+                break
+
+            if response.status_code in RETRYABLE_STATUS:
+                last_error = GatewayError(f"{self.gateway_id} returned {response.status_code}")
+                if repeatable or response.status_code == 429:
+                    continue
+                break
+            if response.status_code >= 400:
+                # A client error will not get better by retrying, and says nothing about gateway health
+                self.breaker.record_success()
+                raise GatewayError(f"{self.gateway_id} returned {response.status_code}: {response.text[:200]}")
+
+            self.breaker.record_success()
+            return response.json()
+
+        self.breaker.record_failure()
+        self.stats['failures'] += 1
+        raise GatewayError(f"{self.gateway_id} request failed after {attempt + 1} attempts: {last_error}")
+
+    async def create_order(self, order_id: str, amount: float, currency: str = "INR") -> Tuple[str, Optional[str]]:
+        """Create a gateway order; returns (gateway session id, payment url).
+
+        Every attempt of one call carries the same idempotency key, so a retry
+        after a slow but successful attempt does not create a second order.
+        """
+        path, body = build_order_request(self.gateway_id, order_id, amount, currency)
+        response = await self.request("POST", path, body, idempotency_key=f"{order_id}-{uuid.uuid4().hex}")
+        return parse_order_response(self.gateway_id, response)
+
+def _credentials(settings: Dict[str, Any], prefix: str) -> Tuple[str, str]:
+    """(username, secret) for basic auth: Razorpay key id/secret, Paytm merchant id/key, PayU merchant key/salt"""
+    secret = settings.get(f"{prefix}KeySecret") or settings.get(f"{prefix}MerchantSalt") or settings.get(f"{prefix}MerchantKey") or ""
+    merchant_key = settings.get(f"{prefix}MerchantKey")
+    key_id = (
+        settings.get(f"{prefix}KeyId")
+        or settings.get(f"{prefix}MerchantId")
+        # PayU identifies with its merchant key (the salt is the secret); never send a secret as the username
+        or (merchant_key if merchant_key != secret else None)
+        or ""
+    )
+    return key_id, secret
+
+def create_gateway_client(
+    gateway_id: str,
+    gateway_settings: Dict[str, Any],
+    mode: str,
+    client_settings: Dict[str, Any]
+) -> GatewayClient:
+    """Client for one gateway from its config entry (SANDBOX mode uses the sandbox URL and keys)"""
+    prefix = "sandbox" if mode == "SANDBOX" else "prod"
+    return GatewayClient(
+        gateway_id,
+        gateway_settings[f"{prefix}ApiUrl"],
+        auth=_credentials(gateway_settings, prefix),
+        timeout_s=client_settings.get('timeoutMs', 5000) / 1000,
+        max_connections=client_settings.get('maxConnections', 50),
+        max_keepalive_connections=client_settings.get('maxKeepaliveConnections', 20),
+        max_retries=client_settings.get('maxRetries', 2),
+        backoff_base_s=client_settings.get('backoffBaseMs', 100) / 1000,
+        breaker=CircuitBreaker(
+            failure_threshold=client_settings.get('breakerFailureThreshold', 5),
+            reset_timeout_s=client_settings.get('breakerResetSeconds', 30)
+        )
+    )
+
+async def benchmark(
+    requests: int = 2000,
+    concurrency: int = 20,
+    latency_ms: float = 50.0,
+    failure_rate: float = 0.0,
+    gateway_id: str = "razorpay"
+) -> Dict[str, Any]:
+    """Create-order throughput against the local stub gateway with injected latency"""
+    from stub_servers import create_stub_gateway_app, serve_stub
+
+    app = create_stub_gateway_app(latency_ms=latency_ms, failure_rate=failure_rate, seed=1)
+    async with serve_stub(app) as base_url:
+        client = GatewayClient(
+            gateway_id, base_url, auth=("key", "secret"),
+            max_connections=concurrency, max_keepalive_connections=concurrency,
+            breaker=CircuitBreaker(failure_threshold=10 ** 9)
+        )
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+        errors = 0
+
+        async def one(i: int):
+            nonlocal errors
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    await client.create_order(f"ORD-{i}", 100.0)
+                except GatewayError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - started
+        await client.close()
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "latency_ms": latency_ms,
+        "errors": errors,
+        "retries": client.stats['retries'],
+        "elapsed_s": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        "stub_requests": app.state.requests
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Gateway client throughput against the local stub gateway")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    result = asyncio.run(benchmark(args.requests, args.concurrency, args.latency_ms, args.failure_rate))
+    for key, value in result.items():
+        print(f"{key:>20}: {value}")
@@ -12,6 +12,7 @@ import uuid
 from enhanced_models import InStoreOrder, FileConfiguration
 import boto3
 from pathlib import Path
+from admin_dashboard import dashboard
 
 router = APIRouter(prefix="/api/orders", tags=["instore"])
 
@@ -86,6 +87,8 @@ async def create_instore_order(
         
         # Insert into database
         await db.instore_orders.insert_one(order.model_dump())
+        if order.payment_status == "pending":
+            dashboard.adjust("instore_pending_approval", 1)
         
         # If payment is completed, add to print queue
         if order.payment_status == "paid":
@@ -122,6 +125,7 @@ async def add_to_print_queue(order: InStoreOrder):
     }
     
     await db.print_queue.insert_one(print_job)
+    dashboard.adjust("print_queue_depth", 1)
     
     return print_job["id"]
 
@@ -179,6 +183,7 @@ async def approve_cash_payment(order_id: str):
             "payment_approved_at": datetime.now(timezone.utc).isoformat()
         }}
     )
+    dashboard.adjust("instore_pending_approval", -1)
     
     # Add to print queue
     order_obj = InStoreOrder(**order)
@@ -212,7 +217,7 @@ async def complete_print_job(job_id: str):
     Called by print client after successful printing
     """
     
-    result = await db.print_queue.update_one(
+    job = await db.print_queue.find_one_and_update(
         {"id": job_id},
         {"$set": {
             "status": "completed",
@@ -220,15 +225,15 @@ async def complete_print_job(job_id: str):
         }}
     )
     
-    if result.matched_count == 0:
+    if job is None:
         raise HTTPException(status_code=404, detail="Print job not found")
+    if job.get("status") in ["queued", "processing"]:
+        dashboard.adjust("print_queue_depth", -1)
     
     # Also update the order status
-    job = await db.print_queue.find_one({"id": job_id})
-    if job:
-        await db.instore_orders.update_one(
-            {"id": job["order_id"]},
-            {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}}
-        )
+    await db.instore_orders.update_one(
+        {"id": job["order_id"]},
+        {"$set": {"status": "completed", "completed_at": datetime.now(timezone.utc).isoformat()}}
+    )
     
     return {"success": True, "message": "Print job completed"}
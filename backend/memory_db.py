@@ -0,0 +1,425 @@
+"""
+In-memory stand-in for a Motor database
+Enough of the Motor/MongoDB API for the order, notification and socket paths
+to run without a MongoDB server (load tests on a single box): query and update
+operators used by this codebase, projections, sort/limit cursors, simple
+aggregation and bulk writes. Indexes are accepted and ignored.
+
+Select it with MONGO_URL=memory:// .
+"""
+
+from typing import Dict, Any, List, Optional, Iterable, Union
+from types import SimpleNamespace
+import copy
+import re
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+_MISSING = object()
+
+def _get(doc: Dict[str, Any], path: str) -> Any:
+    value: Any = doc
+    parts = path.split('.')
+    for i, part in enumerate(parts):
+        if isinstance(value, list) and not part.isdigit():
+            # "items.status" on an array: the values from every element (matched like an array field)
+            found = [_get(item, '.'.join(parts[i:])) for item in value if isinstance(item, dict)]
+            found = [v for v in found if v is not _MISSING]
+            return found if found else _MISSING
+        if isinstance(value, dict) and part in value:
+            value = value[part]
+        elif isinstance(value, list) and int(part) < len(value):
+            value = value[int(part)]
+        else:
+            return _MISSING
+    return value
+
+def _set(doc: Dict[str, Any], path: str, value: Any):
+    *parents, last = path.split('.')
+    for part in parents:
+        if not isinstance(doc.get(part), dict):
+            doc[part] = {}
+        doc = doc[part]
+    doc[last] = value
+
+def _unset(doc: Dict[str, Any], path: str):
+    *parents, last = path.split('.')
+    for part in parents:
+        doc = doc.get(part)
+        if not isinstance(doc, dict):
+            return
+    doc.pop(last, None)
+
+def _compare(value: Any, op: str, operand: Any) -> bool:
+    if value is _MISSING or value is None:
+        return False
+    try:
+        if op == '$gt':
+            return value > operand
+        if op == '$gte':
+            return value >= operand
+        if op == '$lt':
+            return value < operand
+        return value <= operand
+    except TypeError:
+        return False
+
+def _equals(value: Any, expected: Any) -> bool:
+    if value is _MISSING:
+        return expected is None
+    if isinstance(value, list) and not isinstance(expected, list):
+        return expected in value
+    return value == expected
+
+def _match_condition(value: Any, condition: Any) -> bool:
+    if isinstance(condition, dict) and condition and all(k.startswith('$') for k in condition):
+        for op, operand in condition.items():
+            if op in ('$gt', '$gte', '$lt', '$lte'):
+                if not _compare(value, op, operand):
+                    return False
+            elif op == '$in':
+                if not any(_equals(value, o) for o in operand):
+                    return False
+            elif op == '$nin':
+                if any(_equals(value, o) for o in operand):
+                    return False
+            elif op == '$ne':
+                if _equals(value, operand):
+                    return False
+            elif op == '$eq':
+                if not _equals(value, operand):
+                    return False
+            elif op == '$exists':
+                if (value is not _MISSING) != bool(operand):
+                    return False
+            elif op == '$regex':
+                flags = re.IGNORECASE if 'i' in condition.get('$options', '') else 0
+                if not isinstance(value, str) or not re.search(operand, value, flags):
+                    return False
+            elif op == '$options':
+                continue
+            else:
+                raise NotImplementedError(f"Query operator {op} is not supported in memory")
+        return True
+    if isinstance(condition, re.Pattern):
+        return isinstance(value, str) and bool(condition.search(value))
+    return _equals(value, condition)
+
+def matches(doc: Dict[str, Any], query: Optional[Dict[str, Any]]) -> bool:
+    for key, condition in (query or {}).items():
+        if key == '$or':
+            if not any(matches(doc, q) for q in condition):
+                return False
+        elif key == '$and':
+            if not all(matches(doc, q) for q in condition):
+                return False
+        elif not _match_condition(_get(doc, key), condition):
+            return False
+    return True
+
+def project(doc: Dict[str, Any], projection: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    if not projection:
+        return copy.deepcopy(doc)
+    include_id = projection.get('_id', 1)
+    fields = {k: v for k, v in projection.items() if k != '_id'}
+    if fields and all(fields.values()):
+        result: Dict[str, Any] = {}
+        for path in fields:
+            value = _get(doc, path)
+            if value is not _MISSING:
+                _set(result, path, copy.deepcopy(value))
+        if include_id and '_id' in doc:
+            result['_id'] = doc['_id']
+        return result
+    result = copy.deepcopy(doc)
+    for path in fields:
+        _unset(result, path)
+    if not include_id:
+        result.pop('_id', None)
+    return result
+
+def _evaluate(expression: Any, doc: Dict[str, Any]) -> Any:
+    """The aggregation expressions used in pipeline updates"""
+    if isinstance(expression, str) and expression.startswith('$'):
+        value = _get(doc, expression[1:])
+        return None if value is _MISSING else value
+    if isinstance(expression, dict) and len(expression) == 1:
+        op, args = next(iter(expression.items()))
+        if op.startswith('$'):
+            values = [_evaluate(a, doc) for a in (args if isinstance(args, list) else [args])]
+            if op == '$max':
+                return max(v for v in values if v is not None)
+            if op == '$min':
+                return min(v for v in values if v is not None)
+            if op == '$subtract':
+                return values[0] - values[1]
+            if op == '$add':
+                return sum(values)
+            if op == '$ifNull':
+                return next((v for v in values if v is not None), None)
+            raise NotImplementedError(f"Expression {op} is not supported in memory")
+    return copy.deepcopy(expression)
+
+def apply_update(doc: Dict[str, Any], update: Union[Dict[str, Any], List[Dict[str, Any]]], inserting: bool = False):
+    if isinstance(update, list):
+        for stage in update:
+            for op, fields in stage.items():
+                if op not in ('$set', '$addFields'):
+                    raise NotImplementedError(f"Pipeline stage {op} is not supported in memory")
+                values = {path: _evaluate(expr, doc) for path, expr in fields.items()}
+                for path, value in values.items():
+                    _set(doc, path, value)
+        return
+
+    for op, fields in update.items():
+        for path, value in fields.items():
+            current = _get(doc, path)
+            if op == '$set':
+                _set(doc, path, copy.deepcopy(value))
+            elif op == '$setOnInsert':
+                if inserting:
+                    _set(doc, path, copy.deepcopy(value))
+            elif op == '$unset':
+                _unset(doc, path)
+            elif op == '$inc':
+                _set(doc, path, (0 if current is _MISSING or current is None else current) + value)
+            elif op == '$max':
+                if current is _MISSING or current is None or value > current:
+                    _set(doc, path, value)
+            elif op == '$min':
+                if current is _MISSING or current is None or value < current:
+                    _set(doc, path, value)
+            elif op == '$push':
+                items = value['$each'] if isinstance(value, dict) and '$each' in value else [value]
+                _set(doc, path, (list(current) if isinstance(current, list) else []) + copy.deepcopy(items))
+            elif op == '$addToSet':
+                existing = list(current) if isinstance(current, list) else []
+                existing.extend(v for v in [value] if v not in existing)
+                _set(doc, path, existing)
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported in memory")
+
+def _sort_key(value: Any):
+    # MongoDB orders missing/None before numbers before strings
+    if value is _MISSING or value is None:
+        return (0, 0)
+    if isinstance(value, (int, float)):
+        return (1, value)
+    return (2, str(value))
+
+class MemoryCursor:
+    def __init__(self, docs: List[Dict[str, Any]], projection: Optional[Dict[str, Any]]):
+        self._docs = docs
+        self._projection = projection
+        self._skip = 0
+        self._limit = 0
+
+    def sort(self, key: Union[str, List], direction: int = 1) -> "MemoryCursor":
+        keys = key if isinstance(key, list) else [(key, direction)]
+        for field, order in reversed(keys):
+            self._docs.sort(key=lambda d: _sort_key(_get(d, field)), reverse=order < 0)
+        return self
+
+    def skip(self, n: int) -> "MemoryCursor":
+        self._skip = n
+        return self
+
+    def limit(self, n: int) -> "MemoryCursor":
+        self._limit = n
+        return self
+
+    def _results(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        docs = self._docs[self._skip:]
+        limits = [n for n in (self._limit, length) if n]
+        if limits:
+            docs = docs[:min(limits)]
+        return [project(d, self._projection) for d in docs]
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._results(length)
+
+    def __aiter__(self):
+        self._iter = iter(self._results())
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class MemoryCollection:
+    def __init__(self, name: str):
+        self.name = name
+        self.docs: List[Dict[str, Any]] = []
+        # Point lookups by the application "id" field skip the scan
+        self._by_id: Dict[Any, Dict[str, Any]] = {}
+
+    def _candidates(self, query: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        key = (query or {}).get('id')
+        if isinstance(key, str):
+            doc = self._by_id.get(key)
+            return [doc] if doc is not None else []
+        return self.docs
+
+    def _reindex(self):
+        self._by_id = {d['id']: d for d in self.docs if 'id' in d}
+
+    async def create_index(self, keys, **kwargs) -> str:
+        return keys if isinstance(keys, str) else "_".join(f"{k}_{d}" for k, d in keys)
+
+    def _insert(self, doc: Dict[str, Any]) -> Any:
+        doc.setdefault('_id', ObjectId())
+        stored = copy.deepcopy(doc)
+        self.docs.append(stored)
+        if 'id' in stored:
+            self._by_id[stored['id']] = stored
+        return doc['_id']
+
+    async def insert_one(self, doc: Dict[str, Any]):
+        return SimpleNamespace(inserted_id=self._insert(doc), acknowledged=True)
+
+    async def insert_many(self, docs: Iterable[Dict[str, Any]], ordered: bool = True):
+        return SimpleNamespace(inserted_ids=[self._insert(d) for d in docs], acknowledged=True)
+
+    def find(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None) -> MemoryCursor:
+        return MemoryCursor([d for d in self._candidates(query) if matches(d, query)], projection)
+
+    async def find_one(self, query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None):
+        doc = next((d for d in self._candidates(query) if matches(d, query)), None)
+        return project(doc, projection) if doc is not None else None
+
+    def _upsert(self, query: Dict[str, Any], update) -> Dict[str, Any]:
+        doc = {k: copy.deepcopy(v) for k, v in query.items() if not k.startswith('$') and not isinstance(v, dict)}
+        apply_update(doc, update, inserting=True)
+        self._insert(doc)
+        return self.docs[-1]
+
+    async def update_one(self, query: Dict[str, Any], update, upsert: bool = False):
+        doc = next((d for d in self._candidates(query) if matches(d, query)), None)
+        if doc is None:
+            upserted_id = self._upsert(query, update)['_id'] if upsert else None
+            return SimpleNamespace(matched_count=0, modified_count=0, upserted_id=upserted_id)
+        before = copy.deepcopy(doc)
+        apply_update(doc, update)
+        return SimpleNamespace(matched_count=1, modified_count=int(doc != before), upserted_id=None)
+
+    async def update_many(self, query: Dict[str, Any], update, upsert: bool = False):
+        matched = [d for d in self._candidates(query) if matches(d, query)]
+        modified = 0
+        for doc in matched:
+            before = copy.deepcopy(doc)
+            apply_update(doc, update)
+            modified += doc != before
+        upserted_id = self._upsert(query, update)['_id'] if upsert and not matched else None
+        return SimpleNamespace(matched_count=len(matched), modified_count=modified, upserted_id=upserted_id)
+
+    async def find_one_and_update(
+        self,
+        query: Dict[str, Any],
+        update,
+        projection: Optional[Dict[str, Any]] = None,
+        upsert: bool = False,
+        return_document: bool = ReturnDocument.BEFORE,
+        **kwargs
+    ):
+        doc = next((d for d in self._candidates(query) if matches(d, query)), None)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = self._upsert(query, update)
+            return project(doc, projection) if return_document == ReturnDocument.AFTER else None
+        before = project(doc, projection)
+        apply_update(doc, update)
+        return project(doc, projection) if return_document == ReturnDocument.AFTER else before
+
+    async def delete_one(self, query: Dict[str, Any]):
+        for i, doc in enumerate(self.docs):
+            if matches(doc, query):
+                del self.docs[i]
+                self._reindex()
+                return SimpleNamespace(deleted_count=1)
+        return SimpleNamespace(deleted_count=0)
+
+    async def delete_many(self, query: Dict[str, Any]):
+        kept = [d for d in self.docs if not matches(d, query)]
+        deleted = len(self.docs) - len(kept)
+        self.docs = kept
+        self._reindex()
+        return SimpleNamespace(deleted_count=deleted)
+
+    async def count_documents(self, query: Optional[Dict[str, Any]] = None, **kwargs) -> int:
+        return sum(1 for d in self._candidates(query) if matches(d, query))
+
+    async def estimated_document_count(self) -> int:
+        return len(self.docs)
+
+    async def bulk_write(self, operations: List[Any], ordered: bool = True):
+        matched = modified = 0
+        for operation in operations:
+            many = type(operation).__name__ == 'UpdateMany'
+            method = self.update_many if many else self.update_one
+            result = await method(operation._filter, operation._doc, upsert=bool(operation._upsert))
+            matched += result.matched_count
+            modified += result.modified_count
+        return SimpleNamespace(matched_count=matched, modified_count=modified)
+
+    def aggregate(self, pipeline: List[Dict[str, Any]]) -> MemoryCursor:
+        docs = [copy.deepcopy(d) for d in self.docs]
+        for stage in pipeline:
+            (op, spec), = stage.items()
+            if op == '$match':
+                docs = [d for d in docs if matches(d, spec)]
+            elif op == '$sort':
+                cursor = MemoryCursor(docs, None).sort(list(spec.items()))
+                docs = cursor._docs
+            elif op == '$limit':
+                docs = docs[:spec]
+            elif op == '$group':
+                groups: Dict[Any, Dict[str, Any]] = {}
+                for doc in docs:
+                    key = _evaluate(spec['_id'], doc)
+                    group = groups.setdefault(repr(key), {'_id': key})
+                    for field, accumulator in spec.items():
+                        if field == '_id':
+                            continue
+                        (acc, expr), = accumulator.items()
+                        if acc != '$sum':
+                            raise NotImplementedError(f"Accumulator {acc} is not supported in memory")
+                        group[field] = group.get(field, 0) + (_evaluate(expr, doc) or 0)
+                docs = list(groups.values())
+            else:
+                raise NotImplementedError(f"Aggregation stage {op} is not supported in memory")
+        return MemoryCursor(docs, None)
+
+class MemoryDatabase:
+    def __init__(self, name: str = "memory"):
+        self.name = name
+        self._collections: Dict[str, MemoryCollection] = {}
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        if name not in self._collections:
+            self._collections[name] = MemoryCollection(name)
+        return self._collections[name]
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith('_'):
+            raise AttributeError(name)
+        return self[name]
+
+    async def list_collection_names(self) -> List[str]:
+        return list(self._collections)
+
+class MemoryClient:
+    """Stands in for AsyncIOMotorClient(url)"""
+
+    def __init__(self, url: str = "memory://", **kwargs):
+        self._databases: Dict[str, MemoryDatabase] = {}
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        if name not in self._databases:
+            self._databases[name] = MemoryDatabase(name)
+        return self._databases[name]
+
+    def close(self):
+        pass
@@ -140,6 +140,7 @@ class Vendor(BaseModel):
     location: VendorLocation
     contact_phone: str
     contact_email: str
+    preferred_language: str = "en"  # en, te, hi
     password_hash: Optional[str] = None
     address: str = ""
     working_hours: str = "9 AM - 6 PM"
@@ -208,6 +209,7 @@ class Order(BaseModel):
     customer_email: str
     customer_phone: str
     customer_name: str
+    preferred_language: Optional[str] = None  # en, te, hi
     items: List[OrderItem]
     fulfillment_type: FulfillmentType
     customer_location: Optional[VendorLocation] = None
@@ -239,6 +241,7 @@ class OrderCreate(BaseModel):
     customer_email: str
     customer_phone: str
     customer_name: str
+    preferred_language: Optional[str] = None  # en, te, hi
     items: List[OrderItem]
     fulfillment_type: FulfillmentType
     customer_location: Optional[VendorLocation] = None
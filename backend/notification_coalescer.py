@@ -0,0 +1,91 @@
+"""
+Per-recipient notification coalescing
+Notifications for a recipient are held for a short window and delivered
+together as one digest; critical events flush the recipient's buffer at once
+"""
+
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Iterable
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+Deliver = Callable[[str, List[Dict[str, Any]]], Awaitable[None]]
+
+class NotificationCoalescer:
+    """Buffers events per recipient for ``window_s`` and hands each batch to ``deliver``.
+
+    A window starts with the first buffered event and is not extended by later
+    ones, so no event waits longer than ``window_s``. A buffer reaching
+    ``max_batch`` or a critical event is delivered immediately, keeping order.
+    """
+
+    def __init__(
+        self,
+        deliver: Deliver,
+        window_s: float = 0.5,
+        max_batch: int = 20,
+        critical_types: Optional[Iterable[str]] = None
+    ):
+        self.deliver = deliver
+        self.window_s = window_s
+        self.max_batch = max_batch
+        self.critical_types = set(critical_types or ())
+        self._buffers: Dict[str, List[Dict[str, Any]]] = {}
+        self._timers: Dict[str, asyncio.TimerHandle] = {}
+        self._pending: set = set()
+        self.stats = {"events": 0, "deliveries": 0, "critical": 0}
+
+    @classmethod
+    def from_settings(cls, deliver: Deliver, settings: Dict[str, Any]) -> "NotificationCoalescer":
+        return cls(
+            deliver,
+            window_s=settings.get('windowMs', 500) / 1000,
+            max_batch=settings.get('maxBatch', 20),
+            critical_types=settings.get('criticalEvents', [])
+        )
+
+    async def add(self, recipient: str, event: Dict[str, Any], critical: bool = False):
+        """Buffer an event (``type`` decides criticality unless ``critical`` is given)"""
+        self.stats['events'] += 1
+        buffer = self._buffers.setdefault(recipient, [])
+        buffer.append(event)
+
+        if critical or event.get('type') in self.critical_types:
+            self.stats['critical'] += 1
+            await self.flush(recipient)
+        elif len(buffer) >= self.max_batch or self.window_s <= 0:
+            await self.flush(recipient)
+        elif recipient not in self._timers:
+            loop = asyncio.get_running_loop()
+            self._timers[recipient] = loop.call_later(self.window_s, self._flush_later, recipient)
+
+    def _flush_later(self, recipient: str):
+        self._timers.pop(recipient, None)
+        task = asyncio.ensure_future(self.flush(recipient))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def flush(self, recipient: str):
+        timer = self._timers.pop(recipient, None)
+        if timer:
+            timer.cancel()
+        events = self._buffers.pop(recipient, None)
+        if not events:
+            return
+        self.stats['deliveries'] += 1
+        try:
+            await self.deliver(recipient, events)
+        except Exception as e:
+            logger.error(f"Notification delivery to {recipient} failed: {e}")
+
+    async def flush_all(self):
+        """Deliver everything buffered (e.g. on shutdown)"""
+        for recipient in list(self._buffers):
+            await self.flush(recipient)
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+    @property
+    def buffered(self) -> int:
+        return sum(len(events) for events in self._buffers.values())
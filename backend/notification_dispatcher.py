@@ -0,0 +1,366 @@
+"""
+Background notification dispatcher
+Handlers only enqueue; per-channel worker pools send in batches (where the
+provider supports it) under a rate limit, retry with backoff, and spill to the
+notification_outbox collection when the in-memory queue is full. WhatsApp
+messages to the same number within a short window are sent as one digest
+"""
+
+from typing import Dict, Any, List, Optional, Callable, Awaitable, Tuple
+from datetime import datetime, timezone, timedelta
+import asyncio
+import logging
+import random
+import time
+import uuid
+from models import NotificationLog
+from notifications import NotificationService, load_notification_settings
+from notification_coalescer import NotificationCoalescer
+
+logger = logging.getLogger(__name__)
+
+WHATSAPP = "whatsapp"
+EMAIL = "email"
+
+# Channels whose provider accepts several messages per request
+BATCH_CHANNELS = {EMAIL}
+
+class RateLimiter:
+    """Token bucket: ``rate`` messages per second with up to one second of burst"""
+
+    def __init__(self, rate: float, burst: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate
+        self.capacity = max(burst or rate, 1)
+        self.tokens = self.capacity
+        self.clock = clock
+        self.updated = clock()
+
+    async def acquire(self, n: int = 1):
+        while True:
+            now = self.clock()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= n:
+                self.tokens -= n
+                return
+            await asyncio.sleep((n - self.tokens) / self.rate)
+
+class NotificationDispatcher:
+    def __init__(
+        self,
+        service: NotificationService,
+        settings: Optional[Dict[str, Any]] = None,
+        on_sent: Optional[Callable[[List[NotificationLog]], Awaitable[None]]] = None
+    ):
+        self.service = service
+        self.on_sent = on_sent
+        settings = settings if settings is not None else load_notification_settings().get('dispatcher', {})
+        self.refill_interval_s = settings.get('spillRefillIntervalSeconds', 5)
+        # A refill claim left by a worker that died is taken over after this long
+        self.claim_timeout = timedelta(seconds=settings.get('spillClaimTimeoutSeconds', 300))
+        self.channels: Dict[str, Dict[str, Any]] = {}
+        for channel in (WHATSAPP, EMAIL):
+            channel_settings = settings.get(channel, {})
+            batch_size = channel_settings.get('batchSize', 1) if channel in BATCH_CHANNELS else 1
+            self.channels[channel] = {
+                "queue": asyncio.Queue(maxsize=channel_settings.get('maxQueue', 5000)),
+                "workers": channel_settings.get('workers', 2),
+                "batch_size": batch_size,
+                "limiter": RateLimiter(channel_settings.get('ratePerSecond', 50), burst=batch_size),
+                "max_retries": channel_settings.get('maxRetries', 3),
+                "backoff_base_s": channel_settings.get('backoffBaseMs', 500) / 1000
+            }
+        self.stats = {
+            channel: {"enqueued": 0, "sent": 0, "failed": 0, "retried": 0, "spilled": 0, "refilled": 0}
+            for channel in self.channels
+        }
+        # id(item) -> (timer, channel, item) for messages waiting out their backoff
+        self._retries: Dict[int, Tuple[asyncio.TimerHandle, str, Dict[str, Any]]] = {}
+        self._in_flight = 0
+        self._tasks: List[asyncio.Task] = []
+        self._db = None
+        whatsapp_settings = settings.get(WHATSAPP, {})
+        self._coalescer: Optional[NotificationCoalescer] = None
+        if whatsapp_settings.get('coalesceWindowMs', 0) > 0:
+            self._coalescer = NotificationCoalescer(
+                self._enqueue_whatsapp_digest,
+                window_s=whatsapp_settings['coalesceWindowMs'] / 1000,
+                max_batch=whatsapp_settings.get('coalesceMaxBatch', 5)
+            )
+
+    async def enqueue_whatsapp(self, recipient: str, message: str, order_id: str = None, critical: bool = False):
+        """Queue a WhatsApp message; non-critical ones may be merged with others to the same number"""
+        item = {"recipient": recipient, "message": message, "order_id": order_id}
+        if self._coalescer:
+            await self._coalescer.add(recipient, item, critical)
+        else:
+            await self.enqueue(WHATSAPP, item)
+
+    async def _enqueue_whatsapp_digest(self, recipient: str, items: List[Dict[str, Any]]):
+        if len(items) == 1:
+            await self.enqueue(WHATSAPP, items[0])
+            return
+        order_ids = list(dict.fromkeys(item['order_id'] for item in items if item.get('order_id')))
+        await self.enqueue(WHATSAPP, {
+            "recipient": recipient,
+            "message": "\n\n".join(item['message'] for item in items),
+            "order_id": order_ids[0] if order_ids else None,
+            "order_ids": order_ids
+        })
+
+    async def enqueue_email(self, recipient: str, subject: str, message: str, order_id: str = None):
+        await self.enqueue(EMAIL, {"recipient": recipient, "subject": subject, "message": message, "order_id": order_id})
+
+    async def enqueue(self, channel: str, item: Dict[str, Any]):
+        """Queue a message; only touches the database when the queue is full"""
+        item.setdefault('attempts', 0)
+        self.stats[channel]['enqueued'] += 1
+        try:
+            self.channels[channel]['queue'].put_nowait(item)
+        except asyncio.QueueFull:
+            await self._spill(channel, [item])
+
+    async def _spill(self, channel: str, items: List[Dict[str, Any]]):
+        if self._db is None:
+            logger.error(f"{channel} queue full and no outbox available, dropping {len(items)} notifications")
+            self.stats[channel]['failed'] += len(items)
+            return
+        now = datetime.now(timezone.utc).isoformat()
+        await self._db.notification_outbox.insert_many([
+            {"channel": channel, "item": item, "created_at": now} for item in items
+        ])
+        self.stats[channel]['spilled'] += len(items)
+
+    async def start(self, db):
+        """Start worker pools and the outbox refill loop"""
+        self._db = db
+        await db.notification_outbox.create_index([("channel", 1), ("created_at", 1)])
+        await db.notification_outbox.create_index("claimed_by", sparse=True)
+        for channel, config in self.channels.items():
+            for _ in range(config['workers']):
+                self._tasks.append(asyncio.create_task(self._worker(channel)))
+        self._tasks.append(asyncio.create_task(self._refill_loop()))
+
+    @property
+    def idle(self) -> bool:
+        """Nothing buffered, queued, being sent or waiting to be retried"""
+        return (
+            not self._in_flight and not self._retries
+            and not (self._coalescer and self._coalescer.buffered)
+            and all(c['queue'].empty() for c in self.channels.values())
+        )
+
+    async def stop(self):
+        """Drain buffered and queued messages, spill pending retries, then stop the workers"""
+        if self._coalescer:
+            await self._coalescer.flush_all()
+        if self._tasks:
+            for config in self.channels.values():
+                await config['queue'].join()
+
+        pending: Dict[str, List[Dict[str, Any]]] = {}
+        for handle, channel, item in self._retries.values():
+            handle.cancel()
+            pending.setdefault(channel, []).append(item)
+        self._retries.clear()
+        for channel, items in pending.items():
+            await self._spill(channel, items)
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _worker(self, channel: str):
+        config = self.channels[channel]
+        queue: asyncio.Queue = config['queue']
+        while True:
+            batch = [await queue.get()]
+            while len(batch) < config['batch_size'] and not queue.empty():
+                batch.append(queue.get_nowait())
+            self._in_flight += len(batch)
+            try:
+                await config['limiter'].acquire(len(batch))
+                await self._send(channel, batch)
+            except Exception as e:
+                logger.error(f"{channel} worker error: {e}")
+            finally:
+                self._in_flight -= len(batch)
+                for _ in batch:
+                    queue.task_done()
+
+    async def _send(self, channel: str, batch: List[Dict[str, Any]]):
+        try:
+            if channel == EMAIL:
+                logs = await self.service.send_email_batch(batch)
+            else:
+                logs = []
+                for item in batch:
+                    log = await self.service.send_whatsapp(item['recipient'], item['message'], item.get('order_id'))
+                    # A digest is logged against every order it covers
+                    logs.append(log)
+                    logs.extend(log.model_copy(update={"id": str(uuid.uuid4()), "order_id": order_id}) for order_id in item.get('order_ids', [])[1:])
+        except Exception as e:
+            self._schedule_retry(channel, batch, e)
+            return
+
+        self.stats[channel]['sent'] += len(batch)
+        await self._report(logs)
+
+    def _schedule_retry(self, channel: str, batch: List[Dict[str, Any]], error: Exception):
+        config = self.channels[channel]
+        failed_logs = []
+        loop = asyncio.get_running_loop()
+        for item in batch:
+            item['attempts'] += 1
+            if item['attempts'] > config['max_retries']:
+                self.stats[channel]['failed'] += 1
+                failed_logs.append(NotificationLog(
+                    type="Email" if channel == EMAIL else "WhatsApp",
+                    recipient=item['recipient'],
+                    subject=item.get('subject'),
+                    message=item['message'],
+                    order_id=item.get('order_id'),
+                    status="Failed"
+                ))
+                continue
+            # Full jitter so a provider outage does not turn into synchronized retry waves
+            delay = random.uniform(0, config['backoff_base_s'] * (2 ** (item['attempts'] - 1)))
+            self._retries[id(item)] = (loop.call_later(delay, self._requeue, channel, item), channel, item)
+            self.stats[channel]['retried'] += 1
+
+        if failed_logs:
+            logger.error(f"{channel}: {len(failed_logs)} notifications failed after retries: {error}")
+            asyncio.ensure_future(self._report(failed_logs))
+
+    def _requeue(self, channel: str, item: Dict[str, Any]):
+        self._retries.pop(id(item), None)
+        try:
+            self.channels[channel]['queue'].put_nowait(item)
+        except asyncio.QueueFull:
+            asyncio.ensure_future(self._spill(channel, [item]))
+
+    async def _report(self, logs: List[NotificationLog]):
+        if self.on_sent and logs:
+            try:
+                await self.on_sent(logs)
+            except Exception as e:
+                logger.error(f"Notification on_sent hook error: {e}")
+
+    async def _refill_loop(self):
+        while True:
+            await asyncio.sleep(self.refill_interval_s)
+            try:
+                await self.refill()
+            except Exception as e:
+                logger.error(f"Notification outbox refill error: {e}")
+
+    async def refill(self) -> int:
+        """Move spilled messages back into queues that have drained below half. Messages are
+        claimed first (each update is atomic, so two workers never take the same one) and
+        deleted only once they are queued"""
+        moved = 0
+        outbox = self._db.notification_outbox
+        for channel, config in self.channels.items():
+            queue: asyncio.Queue = config['queue']
+            free = queue.maxsize // 2 - queue.qsize()
+            if free <= 0:
+                continue
+            now = datetime.now(timezone.utc)
+            claimable = {
+                "channel": channel,
+                "$or": [{"claimed_by": None}, {"claimed_at": {"$lt": (now - self.claim_timeout).isoformat()}}]
+            }
+            candidates = await outbox.find(claimable, {"_id": 1}).sort("created_at", 1).limit(free).to_list(free)
+            if not candidates:
+                continue
+            claim = str(uuid.uuid4())
+            await outbox.update_many(
+                {**claimable, "_id": {"$in": [doc['_id'] for doc in candidates]}},
+                {"$set": {"claimed_by": claim, "claimed_at": now.isoformat()}}
+            )
+            docs = await outbox.find({"claimed_by": claim}).sort("created_at", 1).to_list(None)
+
+            queued = []
+            for doc in docs:
+                try:
+                    queue.put_nowait(doc['item'])
+                except asyncio.QueueFull:
+                    break
+                queued.append(doc['_id'])
+            if queued:
+                await outbox.delete_many({"_id": {"$in": queued}})
+            if len(queued) < len(docs):
+                # New messages filled the queue while claiming; leave the rest for the next pass
+                await outbox.update_many({"claimed_by": claim}, {"$unset": {"claimed_by": "", "claimed_at": ""}})
+            self.stats[channel]['refilled'] += len(queued)
+            moved += len(queued)
+        return moved
+
+async def benchmark(
+    messages: int = 2000,
+    latency_ms: float = 50.0,
+    failure_rate: float = 0.0,
+    whatsapp_workers: Optional[int] = None
+) -> Dict[str, Any]:
+    """Drain time for a mixed WhatsApp/email burst against the local stub provider"""
+    from stub_servers import create_stub_notification_app, serve_stub
+
+    app = create_stub_notification_app(latency_ms=latency_ms, failure_rate=failure_rate, seed=1)
+    async with serve_stub(app) as base_url:
+        service = NotificationService(mode="LIVE", providers={
+            "whatsapp": {"apiUrl": base_url, "phoneNumberId": "bench", "accessToken": "token"},
+            "email": {"apiUrl": base_url, "apiKey": "key", "fromEmail": "bench@example.com"},
+            "maxConnections": 20
+        })
+        settings = load_notification_settings().get('dispatcher', {})
+        for channel in (WHATSAPP, EMAIL):
+            settings[channel] = {
+                **settings.get(channel, {}), "ratePerSecond": 10 ** 6, "maxQueue": messages, "backoffBaseMs": 10, "coalesceWindowMs": 0
+            }
+        if whatsapp_workers:
+            settings[WHATSAPP]['workers'] = whatsapp_workers
+        dispatcher = NotificationDispatcher(service, settings)
+        dispatcher._tasks = [
+            asyncio.create_task(dispatcher._worker(channel))
+            for channel, config in dispatcher.channels.items()
+            for _ in range(config['workers'])
+        ]
+
+        started = time.perf_counter()
+        for i in range(messages):
+            if i % 2:
+                await dispatcher.enqueue_email(f"customer{i}@example.com", "Order update", f"Order ORD-{i} is ready", f"ORD-{i}")
+            else:
+                await dispatcher.enqueue_whatsapp(f"+9199000{i:05d}", f"Order ORD-{i} is ready", f"ORD-{i}")
+        enqueue_s = time.perf_counter() - started
+
+        while not dispatcher.idle:
+            await asyncio.sleep(0.01)
+        await dispatcher.stop()
+        elapsed = time.perf_counter() - started
+        await service.close()
+
+    return {
+        "messages": messages,
+        "latency_ms": latency_ms,
+        "enqueue_us_per_message": round(enqueue_s / messages * 1e6, 2),
+        "drain_s": round(elapsed, 3),
+        "messages_per_second": round(messages / elapsed, 1),
+        "provider_requests": app.state.requests,
+        "stats": dispatcher.stats
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Notification dispatcher throughput against the local stub provider")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--whatsapp-workers", type=int, default=None)
+    args = parser.parse_args()
+
+    result = asyncio.run(benchmark(args.messages, args.latency_ms, args.failure_rate, args.whatsapp_workers))
+    for key, value in result.items():
+        print(f"{key:>24}: {value}")
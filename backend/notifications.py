@@ -1,13 +1,45 @@
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
 from datetime import datetime, timezone
+from pathlib import Path
+from pymongo.errors import BulkWriteError
 from models import NotificationLog
+from notification_templates import render_template
+import asyncio
+import json
 import logging
+import httpx
 
 logger = logging.getLogger(__name__)
 
+DUPLICATE_KEY_ERROR = 11000
+
+CONFIG_PATH = Path(__file__).parent / "config" / "notifications.json"
+
+def load_notification_settings() -> Dict[str, Any]:
+    """Load notification provider and dispatcher settings from config"""
+    with open(CONFIG_PATH, 'r') as f:
+        return json.load(f)
+
 class NotificationService:
-    def __init__(self, mode: str = "SIMULATED"):
+    def __init__(self, mode: str = "SIMULATED", providers: Optional[Dict[str, Any]] = None):
         self.mode = mode
+        self.providers = providers if providers is not None else load_notification_settings().get('providers', {})
+        self._client: Optional[httpx.AsyncClient] = None
+    
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared keep-alive client for provider APIs"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=self.providers.get('timeoutMs', 5000) / 1000,
+                limits=httpx.Limits(max_connections=self.providers.get('maxConnections', 50))
+            )
+        return self._client
+    
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def send_whatsapp(self, recipient: str, message: str, order_id: str = None) -> NotificationLog:
         """Send WhatsApp notification"""
@@ -23,60 +55,211 @@ class NotificationService:
             logger.info(f"[SIMULATED WhatsApp] To: {recipient} | Message: {message}")
         else:
             # Real WhatsApp integration (Meta WhatsApp Business API)
-            # await self._send_whatsapp_live(recipient, message)
-            pass
+            await self._send_whatsapp_live(recipient, message)
         
         return log
     
     async def send_email(self, recipient: str, subject: str, message: str, order_id: str = None) -> NotificationLog:
         """Send Email notification"""
-        log = NotificationLog(
-            type="Email",
-            recipient=recipient,
-            subject=subject,
-            message=message,
-            order_id=order_id,
-            status="Simulated" if self.mode == "SIMULATED" else "Sent"
-        )
+        logs = await self.send_email_batch([
+            {"recipient": recipient, "subject": subject, "message": message, "order_id": order_id}
+        ])
+        return logs[0]
+    
+    async def send_email_batch(self, emails: List[Dict[str, Any]]) -> List[NotificationLog]:
+        """Send several emails in one provider call (keys: recipient, subject, message, order_id)"""
+        logs = [
+            NotificationLog(
+                type="Email",
+                recipient=email['recipient'],
+                subject=email.get('subject'),
+                message=email['message'],
+                order_id=email.get('order_id'),
+                status="Simulated" if self.mode == "SIMULATED" else "Sent"
+            )
+            for email in emails
+        ]
         
         if self.mode == "SIMULATED":
-            logger.info(f"[SIMULATED Email] To: {recipient} | Subject: {subject} | Message: {message}")
+            for email in emails:
+                logger.info(f"[SIMULATED Email] To: {email['recipient']} | Subject: {email.get('subject')} | Message: {email['message']}")
         else:
-            # Real Email integration (SMTP/SendGrid)
-            # await self._send_email_live(recipient, subject, message)
-            pass
+            # Real Email integration (SendGrid)
+            await self._send_email_live(emails)
         
-        return log
+        return logs
     
     async def _send_whatsapp_live(self, recipient: str, message: str):
         """Send WhatsApp via Meta WhatsApp Business API (real implementation)"""
-        # This would use Meta WhatsApp Business API
-        # Requires: phone_number_id, access_token
-        # import requests
-        # url = f"https://graph.facebook.com/v18.0/{phone_number_id}/messages"
-        # headers = {"Authorization": f"Bearer {access_token}"}
-        # data = {
-        #     "messaging_product": "whatsapp",
-        #     "to": recipient,
-        #     "text": {"body": message}
-        # }
-        # response = requests.post(url, json=data, headers=headers)
-        pass
+        provider = self.providers['whatsapp']
+        response = await self.client.post(
+            f"{provider['apiUrl']}/{provider['phoneNumberId']}/messages",
+            headers={"Authorization": f"Bearer {provider['accessToken']}"},
+            json={
+                "messaging_product": "whatsapp",
+                "to": recipient,
+                "text": {"body": message}
+            }
+        )
+        response.raise_for_status()
     
-    async def _send_email_live(self, recipient: str, subject: str, message: str):
-        """Send Email via SMTP/SendGrid (real implementation)"""
-        # This would use SMTP or SendGrid
-        pass
+    async def _send_email_live(self, emails: List[Dict[str, Any]]):
+        """Send Email via SendGrid; one request carries a personalization per message"""
+        provider = self.providers['email']
+        response = await self.client.post(
+            f"{provider['apiUrl']}/v3/mail/send",
+            headers={"Authorization": f"Bearer {provider['apiKey']}"},
+            json={
+                "from": {"email": provider['fromEmail']},
+                "personalizations": [
+                    {
+                        "to": [{"email": email['recipient']}],
+                        "subject": email.get('subject') or "",
+                        "substitutions": {"-body-": email['message']}
+                    }
+                    for email in emails
+                ],
+                "content": [{"type": "text/plain", "value": "-body-"}]
+            }
+        )
+        response.raise_for_status()
+
+class NotificationLogWriter:
+    """Buffers NotificationLogs and writes them to notification_logs with insert_many.
+
+    A flush happens when ``batch_size`` logs are buffered, every
+    ``flush_interval_s``, and on shutdown. If the database falls behind, the
+    oldest buffered logs beyond ``max_buffer`` are dropped.
+    """
+    
+    def __init__(self, settings: Optional[Dict[str, Any]] = None):
+        settings = settings if settings is not None else load_notification_settings().get('logs', {})
+        self.batch_size = settings.get('batchSize', 500)
+        self.flush_interval_s = settings.get('flushIntervalSeconds', 2)
+        self.retention_days = settings.get('retentionDays', 90)
+        self.max_buffer = settings.get('maxBuffer', 20000)
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._pending: set = set()
+        self._db = None
+        self.stats = {"written": 0, "flushes": 0, "dropped": 0}
+    
+    async def ensure_indexes(self, db):
+        # created_at is stored as a BSON date (not an ISO string) so the TTL index can expire it
+        await db.notification_logs.create_index("created_at", expireAfterSeconds=self.retention_days * 86400)
+        await db.notification_logs.create_index([("order_id", 1), ("created_at", -1), ("id", -1)])
+        await db.notification_logs.create_index([("recipient", 1), ("created_at", -1), ("id", -1)])
+    
+    async def start(self, db):
+        self._db = db
+        await self.ensure_indexes(db)
+        self._task = asyncio.create_task(self._run())
+    
+    async def stop(self):
+        """Stop the timer and write whatever is buffered"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._db is not None:
+            await self.flush()
+    
+    async def add(self, logs: List[NotificationLog]):
+        """Buffer logs (used as the dispatcher's on_sent hook)"""
+        self._buffer.extend(log.model_dump() for log in logs)
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.stats['dropped'] += overflow
+            logger.warning(f"Notification log buffer full, dropped {overflow} oldest logs")
+        if len(self._buffer) >= self.batch_size and not self._flush_lock.locked():
+            task = asyncio.ensure_future(self.flush())
+            self._pending.add(task)
+            task.add_done_callback(self._flush_done)
+    
+    def _flush_done(self, task: asyncio.Task):
+        self._pending.discard(task)
+        if not task.cancelled() and task.exception():
+            logger.error(f"Notification log flush error: {task.exception()}")
+    
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Notification log flush error: {e}")
+    
+    async def flush(self) -> int:
+        """Write buffered logs in batches; returns number written"""
+        if self._db is None:
+            return 0
+        written = 0
+        async with self._flush_lock:
+            try:
+                while self._buffer:
+                    batch = self._buffer[:self.batch_size]
+                    del self._buffer[:self.batch_size]
+                    try:
+                        # Copies: insert_many sets _id in place, which would turn every retry into duplicates
+                        await self._db.notification_logs.insert_many([dict(log) for log in batch], ordered=False)
+                    except BulkWriteError as e:
+                        # Stored (or duplicate) logs are done; only the failed ones go back in front
+                        failed = {
+                            err['index'] for err in e.details.get('writeErrors', [])
+                            if err.get('code') != DUPLICATE_KEY_ERROR
+                        }
+                        self._buffer[:0] = [log for i, log in enumerate(batch) if i in failed]
+                        written += len(batch) - len(failed)
+                        raise
+                    except Exception:
+                        # Put the batch back in front; the next flush retries it
+                        self._buffer[:0] = batch
+                        raise
+                    written += len(batch)
+                    self.stats['flushes'] += 1
+            finally:
+                self.stats['written'] += written
+        return written
+
+def log_page_cursor(log: Dict[str, Any]) -> str:
+    """``before`` value for the log page after this log: created_at plus id, so logs written in
+    the same batch (same timestamp) are not skipped"""
+    return f"{log['created_at'].isoformat()}|{log['id']}"
+
+def _log_before_query(before: str) -> Dict[str, Any]:
+    """Logs older than a log_page_cursor (a bare timestamp also works); ValueError if malformed"""
+    created_at, _, log_id = before.partition("|")
+    created_at = datetime.fromisoformat(created_at)
+    if not log_id:
+        return {"created_at": {"$lt": created_at}}
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": log_id}}
+    ]}
+
+async def get_log_page(db, query: Dict[str, Any], limit: int, before: Optional[str] = None) -> Dict[str, Any]:
+    """Newest-first page of notification logs matching ``query`` after the ``before`` cursor"""
+    if before:
+        query = {**query, **_log_before_query(before)}
+    logs = await db.notification_logs.find(query, {"_id": 0}).sort(
+        [("created_at", -1), ("id", -1)]
+    ).limit(limit).to_list(None)
+    return {"logs": logs, "next_before": log_page_cursor(logs[-1]) if len(logs) == limit else None}
 
 # Notification templates
-def get_order_confirmation_message(order_id: str, total: float) -> str:
-    return f"Your order {order_id} has been confirmed! Total: ₹{total:.2f}. We'll notify you once it's ready."
+def get_order_confirmation_message(order_id: str, total: float, locale: Optional[str] = None) -> str:
+    return render_template("order_confirmed", locale, order_id=order_id, total=total)
 
-def get_order_ready_message(order_id: str, fulfillment_type: str) -> str:
+def get_order_ready_message(order_id: str, fulfillment_type: str, locale: Optional[str] = None) -> str:
     if fulfillment_type == "Pickup":
-        return f"Your order {order_id} is ready for pickup! Please collect it from the store."
+        return render_template("order_ready_pickup", locale, order_id=order_id)
     else:
-        return f"Your order {order_id} is ready and will be delivered soon!"
+        return render_template("order_ready_delivery", locale, order_id=order_id)
 
-def get_order_delivered_message(order_id: str) -> str:
-    return f"Your order {order_id} has been delivered! Thank you for choosing Vaishnavi Printers."
+def get_order_delivered_message(order_id: str, locale: Optional[str] = None) -> str:
+    return render_template("order_delivered", locale, order_id=order_id)
@@ -157,6 +157,12 @@ async def check_acceptance_timeout(order_id: str, vendor_id: str, db, notify_fun
         # Try reassignment
         await reassign_order(order_id, db, notify_func)
 
+def _flag_manual_assignment(order: dict):
+    """Count a newly flagged order on the admin dashboard"""
+    if not order.get('need_manual_assign'):
+        from admin_dashboard import dashboard
+        dashboard.adjust("manual_assignments", 1)
+
 async def reassign_order(order_id: str, db, notify_func):
     """Reassign order to next available vendor"""
     order = await db.orders.find_one({"id": order_id})
@@ -167,6 +173,7 @@ async def reassign_order(order_id: str, db, notify_func):
     
     if attempts >= MAX_REASSIGNMENT_ATTEMPTS:
         # Max attempts reached - flag for manual assignment
+        _flag_manual_assignment(order)
         await db.orders.update_one(
             {"id": order_id},
             {
@@ -196,6 +203,7 @@ async def reassign_order(order_id: str, db, notify_func):
             await assign_order_to_vendor(order_id, next_vendor.id, db, notify_func)
         else:
             # No more vendors available
+            _flag_manual_assignment(order)
             await db.orders.update_one(
                 {"id": order_id},
                 {
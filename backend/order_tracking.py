@@ -0,0 +1,132 @@
+"""
+Live order tracking stream for customers
+Socket.IO namespace /tracking: clients subscribe to an order id and receive
+compact status deltas instead of polling the orders collection
+"""
+
+from typing import Dict, Any, List, Optional
+from collections import OrderedDict
+from datetime import datetime, timezone
+import socketio
+import logging
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from socketio_manager import sio
+from admin_dashboard import dashboard
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE = "/tracking"
+
+# Database connection
+db = None
+
+def set_database(database):
+    global db
+    db = database
+
+# Last state pushed per order, so each publish only carries what changed
+MAX_TRACKED_ORDERS = 50000
+_last_sent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+def order_room(order_id: str) -> str:
+    return f"order:{order_id}"
+
+def tracking_room(tracking_id: str) -> str:
+    return f"tracking:{tracking_id}"
+
+def _compact(order_doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Short-key snapshot: o=order, s=status, d=delivery status, t=tracking id, at=time"""
+    state = {"o": order_doc['id'], "s": order_doc.get('status')}
+    if order_doc.get('delivery_status'):
+        state["d"] = order_doc['delivery_status']
+    if order_doc.get('delivery_tracking_id'):
+        state["t"] = order_doc['delivery_tracking_id']
+    state["at"] = order_doc.get('updated_at')
+    return state
+
+def _delta(order_id: str, state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Fields of ``state`` that differ from what was last pushed (None if nothing changed)"""
+    previous = _last_sent.get(order_id, {})
+    changed = {k: v for k, v in state.items() if k != "at" and previous.get(k) != v}
+    if previous and not changed:
+        return None
+
+    merged = {**previous, **state}
+    _last_sent[order_id] = merged
+    _last_sent.move_to_end(order_id)
+    while len(_last_sent) > MAX_TRACKED_ORDERS:
+        _last_sent.popitem(last=False)
+
+    return {"o": order_id, **changed, "at": state.get("at")}
+
+class TrackingNamespace(socketio.AsyncNamespace):
+    async def on_subscribe(self, sid, data):
+        """Join an order's room and receive its current state once"""
+        order_id = (data or {}).get('order_id')
+        if not order_id:
+            return {"error": "order_id is required"}
+
+        order_doc = await db.orders.find_one(
+            {"id": order_id},
+            {"_id": 0, "id": 1, "status": 1, "delivery_status": 1, "delivery_tracking_id": 1, "updated_at": 1}
+        )
+        if not order_doc:
+            return {"error": "Order not found"}
+
+        await self.enter_room(sid, order_room(order_id))
+        if order_doc.get('delivery_tracking_id'):
+            await self.enter_room(sid, tracking_room(order_doc['delivery_tracking_id']))
+
+        return _compact(order_doc)
+
+    async def on_unsubscribe(self, sid, data):
+        order_id = (data or {}).get('order_id')
+        if order_id:
+            await self.leave_room(sid, order_room(order_id))
+
+sio.register_namespace(TrackingNamespace(NAMESPACE))
+
+def _has_subscribers(room: str) -> bool:
+    """Followers here, or possibly on another worker when a message bus is configured"""
+    return isinstance(sio.manager, AsyncPubSubManager) or bool(sio.manager.rooms.get(NAMESPACE, {}).get(room))
+
+async def publish_order_status(
+    order_id: str,
+    status: Optional[str] = None,
+    delivery_status: Optional[str] = None,
+    tracking_id: Optional[str] = None
+):
+    """Push a status delta to everyone following this order (and count it on the admin dashboard)"""
+    if status:
+        dashboard.order_status_changed(order_id, status, tracking_id)
+    room = order_room(order_id)
+    if not _has_subscribers(room):
+        return
+
+    state = {"s": status} if status else {}
+    if delivery_status:
+        state["d"] = delivery_status
+    if tracking_id:
+        state["t"] = tracking_id
+        # Followers of the order also follow its delivery from now on
+        for sid, _ in list(sio.manager.get_participants(NAMESPACE, room)):
+            await sio.enter_room(sid, tracking_room(tracking_id), namespace=NAMESPACE)
+    state["at"] = datetime.now(timezone.utc).isoformat()
+
+    delta = _delta(order_id, state)
+    if delta:
+        await sio.emit('status', delta, room=room, namespace=NAMESPACE)
+
+async def publish_delivery_events(events: List[Dict[str, Any]]):
+    """Push applied delivery webhook events to followers of the order and of its tracking id"""
+    for event in events:
+        if event.get('status'):
+            dashboard.delivery_status_changed(event['tracking_id'], event['status'])
+        rooms = [order_room(event['order_id']), tracking_room(event['tracking_id'])]
+        if not any(_has_subscribers(room) for room in rooms):
+            continue
+        delta = {"t": event['tracking_id'], "d": event['delivery_status'], "at": event['at']}
+        if event.get('status'):
+            delta["s"] = event['status']
+        # A socket in both rooms gets it once
+        await sio.emit('status', delta, room=rooms, namespace=NAMESPACE)
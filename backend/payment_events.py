@@ -0,0 +1,258 @@
+"""
+Payment webhook event pipeline
+Verified gateway events are appended to the payment_events collection (unique
+per gateway + event id) in batches, acknowledged once their batch is stored,
+and applied by per-payment workers so that events for one order apply in order.
+An event whose apply fails is retried with capped backoff; after max_attempts
+it is marked failed_at (with last_error) and no longer retried
+"""
+
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable
+from collections import OrderedDict
+from datetime import datetime, timezone
+from pymongo.errors import BulkWriteError
+import asyncio
+import hashlib
+import logging
+import uuid
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Gateway header carrying the gateway's own event id
+EVENT_ID_HEADERS = {
+    "razorpay": "X-Razorpay-Event-Id",
+    "payu": "X-PayU-Event-Id",
+    "paytm": "X-Paytm-Event-Id"
+}
+
+class EventQueueFull(Exception):
+    """Raised when the event queue is at capacity (gateway should retry)"""
+
+class EventNotStored(Exception):
+    """Raised when an event could not be persisted (gateway should retry)"""
+
+def get_event_id(gateway: str, headers, payload: Dict[str, Any], body: bytes) -> str:
+    """Gateway event id; falls back to a digest of the signed body, which a retry repeats exactly"""
+    event_id = headers.get(EVENT_ID_HEADERS.get(gateway, "X-Event-Id")) or payload.get('event_id') or payload.get('id')
+    if event_id:
+        return str(event_id)
+    return hashlib.sha256(body).hexdigest()
+
+class PaymentEventPipeline:
+    def __init__(
+        self,
+        apply_event: Callable[[Dict[str, Any]], Awaitable[None]],
+        shards: int = 8,
+        batch_size: int = 200,
+        flush_interval_s: float = 0.05,
+        max_queue: int = 10000,
+        dedupe_window: int = 100000,
+        max_attempts: int = 5,
+        retry_base_s: float = 1.0,
+        retry_max_s: float = 60.0
+    ):
+        self.apply_event = apply_event
+        self.shards = shards
+        self.batch_size = batch_size
+        self.flush_interval_s = flush_interval_s
+        self.dedupe_window = dedupe_window
+        self.max_attempts = max_attempts
+        self.retry_base_s = retry_base_s
+        self.retry_max_s = retry_max_s
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=max_queue)
+        self._shard_queues: List[asyncio.Queue] = [asyncio.Queue() for _ in range(shards)]
+        self._seen: "OrderedDict[Tuple[str, str], None]" = OrderedDict()
+        self._retry: List[Dict[str, Any]] = []
+        self._waiters: Dict[Tuple[str, str], asyncio.Future] = {}
+        # event id -> timer for events waiting out their retry backoff
+        self._retry_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._db = None
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"accepted": 0, "duplicates": 0, "persisted": 0, "applied": 0, "retried": 0, "failed": 0}
+
+    def submit(self, gateway: str, event_id: str, payload: Dict[str, Any], result: Dict[str, Any]) -> bool:
+        """Queue a verified event; returns False when it is a duplicate"""
+        key = (gateway, event_id)
+        if key in self._seen:
+            self._seen.move_to_end(key)
+            self.stats['duplicates'] += 1
+            return False
+
+        event = {
+            "id": str(uuid.uuid4()),
+            "gateway": gateway,
+            "event_id": event_id,
+            "order_id": result.get('order_id'),
+            "payment_id": result.get('payment_id'),
+            "status": result.get('status'),
+            "amount": result.get('amount'),
+            "payload": payload,
+            "received_at": datetime.now(timezone.utc).isoformat(),
+            "processed_at": None,
+            "attempts": 0
+        }
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            raise EventQueueFull(f"Payment event queue full ({self.queue.maxsize})")
+
+        self._seen[key] = None
+        if len(self._seen) > self.dedupe_window:
+            self._seen.popitem(last=False)
+        self.stats['accepted'] += 1
+        return True
+
+    async def accept(self, gateway: str, event_id: str, payload: Dict[str, Any], result: Dict[str, Any]) -> bool:
+        """Submit and wait until the event is stored, so it is safe to acknowledge; False for a duplicate"""
+        key = (gateway, event_id)
+        queued = self.submit(gateway, event_id, payload, result)
+        if queued:
+            self._waiters[key] = asyncio.get_running_loop().create_future()
+        # A duplicate of an event still waiting for its batch waits for the same write
+        waiter = self._waiters.get(key)
+        if waiter is not None:
+            await asyncio.shield(waiter)
+        return queued
+
+    async def ensure_indexes(self, db):
+        await db.payment_events.create_index([("gateway", 1), ("event_id", 1)], unique=True)
+        await db.payment_events.create_index([("processed_at", 1), ("failed_at", 1)])
+
+    async def start(self, db):
+        """Create indexes, start workers and re-dispatch events left unprocessed by a restart
+        (except those that already used up their attempts)"""
+        self._db = db
+        await self.ensure_indexes(db)
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._shard_queues]
+        self._tasks.append(asyncio.create_task(self._run()))
+
+        pending = db.payment_events.find({"processed_at": None, "failed_at": None}, {"_id": 0}).sort("received_at", 1)
+        async for event in pending:
+            self._seen[(event['gateway'], event['event_id'])] = None
+            self._dispatch(event)
+
+    async def stop(self):
+        """Persist what is still queued, let workers drain, then stop (events waiting for a
+        retry stay unprocessed and are re-dispatched on the next start)"""
+        for timer in self._retry_timers.values():
+            timer.cancel()
+        self._retry_timers.clear()
+        if self._db is not None:
+            await self.flush()
+            for shard_queue in self._shard_queues:
+                await shard_queue.join()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval_s)
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Payment event flush error: {e}")
+
+    async def flush(self) -> int:
+        """Persist queued events in batches and dispatch the new ones; returns number persisted"""
+        persisted = 0
+        # Failed inserts from the previous flush go first; new failures wait for the next one
+        batch, self._retry = self._retry, []
+        while batch or not self.queue.empty():
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            persisted += await self._persist(batch)
+            batch = []
+        return persisted
+
+    async def _persist(self, batch: List[Dict[str, Any]]) -> int:
+        duplicates, failed = set(), set()
+        try:
+            # Unordered so one duplicate does not stop the rest of the batch
+            await self._db.payment_events.insert_many([dict(e) for e in batch], ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get('writeErrors', []):
+                (duplicates if err.get('code') == DUPLICATE_KEY_ERROR else failed).add(err['index'])
+        except Exception as e:
+            self._not_stored(batch, e)
+            raise
+
+        if failed:
+            logger.error(f"Payment event insert failed for {len(failed)} events, will retry")
+            self._not_stored([event for i, event in enumerate(batch) if i in failed], "insert failed")
+
+        for i, event in enumerate(batch):
+            if i not in failed:
+                self._settle(event)
+        new_events = [event for i, event in enumerate(batch) if i not in duplicates and i not in failed]
+        for event in new_events:
+            self._dispatch(event)
+        self.stats['duplicates'] += len(duplicates)
+        self.stats['persisted'] += len(new_events)
+        return len(new_events)
+
+    def _not_stored(self, events: List[Dict[str, Any]], error):
+        """Retry on the next flush; the gateway is told to retry too, so its redelivery is no longer a duplicate"""
+        self._retry.extend(events)
+        for event in events:
+            self._seen.pop((event['gateway'], event['event_id']), None)
+            self._settle(event, EventNotStored(f"Payment event {event['gateway']}:{event['event_id']} not stored: {error}"))
+
+    def _settle(self, event: Dict[str, Any], error: Optional[Exception] = None):
+        waiter = self._waiters.pop((event['gateway'], event['event_id']), None)
+        if waiter is not None and not waiter.done():
+            if error is None:
+                waiter.set_result(None)
+            else:
+                waiter.set_exception(error)
+
+    def _dispatch(self, event: Dict[str, Any]):
+        """Route to the shard owning this payment so its events apply in arrival order"""
+        owner = event.get('order_id') or event['event_id']
+        shard = int(hashlib.md5(owner.encode('utf-8')).hexdigest(), 16) % self.shards
+        self._shard_queues[shard].put_nowait(event)
+
+    async def _worker(self, shard_queue: asyncio.Queue):
+        while True:
+            event = await shard_queue.get()
+            try:
+                await self.apply_event(event)
+                await self._db.payment_events.update_one(
+                    {"id": event['id']},
+                    {"$set": {"processed_at": datetime.now(timezone.utc).isoformat()}}
+                )
+                self.stats['applied'] += 1
+            except Exception as e:
+                await self._apply_failed(event, e)
+            finally:
+                shard_queue.task_done()
+
+    async def _apply_failed(self, event: Dict[str, Any], error: Exception):
+        """Schedule a retry with capped exponential backoff, or give up after max_attempts"""
+        event['attempts'] = event.get('attempts', 0) + 1
+        update = {"attempts": event['attempts'], "last_error": str(error)}
+        if event['attempts'] >= self.max_attempts:
+            self.stats['failed'] += 1
+            update['failed_at'] = datetime.now(timezone.utc).isoformat()
+            logger.error(
+                f"Payment event {event['gateway']}:{event['event_id']} failed {event['attempts']} times, giving up: {error}"
+            )
+        else:
+            self.stats['retried'] += 1
+            delay = min(self.retry_base_s * (2 ** (event['attempts'] - 1)), self.retry_max_s)
+            self._retry_timers[event['id']] = asyncio.get_running_loop().call_later(delay, self._redispatch, event)
+            logger.warning(
+                f"Payment event {event['gateway']}:{event['event_id']} failed (attempt {event['attempts']}), "
+                f"retrying in {delay:.1f}s: {error}"
+            )
+        try:
+            await self._db.payment_events.update_one({"id": event['id']}, {"$set": update})
+        except Exception as e:
+            logger.error(f"Could not record payment event failure: {e}")
+
+    def _redispatch(self, event: Dict[str, Any]):
+        self._retry_timers.pop(event['id'], None)
+        self._dispatch(event)
@@ -0,0 +1,110 @@
+"""
+Idempotent payment session creation
+Sessions are keyed by (order id, amount, gateway): repeated or concurrent
+requests get the open session back instead of a new gateway order
+"""
+
+from typing import Dict, Optional, Tuple, Callable
+from collections import OrderedDict
+from pymongo.errors import DuplicateKeyError
+import asyncio
+import logging
+import time
+from models import PaymentSession, PaymentStatus
+from payments import create_payment_session, get_active_gateway
+
+logger = logging.getLogger(__name__)
+
+def session_idempotency_key(order_id: str, amount: float, gateway_id: str) -> str:
+    return f"{order_id}:{amount:.2f}:{gateway_id}"
+
+class PaymentSessionManager:
+    """Returns the open session for (order, amount, gateway), creating it at most once.
+
+    Lookups go through a short-TTL in-process cache, concurrent callers for the
+    same key share one creation, and a partial unique index on open sessions
+    guards against other processes.
+    """
+
+    def __init__(self, ttl_s: float = 60.0, max_entries: int = 10000, clock: Callable[[], float] = time.monotonic):
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, PaymentSession]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._db = None
+        self.stats = {"cache_hits": 0, "reused": 0, "created": 0}
+
+    async def start(self, db):
+        self._db = db
+        await db.payment_sessions.create_index(
+            "idempotency_key",
+            unique=True,
+            # Sessions created before keys existed stay out of the index
+            partialFilterExpression={"status": PaymentStatus.PENDING.value, "idempotency_key": {"$exists": True}}
+        )
+
+    async def get_or_create(self, order_id: str, amount: float) -> Tuple[PaymentSession, bool]:
+        """Open session for this order and amount on the active gateway; returns (session, created)"""
+        key = session_idempotency_key(order_id, amount, get_active_gateway()['id'])
+
+        entry = self._entries.get(key)
+        if entry and self.clock() - entry[0] <= self.ttl_s:
+            self.stats['cache_hits'] += 1
+            return entry[1], False
+
+        future = self._inflight.get(key)
+        leader = future is None
+        if leader:
+            future = asyncio.ensure_future(self._get_or_create(key, order_id, amount))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+
+        session, created = await asyncio.shield(future)
+        self._put(key, session)
+        # Callers that joined an in-flight creation did not create anything themselves
+        return session, created and leader
+
+    async def _find_open(self, key: str) -> Optional[PaymentSession]:
+        doc = await self._db.payment_sessions.find_one(
+            {"idempotency_key": key, "status": PaymentStatus.PENDING.value}, {"_id": 0}
+        )
+        return PaymentSession(**doc) if doc else None
+
+    async def _get_or_create(self, key: str, order_id: str, amount: float) -> Tuple[PaymentSession, bool]:
+        existing = await self._find_open(key)
+        if existing:
+            self.stats['reused'] += 1
+            return existing, False
+
+        # Gateway round-trip only when there is no open session
+        session = await create_payment_session(order_id, amount)
+
+        session_dict = session.model_dump()
+        session_dict['created_at'] = session_dict['created_at'].isoformat()
+        session_dict['updated_at'] = session_dict['updated_at'].isoformat()
+        session_dict['idempotency_key'] = key
+
+        try:
+            await self._db.payment_sessions.insert_one(session_dict)
+        except DuplicateKeyError:
+            # Another worker created it first
+            existing = await self._find_open(key)
+            if existing:
+                self.stats['reused'] += 1
+                return existing, False
+            raise
+
+        self.stats['created'] += 1
+        return session, True
+
+    def _put(self, key: str, session: PaymentSession):
+        self._entries[key] = (self.clock(), session)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, order_id: str):
+        """Forget cached sessions of an order (e.g. once it is paid)"""
+        for key in [k for k in self._entries if k.startswith(f"{order_id}:")]:
+            del self._entries[key]
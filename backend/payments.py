@@ -1,33 +1,159 @@
 import json
 from pathlib import Path
 from typing import Dict, Any, Optional
+from pydantic import BaseModel, ConfigDict
+import asyncio
 import hashlib
 import hmac
+import logging
 import uuid
 from models import PaymentSession, PaymentStatus
+from gateway_clients import GatewayClient, create_gateway_client
+
+logger = logging.getLogger(__name__)
 
 CONFIG_PATH = Path(__file__).parent / "config" / "payment_gateways.json"
 
+class GatewayConfig(BaseModel):
+    """One gateway, with its webhook secret already encoded for HMAC"""
+    model_config = ConfigDict(frozen=True)
+    
+    id: str
+    name: str
+    enabled: bool = False
+    settings: Dict[str, Any]
+    webhook_secret: bytes = b""
+
+class PaymentConfig(BaseModel):
+    """Immutable compiled view of config/payment_gateways.json"""
+    model_config = ConfigDict(frozen=True)
+    
+    mode: str
+    active_gateway_id: str
+    gateways: Dict[str, GatewayConfig]
+    client_settings: Dict[str, Any] = {}
+    version: str
+
+    def get_gateway(self, gateway_id: str) -> Optional[GatewayConfig]:
+        return self.gateways.get(gateway_id)
+
+# Compiled config; replaced wholesale on reload, never mutated
+_payment_config: Optional[PaymentConfig] = None
+
+def _config_version() -> str:
+    stat = CONFIG_PATH.stat()
+    return f"{stat.st_mtime_ns}:{stat.st_size}"
+
 def load_payment_config() -> Dict[str, Any]:
-    """Load payment gateway configuration"""
+    """Load payment gateway configuration (raw file contents)"""
     with open(CONFIG_PATH, 'r') as f:
         return json.load(f)
 
+def compile_payment_config(raw: Dict[str, Any], version: str = "") -> PaymentConfig:
+    """Index gateways by id and decode secrets once"""
+    gateways = {}
+    for gateway in raw['gateways']:
+        gateways[gateway['id']] = GatewayConfig(
+            id=gateway['id'],
+            name=gateway['name'],
+            enabled=gateway.get('enabled', False),
+            settings={**gateway, "mode": raw['mode']},
+            webhook_secret=gateway.get('webhookSecret', '').encode('utf-8')
+        )
+    
+    return PaymentConfig(
+        mode=raw['mode'],
+        active_gateway_id=raw['activeGateway'],
+        gateways=gateways,
+        client_settings=raw.get('client', {}),
+        version=version
+    )
+
+def reload_payment_config(force: bool = False) -> bool:
+    """Recompile from disk if the file changed (or when forced); returns True if reloaded"""
+    global _payment_config
+    version = _config_version()
+    if not force and _payment_config is not None and _payment_config.version == version:
+        return False
+    
+    _payment_config = compile_payment_config(load_payment_config(), version)
+    logger.info(f"Payment gateway config loaded (active={_payment_config.active_gateway_id}, mode={_payment_config.mode})")
+    return True
+
+def get_payment_config() -> PaymentConfig:
+    """In-memory payment config; only the very first call reads the file"""
+    if _payment_config is None:
+        reload_payment_config(force=True)
+    return _payment_config
+
+def save_payment_config(raw: Dict[str, Any]):
+    """Write the config file and swap in the recompiled config"""
+    with open(CONFIG_PATH, 'w') as f:
+        json.dump(raw, f, indent=2)
+    reload_payment_config(force=True)
+
+def update_payment_settings(active_gateway: str, mode: str) -> PaymentConfig:
+    """Switch active gateway / mode (admin) and apply it immediately"""
+    raw = load_payment_config()
+    if not any(g['id'] == active_gateway for g in raw['gateways']):
+        raise ValueError(f"Unknown gateway {active_gateway}")
+    
+    raw['activeGateway'] = active_gateway
+    raw['mode'] = mode
+    save_payment_config(raw)
+    return get_payment_config()
+
+async def watch_payment_config(interval_s: float = 2.0):
+    """Pick up manual edits to the config file (started on app startup)"""
+    while True:
+        await asyncio.sleep(interval_s)
+        try:
+            reload_payment_config()
+        except Exception as e:
+            logger.error(f"Payment config reload failed, keeping previous config: {e}")
+
 def get_active_gateway() -> Dict[str, Any]:
     """Get the currently active payment gateway"""
-    config = load_payment_config()
-    active_gateway_id = config['activeGateway']
-    gateway = next((g for g in config['gateways'] if g['id'] == active_gateway_id), None)
+    config = get_payment_config()
+    gateway = config.get_gateway(config.active_gateway_id)
     
     if not gateway:
-        raise ValueError(f"Active gateway {active_gateway_id} not found")
+        raise ValueError(f"Active gateway {config.active_gateway_id} not found")
     
-    return {
-        **gateway,
-        "mode": config['mode']
-    }
+    # Shallow copy so callers cannot alter the shared compiled config
+    return dict(gateway.settings)
+
+# Pooled gateway clients for the current config version; rebuilt when the config reloads
+_gateway_clients: Dict[str, GatewayClient] = {}
+_gateway_clients_version: Optional[str] = None
+
+def get_gateway_client(gateway_id: str) -> GatewayClient:
+    """Shared async client for a gateway"""
+    global _gateway_clients_version
+    config = get_payment_config()
+    if _gateway_clients_version != config.version:
+        stale = list(_gateway_clients.values())
+        _gateway_clients.clear()
+        _gateway_clients_version = config.version
+        for client in stale:
+            asyncio.ensure_future(client.close())
+    
+    client = _gateway_clients.get(gateway_id)
+    if client is None:
+        gateway = config.get_gateway(gateway_id)
+        if not gateway:
+            raise ValueError(f"Unknown gateway: {gateway_id}")
+        client = create_gateway_client(gateway_id, gateway.settings, config.mode, config.client_settings)
+        _gateway_clients[gateway_id] = client
+    return client
+
+async def close_gateway_clients():
+    """Close pooled gateway connections (app shutdown)"""
+    for client in list(_gateway_clients.values()):
+        await client.close()
+    _gateway_clients.clear()
 
-def create_payment_session(order_id: str, amount: float, currency: str = "INR") -> PaymentSession:
+async def create_payment_session(order_id: str, amount: float, currency: str = "INR") -> PaymentSession:
     """Create payment session with active gateway"""
     gateway = get_active_gateway()
     
@@ -43,85 +169,78 @@ def create_payment_session(order_id: str, amount: float, currency: str = "INR")
         session.gateway_session_id = f"sim_{gateway['id']}_{uuid.uuid4().hex[:12]}"
         session.payment_url = f"https://simulated-payment.example.com/pay/{session.gateway_session_id}"
     else:
-        # Real gateway integration
-        if gateway['id'] == 'razorpay':
-            session = _create_razorpay_session(session, gateway)
-        elif gateway['id'] == 'payu':
-            session = _create_payu_session(session, gateway)
-        elif gateway['id'] == 'paytm':
-            session = _create_paytm_session(session, gateway)
+        # Real gateway integration over the pooled async client
+        session.gateway_session_id, session.payment_url = await get_gateway_client(gateway['id']).create_order(
+            order_id, amount, currency
+        )
     
     return session
 
-def _create_razorpay_session(session: PaymentSession, gateway: Dict[str, Any]) -> PaymentSession:
-    """Create Razorpay payment session (real implementation)"""
-    # This would use razorpay SDK
-    # import razorpay
-    # client = razorpay.Client(auth=(gateway['prodKeyId'], gateway['prodKeySecret']))
-    # order = client.order.create({
-    #     'amount': int(session.amount * 100),
-    #     'currency': session.currency,
-    #     'receipt': session.order_id
-    # })
-    # session.gateway_session_id = order['id']
-    raise NotImplementedError("Razorpay integration requires API keys")
-
-def _create_payu_session(session: PaymentSession, gateway: Dict[str, Any]) -> PaymentSession:
-    """Create PayU payment session (real implementation)"""
-    raise NotImplementedError("PayU integration requires API keys")
-
-def _create_paytm_session(session: PaymentSession, gateway: Dict[str, Any]) -> PaymentSession:
-    """Create PayTM payment session (real implementation)"""
-    raise NotImplementedError("PayTM integration requires API keys")
-
-def verify_webhook_signature(gateway_id: str, payload: Dict[str, Any], signature: str) -> bool:
-    """Verify webhook signature from payment gateway"""
-    config = load_payment_config()
-    gateway = next((g for g in config['gateways'] if g['id'] == gateway_id), None)
+# Per-gateway webhook signing: signature header and HMAC digest over the raw request body
+WEBHOOK_SIGNATURE_SCHEMES = {
+    'razorpay': {"header": "X-Razorpay-Signature", "digest": hashlib.sha256},
+    'payu': {"header": "X-PayU-Signature", "digest": hashlib.sha512},
+    'paytm': {"header": "X-Paytm-Signature", "digest": hashlib.sha256}
+}
+
+# Generic header accepted for every gateway
+DEFAULT_SIGNATURE_HEADER = "X-Signature"
+
+class WebhookVerifier:
+    """Incremental HMAC over the raw webhook body, fed chunk by chunk as it arrives"""
     
-    if not gateway:
-        return False
+    def __init__(self, secret: Optional[bytes], digest):
+        # No secret means simulated mode: every webhook is accepted
+        self._mac = hmac.new(secret, digestmod=digest) if secret is not None else None
+    
+    def update(self, chunk: bytes):
+        if self._mac is not None:
+            self._mac.update(chunk)
     
-    if config['mode'] == 'SIMULATED':
+    def verify(self, signature: str) -> bool:
+        if self._mac is None:
+            return True
+        return hmac.compare_digest(self._mac.hexdigest(), signature.strip().lower())
+
+def create_webhook_verifier(gateway_id: str) -> Optional[WebhookVerifier]:
+    """Verifier for one incoming webhook (None for an unknown gateway)"""
+    config = get_payment_config()
+    gateway = config.get_gateway(gateway_id)
+    scheme = WEBHOOK_SIGNATURE_SCHEMES.get(gateway_id)
+    
+    if not gateway or not scheme:
+        return None
+    
+    if config.mode == 'SIMULATED':
         # In simulated mode, accept all webhooks
-        return True
+        return WebhookVerifier(None, scheme['digest'])
     
-    webhook_secret = gateway.get('webhookSecret', '')
+    if not gateway.webhook_secret:
+        # An empty key would make every signature forgeable
+        logger.error(f"Webhook secret not configured for {gateway_id}")
+        return None
     
-    if gateway_id == 'razorpay':
-        return _verify_razorpay_signature(payload, signature, webhook_secret)
-    elif gateway_id == 'payu':
-        return _verify_payu_signature(payload, signature, webhook_secret)
-    elif gateway_id == 'paytm':
-        return _verify_paytm_signature(payload, signature, webhook_secret)
-    
-    return False
-
-def _verify_razorpay_signature(payload: Dict[str, Any], signature: str, secret: str) -> bool:
-    """Verify Razorpay webhook signature"""
-    # Implementation based on Razorpay docs
-    expected_signature = hmac.new(
-        secret.encode('utf-8'),
-        json.dumps(payload).encode('utf-8'),
-        hashlib.sha256
-    ).hexdigest()
-    return hmac.compare_digest(expected_signature, signature)
-
-def _verify_payu_signature(payload: Dict[str, Any], signature: str, secret: str) -> bool:
-    """Verify PayU webhook signature"""
-    # Implementation based on PayU docs
-    return True  # Placeholder
-
-def _verify_paytm_signature(payload: Dict[str, Any], signature: str, secret: str) -> bool:
-    """Verify PayTM webhook signature"""
-    # Implementation based on PayTM docs
-    return True  # Placeholder
+    return WebhookVerifier(gateway.webhook_secret, scheme['digest'])
+
+def get_webhook_signature(gateway_id: str, headers) -> str:
+    """Signature sent by the gateway (its own header, else the generic one)"""
+    scheme = WEBHOOK_SIGNATURE_SCHEMES.get(gateway_id, {})
+    return headers.get(scheme.get('header', DEFAULT_SIGNATURE_HEADER)) or headers.get(DEFAULT_SIGNATURE_HEADER, '')
+
+def verify_webhook_signature(gateway_id: str, body: bytes, signature: str) -> bool:
+    """Verify a webhook signature over the raw request body"""
+    verifier = create_webhook_verifier(gateway_id)
+    if verifier is None:
+        return False
+    
+    verifier.update(body)
+    return verifier.verify(signature)
 
 def handle_payment_webhook(gateway_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
     """Handle payment webhook and extract status"""
-    config = load_payment_config()
+    config = get_payment_config()
     
-    if config['mode'] == 'SIMULATED':
+    if config.mode == 'SIMULATED':
         # Simulated webhook response
         return {
             "status": "success",
@@ -74,8 +74,14 @@ def calculate_delivery_charge(distance_km: float, items_total: float, price_rule
     
     return base_rate + (distance_km * per_km_rate)
 
+DEFAULT_DELIVERY_DISTANCE_KM = 5.0
+
 def calculate_estimate(request: EstimateRequest) -> EstimateResponse:
-    """Calculate complete estimate with breakdown"""
+    """Calculate complete estimate with breakdown
+    
+    The delivery charge here is the price-rule fallback at DEFAULT_DELIVERY_DISTANCE_KM;
+    callers replace it with the partner quote when a vendor covers the address.
+    """
     price_rule = get_active_price_rule()
     if not price_rule:
         raise ValueError("No active price rule found")
@@ -106,8 +112,7 @@ def calculate_estimate(request: EstimateRequest) -> EstimateResponse:
     # Calculate delivery charge
     delivery_charge = 0.0
     if request.fulfillment_type.value == "Delivery" and request.customer_location:
-        # For now, assume 5km distance (will be calculated with actual vendor)
-        delivery_charge = calculate_delivery_charge(5.0, items_total, price_rule)
+        delivery_charge = calculate_delivery_charge(DEFAULT_DELIVERY_DISTANCE_KM, items_total, price_rule)
     
     total = items_total + delivery_charge
     
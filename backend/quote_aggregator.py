@@ -0,0 +1,184 @@
+"""Concurrent delivery quote fan-out across partners"""
+from typing import List, Dict, Any, Optional
+import asyncio
+import logging
+import time
+import httpx
+from models import VendorLocation
+from delivery import (
+    load_delivery_partners, load_quoting_settings, calculate_distance, quote_from_rate_card
+)
+
+logger = logging.getLogger(__name__)
+
+# A partner failing with any of these just misses its quote ("cost": null raises TypeError)
+QUOTE_ERRORS = (httpx.HTTPError, KeyError, ValueError, TypeError)
+
+class QuoteAggregator:
+    """Queries every enabled partner concurrently over one pooled HTTP client.
+
+    SIMULATED partners are priced locally from their rate card. LIVE partners
+    are asked over HTTP (``quoteUrl``) with a per-partner timeout; a hedged
+    second request is fired if the first has not answered after
+    ``hedge_after_s``. Whatever has arrived by the overall deadline is returned,
+    cheapest first.
+    """
+
+    def __init__(
+        self,
+        partner_timeout_s: Optional[float] = None,
+        deadline_s: Optional[float] = None,
+        hedge_after_s: Optional[float] = None,
+        max_connections: Optional[int] = None,
+        max_keepalive_connections: Optional[int] = None
+    ):
+        settings = load_quoting_settings()
+        self.partner_timeout_s = partner_timeout_s or settings.get('partnerTimeoutMs', 800) / 1000
+        self.deadline_s = deadline_s or settings.get('deadlineMs', 1200) / 1000
+        if hedge_after_s is None and settings.get('hedgeAfterMs') is not None:
+            hedge_after_s = settings['hedgeAfterMs'] / 1000
+        self.hedge_after_s = hedge_after_s
+        self.limits = httpx.Limits(
+            max_connections=max_connections or settings.get('maxConnections', 100),
+            max_keepalive_connections=max_keepalive_connections or settings.get('maxKeepaliveConnections', 20)
+        )
+        self._client: Optional[httpx.AsyncClient] = None
+        self.stats = {"requests": 0, "hedged": 0, "timeouts": 0, "failures": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Shared keep-alive client, created lazily on first LIVE quote"""
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(limits=self.limits, timeout=self.partner_timeout_s)
+        return self._client
+
+    async def close(self):
+        """Close pooled connections"""
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    async def get_quotes(
+        self,
+        pickup_location: VendorLocation,
+        delivery_location: VendorLocation,
+        partners: Optional[List[Dict[str, Any]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Get quotes from all enabled partners, cheapest first"""
+        if partners is None:
+            partners = load_delivery_partners()
+
+        distance_km = calculate_distance(
+            pickup_location.latitude,
+            pickup_location.longitude,
+            delivery_location.latitude,
+            delivery_location.longitude
+        )
+
+        request_body = {
+            "pickup": {"latitude": pickup_location.latitude, "longitude": pickup_location.longitude},
+            "drop": {"latitude": delivery_location.latitude, "longitude": delivery_location.longitude},
+            "distance_km": round(distance_km, 3)
+        }
+
+        quotes = []
+        tasks = {}
+        for partner in partners:
+            if not partner['enabled'] or distance_km > partner['maxDistanceKm']:
+                continue
+
+            if partner['mode'] == 'LIVE':
+                task = asyncio.create_task(self._quote_with_timeout(partner, request_body, distance_km))
+                tasks[task] = partner['id']
+            else:
+                quote = quote_from_rate_card(partner, distance_km)
+                if quote:
+                    quotes.append(quote)
+
+        if tasks:
+            started = time.monotonic()
+            done, pending = await asyncio.wait(tasks.keys(), timeout=self.deadline_s)
+
+            for task in pending:
+                task.cancel()
+                self.stats['timeouts'] += 1
+                logger.warning(f"Quote from {tasks[task]} missed the {self.deadline_s:.2f}s deadline")
+
+            for task in done:
+                quote = task.result()
+                if quote:
+                    quotes.append(quote)
+
+            logger.debug(f"Quote fan-out to {len(tasks)} partners took {time.monotonic() - started:.3f}s")
+
+        quotes.sort(key=lambda x: x['cost'])
+        return quotes
+
+    async def _quote_with_timeout(
+        self,
+        partner: Dict[str, Any],
+        request_body: Dict[str, Any],
+        distance_km: float
+    ) -> Optional[Dict[str, Any]]:
+        """Quote one LIVE partner, None on timeout or failure"""
+        timeout_s = partner.get('timeoutMs', self.partner_timeout_s * 1000) / 1000
+        try:
+            return await asyncio.wait_for(self._hedged_quote(partner, request_body, distance_km), timeout_s)
+        except asyncio.TimeoutError:
+            self.stats['timeouts'] += 1
+            logger.warning(f"Quote from {partner['id']} timed out after {timeout_s:.2f}s")
+        except QUOTE_ERRORS as e:
+            self.stats['failures'] += 1
+            logger.warning(f"Quote from {partner['id']} failed: {e}")
+        return None
+
+    async def _hedged_quote(
+        self,
+        partner: Dict[str, Any],
+        request_body: Dict[str, Any],
+        distance_km: float
+    ) -> Dict[str, Any]:
+        """Send the quote request, hedging with a duplicate if the first is slow"""
+        attempts = [asyncio.create_task(self._request_quote(partner, request_body, distance_km))]
+        hedge_after_s = partner.get('hedgeAfterMs')
+        hedge_after_s = hedge_after_s / 1000 if hedge_after_s is not None else self.hedge_after_s
+
+        try:
+            if hedge_after_s is not None:
+                done, _ = await asyncio.wait(attempts, timeout=hedge_after_s)
+                if not done:
+                    self.stats['hedged'] += 1
+                    attempts.append(asyncio.create_task(self._request_quote(partner, request_body, distance_km)))
+
+            error = None
+            for next_done in asyncio.as_completed(attempts):
+                try:
+                    return await next_done
+                except QUOTE_ERRORS as e:
+                    error = e
+            raise error
+        finally:
+            for attempt in attempts:
+                attempt.cancel()
+
+    async def _request_quote(
+        self,
+        partner: Dict[str, Any],
+        request_body: Dict[str, Any],
+        distance_km: float
+    ) -> Dict[str, Any]:
+        """Single HTTP quote request to a LIVE partner"""
+        self.stats['requests'] += 1
+        headers = {"Authorization": f"Bearer {partner['apiKey']}"} if partner.get('apiKey') else {}
+        response = await self.client.post(partner['quoteUrl'], json=request_body, headers=headers)
+        response.raise_for_status()
+        data = response.json()
+
+        return {
+            "partner_id": partner['id'],
+            "partner_name": partner['name'],
+            "cost": round(float(data['cost']), 2),
+            "estimated_time_minutes": data.get('estimated_time_minutes', partner['estimatedTimeMinutes']),
+            "distance_km": round(distance_km, 2),
+            "mode": partner['mode']
+        }
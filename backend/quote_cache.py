@@ -0,0 +1,165 @@
+"""Delivery quote cache keyed by vendor, destination geohash cell and partner config version"""
+from typing import List, Dict, Any, Optional, Callable, Awaitable, Tuple
+from collections import OrderedDict
+import asyncio
+import logging
+import time
+from models import VendorLocation
+from delivery import load_quote_cache_settings, partner_config_version
+
+logger = logging.getLogger(__name__)
+
+GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+QuoteFetcher = Callable[[VendorLocation, VendorLocation], Awaitable[List[Dict[str, Any]]]]
+
+def encode_geohash(latitude: float, longitude: float, precision: int = 6) -> str:
+    """Encode coordinates as a geohash (precision 6 is a ~1.2km x 0.6km cell)"""
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    geohash = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(geohash) < precision:
+        if even:
+            mid = (lon_range[0] + lon_range[1]) / 2
+            if longitude >= mid:
+                bits = (bits << 1) | 1
+                lon_range[0] = mid
+            else:
+                bits = bits << 1
+                lon_range[1] = mid
+        else:
+            mid = (lat_range[0] + lat_range[1]) / 2
+            if latitude >= mid:
+                bits = (bits << 1) | 1
+                lat_range[0] = mid
+            else:
+                bits = bits << 1
+                lat_range[1] = mid
+
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            geohash.append(GEOHASH_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return "".join(geohash)
+
+class QuoteCache:
+    """Bounded LRU of delivery quotes with TTL and stale-while-revalidate.
+
+    Fresh entries are served directly. Entries past their TTL but inside the
+    stale window are served immediately while one background refresh runs.
+    Concurrent misses for the same key share a single fetch.
+    """
+
+    def __init__(
+        self,
+        ttl_s: Optional[float] = None,
+        stale_s: Optional[float] = None,
+        max_entries: Optional[int] = None,
+        precision: Optional[int] = None,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        settings = load_quote_cache_settings()
+        self.ttl_s = ttl_s if ttl_s is not None else settings.get('ttlSeconds', 120)
+        self.stale_s = stale_s if stale_s is not None else settings.get('staleSeconds', 600)
+        self.max_entries = max_entries or settings.get('maxEntries', 5000)
+        self.precision = precision or settings.get('geohashPrecision', 6)
+        self.clock = clock
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "evictions": 0, "empty": 0}
+
+    def make_key(self, vendor_id: str, delivery_location: VendorLocation) -> Tuple[str, str, str]:
+        """(vendor id, destination geohash cell, partner config version)"""
+        cell = encode_geohash(delivery_location.latitude, delivery_location.longitude, self.precision)
+        return (vendor_id, cell, partner_config_version())
+
+    async def get_quotes(
+        self,
+        vendor_id: str,
+        pickup_location: VendorLocation,
+        delivery_location: VendorLocation,
+        fetch: QuoteFetcher
+    ) -> List[Dict[str, Any]]:
+        """Return cached quotes for the vendor/cell, fetching on miss"""
+        key = self.make_key(vendor_id, delivery_location)
+        entry = self._entries.get(key)
+        now = self.clock()
+
+        if entry:
+            stored_at, quotes = entry
+            age = now - stored_at
+            if age <= self.ttl_s:
+                self._entries.move_to_end(key)
+                self.stats['hits'] += 1
+                return quotes
+            if age <= self.ttl_s + self.stale_s:
+                self._entries.move_to_end(key)
+                self.stats['stale_hits'] += 1
+                if key not in self._inflight:
+                    self.stats['refreshes'] += 1
+                    self._start_fetch(key, pickup_location, delivery_location, fetch)
+                return quotes
+
+        self.stats['misses'] += 1
+        future = self._inflight.get(key) or self._start_fetch(key, pickup_location, delivery_location, fetch)
+        return await asyncio.shield(future)
+
+    def _start_fetch(
+        self,
+        key: Tuple[str, str, str],
+        pickup_location: VendorLocation,
+        delivery_location: VendorLocation,
+        fetch: QuoteFetcher
+    ) -> asyncio.Future:
+        """Start a single-flight fetch that stores its result when done"""
+        task = asyncio.ensure_future(fetch(pickup_location, delivery_location))
+        self._inflight[key] = task
+
+        def store(done: asyncio.Future):
+            self._inflight.pop(key, None)
+            if done.cancelled():
+                return
+            if done.exception():
+                logger.warning(f"Quote refresh for {key} failed: {done.exception()}")
+                return
+            if not done.result():
+                # Every partner failed: not worth keeping (a stale entry stays until it expires)
+                self.stats['empty'] += 1
+                return
+            self._put(key, done.result())
+
+        task.add_done_callback(store)
+        return task
+
+    def _put(self, key: Tuple[str, str, str], quotes: List[Dict[str, Any]]):
+        self._entries[key] = (self.clock(), quotes)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats['evictions'] += 1
+
+    def invalidate(self, vendor_id: Optional[str] = None):
+        """Drop cached quotes for one vendor, or everything"""
+        if vendor_id is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == vendor_id]:
+            del self._entries[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Counters plus hit ratios (stale hits count as hits)"""
+        lookups = self.stats['hits'] + self.stats['stale_hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_ratio": round((self.stats['hits'] + self.stats['stale_hits']) / lookups, 4) if lookups else 0.0,
+            "fresh_hit_ratio": round(self.stats['hits'] / lookups, 4) if lookups else 0.0
+        }
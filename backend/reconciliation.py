@@ -0,0 +1,348 @@
+"""
+Settlement reconciliation
+Streams a gateway settlement CSV, sorts it externally by order id and merge-joins
+it against payment_sessions read in order-id order, so memory stays bounded by
+the sort chunk size however large the report is
+"""
+
+from typing import Dict, Any, List, Optional, Iterator, AsyncIterator, Tuple, Callable, Awaitable
+from datetime import datetime, timezone
+from itertools import groupby
+import asyncio
+import csv
+import heapq
+import logging
+import math
+import os
+import tempfile
+import time
+import uuid
+from models import PaymentStatus
+
+logger = logging.getLogger(__name__)
+
+# Settlement report column -> field, per gateway (amount divisor converts minor units to rupees)
+SETTLEMENT_FORMATS = {
+    "razorpay": {
+        "columns": {"order_id": "order_receipt", "payment_id": "entity_id", "amount": "amount", "status": "type"},
+        "amount_divisor": 100
+    },
+    "payu": {
+        "columns": {"order_id": "txnid", "payment_id": "mihpayid", "amount": "amount", "status": "status"},
+        "amount_divisor": 1
+    },
+    "paytm": {
+        "columns": {"order_id": "ORDERID", "payment_id": "TXNID", "amount": "TXNAMOUNT", "status": "STATUS"},
+        "amount_divisor": 1
+    }
+}
+
+DEFAULT_SETTLEMENT_FORMAT = {
+    "columns": {"order_id": "order_id", "payment_id": "payment_id", "amount": "amount", "status": "status"},
+    "amount_divisor": 1
+}
+
+# Gateway settlement status -> payment session status
+SETTLEMENT_STATUS_MAP = {
+    "settled": PaymentStatus.SUCCESS.value,
+    "settlement": PaymentStatus.SUCCESS.value,
+    "captured": PaymentStatus.SUCCESS.value,
+    "payment": PaymentStatus.SUCCESS.value,
+    "success": PaymentStatus.SUCCESS.value,
+    "txn_success": PaymentStatus.SUCCESS.value,
+    "failed": PaymentStatus.FAILED.value,
+    "failure": PaymentStatus.FAILED.value,
+    "txn_failure": PaymentStatus.FAILED.value,
+    "refund": PaymentStatus.REFUNDED.value,
+    "refunded": PaymentStatus.REFUNDED.value
+}
+
+AMOUNT_TOLERANCE = 0.01
+
+SORT_CHUNK_ROWS = 50000
+SESSION_BATCH_SIZE = 1000
+PROGRESS_EVERY_ROWS = 50000
+# The run document's progress is rewritten at most this often
+PROGRESS_INTERVAL_S = 1.0
+
+# Mismatch types
+MISSING_SESSION = "missing_session"
+MISSING_SETTLEMENT = "missing_settlement"
+AMOUNT_DIFFERS = "amount_differs"
+STATUS_DIFFERS = "status_differs"
+
+SETTLEMENT_FIELDS = ["order_id", "payment_id", "amount", "status"]
+
+def read_settlement_rows(
+    path: str,
+    gateway: str,
+    metrics: Optional["ReconciliationMetrics"] = None
+) -> Iterator[Dict[str, Any]]:
+    """Stream normalised rows (order_id, payment_id, amount, status) from a settlement CSV;
+    rows whose amount is not a number are skipped and counted as malformed"""
+    report_format = SETTLEMENT_FORMATS.get(gateway, DEFAULT_SETTLEMENT_FORMAT)
+    columns = report_format['columns']
+    divisor = report_format['amount_divisor']
+
+    with open(path, newline='') as f:
+        for line, row in enumerate(csv.DictReader(f), start=2):
+            order_id = (row.get(columns['order_id']) or "").strip()
+            if not order_id:
+                continue
+            try:
+                amount = float(row.get(columns['amount']) or 0)
+            except (TypeError, ValueError):
+                amount = math.nan
+            if not math.isfinite(amount):
+                logger.debug(f"Settlement row {line}: bad amount {row.get(columns['amount'])!r}, skipped")
+                if metrics is not None:
+                    metrics.malformed_rows += 1
+                continue
+            status = (row.get(columns['status']) or "").strip().lower()
+            yield {
+                "order_id": order_id,
+                "payment_id": (row.get(columns['payment_id']) or "").strip(),
+                "amount": round(amount / divisor, 2),
+                "status": SETTLEMENT_STATUS_MAP.get(status, status)
+            }
+
+def _write_run(rows: List[Dict[str, Any]], directory: str) -> str:
+    rows.sort(key=lambda r: r['order_id'])
+    fd, path = tempfile.mkstemp(prefix="settlement_run_", suffix=".csv", dir=directory)
+    with os.fdopen(fd, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=SETTLEMENT_FIELDS)
+        writer.writerows(rows)
+    return path
+
+def _read_run(path: str) -> Iterator[Dict[str, Any]]:
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f, fieldnames=SETTLEMENT_FIELDS):
+            row['amount'] = float(row['amount'])
+            yield row
+
+def sort_settlement_runs(rows: Iterator[Dict[str, Any]], directory: str, chunk_rows: int = SORT_CHUNK_ROWS) -> List[str]:
+    """External sort phase: write sorted runs of at most ``chunk_rows`` rows to temp files"""
+    runs = []
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= chunk_rows:
+            runs.append(_write_run(chunk, directory))
+            chunk = []
+    if chunk:
+        runs.append(_write_run(chunk, directory))
+    return runs
+
+def merge_settlement_runs(runs: List[str]) -> Iterator[Dict[str, Any]]:
+    """k-way merge of sorted runs into one stream ordered by order id"""
+    return heapq.merge(*(_read_run(path) for path in runs), key=lambda r: r['order_id'])
+
+async def _group_sessions(cursor) -> AsyncIterator[Tuple[str, List[Dict[str, Any]]]]:
+    """Group an order-id-sorted session cursor by order id"""
+    key, group = None, []
+    async for session in cursor:
+        if session['order_id'] != key and group:
+            yield key, group
+            group = []
+        key = session['order_id']
+        group.append(session)
+    if group:
+        yield key, group
+
+def _pick_session(sessions: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """The session a settlement should match: a successful one if any, else the latest"""
+    for session in sessions:
+        if session.get('status') == PaymentStatus.SUCCESS.value:
+            return session
+    return max(sessions, key=lambda s: str(s.get('created_at') or ""))
+
+def _compare(order_id: str, settlement: Dict[str, Any], session: Dict[str, Any]) -> List[Dict[str, Any]]:
+    mismatches = []
+    if abs(settlement['amount'] - float(session.get('amount') or 0)) > AMOUNT_TOLERANCE:
+        mismatches.append({
+            "type": AMOUNT_DIFFERS, "order_id": order_id, "session_id": session.get('id'),
+            "settlement_amount": settlement['amount'], "session_amount": session.get('amount')
+        })
+    if settlement['status'] != session.get('status'):
+        mismatches.append({
+            "type": STATUS_DIFFERS, "order_id": order_id, "session_id": session.get('id'),
+            "settlement_status": settlement['status'], "session_status": session.get('status')
+        })
+    return mismatches
+
+class ReconciliationMetrics:
+    def __init__(self):
+        self.started = time.monotonic()
+        self.settlement_rows = 0
+        self.malformed_rows = 0
+        self.sessions = 0
+        self.matched = 0
+        self.mismatches = {MISSING_SESSION: 0, MISSING_SETTLEMENT: 0, AMOUNT_DIFFERS: 0, STATUS_DIFFERS: 0}
+
+    def as_dict(self) -> Dict[str, Any]:
+        elapsed = time.monotonic() - self.started
+        return {
+            "settlement_rows": self.settlement_rows,
+            "malformed_rows": self.malformed_rows,
+            "sessions": self.sessions,
+            "matched": self.matched,
+            "mismatches": dict(self.mismatches),
+            "elapsed_s": round(elapsed, 3),
+            "rows_per_second": round(self.settlement_rows / elapsed, 1) if elapsed else 0.0
+        }
+
+async def merge_join(
+    settlements: Iterator[Dict[str, Any]],
+    session_cursor,
+    on_mismatch: Callable[[Dict[str, Any]], Awaitable[None]],
+    metrics: Optional[ReconciliationMetrics] = None,
+    on_progress: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+) -> ReconciliationMetrics:
+    """Walk both order-id-sorted streams once, reporting every mismatch"""
+    metrics = metrics or ReconciliationMetrics()
+    settlement_groups = groupby(settlements, key=lambda r: r['order_id'])
+    session_groups = _group_sessions(session_cursor)
+
+    async def next_settlement() -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        group = next(settlement_groups, None)
+        if group is None:
+            return None
+        rows = list(group[1])
+        before = metrics.settlement_rows
+        metrics.settlement_rows += len(rows)
+        if on_progress and before // PROGRESS_EVERY_ROWS != metrics.settlement_rows // PROGRESS_EVERY_ROWS:
+            await on_progress(metrics.as_dict())
+        return group[0], rows
+
+    async def next_sessions() -> Optional[Tuple[str, List[Dict[str, Any]]]]:
+        try:
+            group = await session_groups.__anext__()
+        except StopAsyncIteration:
+            return None
+        metrics.sessions += len(group[1])
+        return group
+
+    async def report(mismatch: Dict[str, Any]):
+        metrics.mismatches[mismatch['type']] += 1
+        await on_mismatch(mismatch)
+
+    settlement = await next_settlement()
+    sessions = await next_sessions()
+
+    while settlement or sessions:
+        if sessions is None or (settlement and settlement[0] < sessions[0]):
+            order_id, rows = settlement
+            for row in rows:
+                await report({
+                    "type": MISSING_SESSION, "order_id": order_id, "payment_id": row['payment_id'],
+                    "settlement_amount": row['amount'], "settlement_status": row['status']
+                })
+            settlement = await next_settlement()
+        elif settlement is None or sessions[0] < settlement[0]:
+            order_id, group = sessions
+            session = _pick_session(group)
+            # Only captured money is expected in a settlement report
+            if session.get('status') == PaymentStatus.SUCCESS.value:
+                await report({
+                    "type": MISSING_SETTLEMENT, "order_id": order_id, "session_id": session.get('id'),
+                    "session_amount": session.get('amount'), "session_status": session.get('status')
+                })
+            sessions = await next_sessions()
+        else:
+            order_id, rows = settlement
+            session = _pick_session(sessions[1])
+            # Several rows for one order (e.g. payment then refund): the last one is the current state
+            found = _compare(order_id, rows[-1], session)
+            for mismatch in found:
+                await report(mismatch)
+            if not found:
+                metrics.matched += 1
+            settlement = await next_settlement()
+            sessions = await next_sessions()
+
+    return metrics
+
+async def run_reconciliation(
+    db,
+    report_path: str,
+    gateway: str,
+    run_id: Optional[str] = None,
+    chunk_rows: int = SORT_CHUNK_ROWS,
+    mismatch_batch_size: int = 500
+) -> Dict[str, Any]:
+    """Reconcile one settlement report against payment_sessions for ``gateway``.
+
+    Mismatches go to reconciliation_mismatches in batches; the run document in
+    reconciliation_runs carries progress and final metrics.
+    """
+    run_id = run_id or str(uuid.uuid4())
+    metrics = ReconciliationMetrics()
+    await db.reconciliation_runs.update_one(
+        {"id": run_id},
+        {"$set": {
+            "id": run_id,
+            "gateway": gateway,
+            "status": "running",
+            "started_at": datetime.now(timezone.utc).isoformat()
+        }},
+        upsert=True
+    )
+
+    pending: List[Dict[str, Any]] = []
+
+    async def flush_mismatches():
+        if pending:
+            await db.reconciliation_mismatches.insert_many(list(pending))
+            pending.clear()
+
+    async def on_mismatch(mismatch: Dict[str, Any]):
+        pending.append({**mismatch, "run_id": run_id, "gateway": gateway})
+        if len(pending) >= mismatch_batch_size:
+            await flush_mismatches()
+
+    last_progress = float('-inf')
+
+    async def on_progress(progress: Dict[str, Any]):
+        nonlocal last_progress
+        logger.info(f"Reconciliation {run_id}: {progress['settlement_rows']} rows, {progress['rows_per_second']} rows/s")
+        if time.monotonic() - last_progress < PROGRESS_INTERVAL_S:
+            return
+        last_progress = time.monotonic()
+        await db.reconciliation_runs.update_one({"id": run_id}, {"$set": {"progress": progress}})
+
+    with tempfile.TemporaryDirectory(prefix="reconciliation_") as work_dir:
+        try:
+            # Sorting is CPU and disk bound, keep it off the event loop
+            runs = await asyncio.to_thread(
+                sort_settlement_runs, read_settlement_rows(report_path, gateway, metrics), work_dir, chunk_rows
+            )
+            await db.payment_sessions.create_index([("gateway", 1), ("order_id", 1)])
+            await db.reconciliation_mismatches.create_index([("run_id", 1), ("type", 1)])
+            cursor = db.payment_sessions.find(
+                {"gateway": gateway},
+                {"_id": 0, "id": 1, "order_id": 1, "amount": 1, "status": 1, "created_at": 1}
+            ).sort("order_id", 1).batch_size(SESSION_BATCH_SIZE)
+
+            await merge_join(merge_settlement_runs(runs), cursor, on_mismatch, metrics, on_progress)
+            await flush_mismatches()
+        except Exception as e:
+            logger.error(f"Reconciliation {run_id} failed: {e}")
+            await db.reconciliation_runs.update_one(
+                {"id": run_id},
+                {"$set": {"status": "failed", "error": str(e), "metrics": metrics.as_dict()}}
+            )
+            raise
+
+    result = metrics.as_dict()
+    if metrics.malformed_rows:
+        logger.warning(f"Reconciliation {run_id}: skipped {metrics.malformed_rows} malformed settlement rows")
+    await db.reconciliation_runs.update_one(
+        {"id": run_id},
+        {"$set": {
+            "status": "completed",
+            "completed_at": datetime.now(timezone.utc).isoformat(),
+            "metrics": result
+        }}
+    )
+    logger.info(f"Reconciliation {run_id} completed: {result}")
+    return {"run_id": run_id, **result}
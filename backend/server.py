@@ -1,4 +1,4 @@
-from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Form
+from fastapi import FastAPI, APIRouter, HTTPException, Depends, Request, Form, File, UploadFile
 from fastapi.security import HTTPBearer
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
@@ -7,10 +7,12 @@ import socketio
 import os
 import logging
 from pathlib import Path
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Set
 from datetime import datetime, timezone
 import uuid
 import json
+import asyncio
+import tempfile
 
 # Import models and services
 from models import (
@@ -30,12 +32,29 @@ from pricing import (
     save_price_rules
 )
 from vendors import auto_assign_vendor, find_nearest_vendor
-from delivery import get_delivery_quotes, select_cheapest_partner, book_delivery
+from delivery import (
+    select_cheapest_partner, book_delivery, get_cheapest_vendor_quote, load_consolidation_settings,
+    load_delivery_partners
+)
+from quote_aggregator import QuoteAggregator
+from quote_cache import QuoteCache
+from delivery_consolidation import consolidate_ready_deliveries, run_consolidation_loop
+from delivery_webhooks import DeliveryWebhookIngestor, IngestQueueFull, InvalidDeliveryEvent, DeliveryEventNotStored
+from payment_events import PaymentEventPipeline, EventQueueFull, EventNotStored, get_event_id
+from reconciliation import run_reconciliation
+from payment_sessions import PaymentSessionManager
 from payments import (
-    create_payment_session, verify_webhook_signature,
-    handle_payment_webhook, get_active_gateway
+    create_webhook_verifier, get_webhook_signature,
+    handle_payment_webhook, get_active_gateway,
+    load_payment_config, update_payment_settings, watch_payment_config,
+    close_gateway_clients
+)
+from notifications import (
+    NotificationService, NotificationLogWriter, get_order_confirmation_message, load_notification_settings,
+    get_log_page
 )
-from notifications import NotificationService, get_order_confirmation_message
+from notification_templates import render_template
+from notification_dispatcher import NotificationDispatcher
 from uploads import generate_upload_signed_url, simulate_virus_scan
 from customer_auth import (
     generate_otp, send_otp_sms, store_otp, verify_otp, 
@@ -44,7 +63,10 @@ from customer_auth import (
 from vendor_auth import (
     create_vendor_token, verify_password as verify_vendor_password
 )
-from socketio_manager import sio, notify_vendor
+from socketio_manager import sio, vendor_coalescer, sender as socket_sender
+import order_tracking
+from admin_dashboard import dashboard as admin_dashboard, run_resync_loop as run_admin_dashboard_resync
+from order_tracking import publish_order_status
 
 # Enhanced modules
 import admin_enhanced
@@ -53,6 +75,10 @@ import instore_orders
 import google_oauth
 import pricing_manager
 import commission_manager
+import vendor_notifications
+import vendor_outbox
+import socket_auth
+from vendor_notifications import notify_vendor
 import content_manager
 
 ROOT_DIR = Path(__file__).parent
@@ -60,7 +86,12 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+if mongo_url.startswith('memory://'):
+    # In-process stand-in for single-box load tests (socket_load_test.py)
+    from memory_db import MemoryClient
+    client = MemoryClient(mongo_url)
+else:
+    client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
 # Create the main app
@@ -75,7 +106,14 @@ socket_app = socketio.ASGIApp(
 )
 
 # Notification service
-notification_service = NotificationService(mode="SIMULATED")
+notification_service = NotificationService(mode=load_notification_settings().get('mode', "SIMULATED"))
+notification_log_writer = NotificationLogWriter()
+notification_dispatcher = NotificationDispatcher(notification_service, on_sent=notification_log_writer.add)
+
+# Delivery quote fan-out (pooled HTTP client for LIVE partners)
+quote_aggregator = QuoteAggregator()
+quote_cache = QuoteCache()
+delivery_webhook_ingestor = DeliveryWebhookIngestor(on_applied=order_tracking.publish_delivery_events)
 
 # Configure logging
 logging.basicConfig(
@@ -294,6 +332,7 @@ async def vendor_register(vendor_data: VendorCreate):
     vendor_dict = vendor.model_dump()
     vendor_dict['created_at'] = vendor_dict['created_at'].isoformat()
     vendor_dict['updated_at'] = vendor_dict['updated_at'].isoformat()
+    vendor_dict.update(await vendor_notifications.initial_inbox_state())
     
     await db.vendors.insert_one(vendor_dict)
     
@@ -371,6 +410,7 @@ async def vendor_accept_order(order_id: str, current_user: dict = Depends(get_cu
             "$push": {"statusHistory": status_update}
         }
     )
+    await publish_order_status(order_id, OrderStatus.ASSIGNED.value)
     
     return {"message": "Order accepted", "status": "success"}
 
@@ -394,6 +434,7 @@ async def vendor_start_order(order_id: str, current_user: dict = Depends(get_cur
             "$push": {"statusHistory": status_update}
         }
     )
+    await publish_order_status(order_id, OrderStatus.IN_PRODUCTION.value)
     
     return {"message": "Production started", "status": "success"}
 
@@ -425,6 +466,7 @@ async def vendor_complete_order(order_id: str, proof_url: Optional[str] = None,
         update_data["$set"]["proof_url"] = proof_url
     
     await db.orders.update_one({"id": order_id}, update_data)
+    await publish_order_status(order_id, new_status)
     
     # Update vendor sales and earnings
     vendor_id = current_user['sub']
@@ -458,13 +500,13 @@ async def vendor_complete_order(order_id: str, proof_url: Optional[str] = None,
             "badge.upgrade",
             {
                 "newBadge": new_badge,
-                "message": f"Congratulations! You've been upgraded to {new_badge.upper()} badge!"
+                "message": render_template("badge_upgrade", vendor.get('preferred_language'), badge=new_badge.upper())
             }
         )
     
-    await notification_service.send_whatsapp(
+    await notification_dispatcher.enqueue_whatsapp(
         order['customer_phone'],
-        f"Your order {order_id} is ready!",
+        render_template("order_completed", order.get('preferred_language'), order_id=order_id),
         order_id
     )
     
@@ -521,11 +563,15 @@ async def vendor_order_action(
                 "$push": {"statusHistory": status_update}
             }
         )
+        await publish_order_status(order_id, OrderStatus.ASSIGNED.value)
         
         # Notify customer
-        await notification_service.send_whatsapp(
+        await notification_dispatcher.enqueue_whatsapp(
             order['customer_phone'],
-            f"Your order {order_id} has been accepted by {vendor.get('shop_name', vendor['name'])}!",
+            render_template(
+                "order_accepted", order.get('preferred_language'),
+                order_id=order_id, shop_name=vendor.get('shop_name', vendor['name'])
+            ),
             order_id
         )
         
@@ -665,6 +711,9 @@ async def admin_update_vendor(
         {"$set": updates}
     )
     
+    if 'location' in updates:
+        quote_cache.invalidate(vendor_id)
+    
     # Log audit
     await db.vendor_audits.insert_one({
         "vendor_id": vendor_id,
@@ -976,6 +1025,7 @@ async def create_vendor(
     vendor_dict = vendor.model_dump()
     vendor_dict['created_at'] = vendor_dict['created_at'].isoformat()
     vendor_dict['updated_at'] = vendor_dict['updated_at'].isoformat()
+    vendor_dict.update(await vendor_notifications.initial_inbox_state())
     
     await db.vendors.insert_one(vendor_dict)
     
@@ -995,6 +1045,9 @@ async def update_vendor(
     updates['updated_at'] = datetime.now(timezone.utc).isoformat()
     await db.vendors.update_one({"id": vendor_id}, {"$set": updates})
     
+    if 'location' in updates:
+        quote_cache.invalidate(vendor_id)
+    
     vendor_doc.update(updates)
     return Vendor(**vendor_doc)
 
@@ -1101,10 +1154,61 @@ async def verify_upload(upload_id: str, file_key: str):
 
 # ==================== ESTIMATE ENDPOINTS ====================
 
+# Vendors costed per get_cheapest_vendor_quote call while streaming the candidates
+QUOTE_VENDOR_CHUNK = 1000
+
+async def find_cheapest_delivery(customer_location: VendorLocation) -> Optional[Dict[str, Any]]:
+    """Cheapest (vendor, partner) delivery quote across the vendors an order can be assigned to"""
+    cursor = db.vendors.find(
+        {
+            "is_active": True,
+            "store_open": True,
+            "location.latitude": {"$exists": True},
+            "location.longitude": {"$exists": True}
+        },
+        {"_id": 0, "id": 1, "name": 1, "shop_name": 1, "location": 1}
+    )
+    partners = load_delivery_partners()
+    quote, quote_vendor, candidates = None, None, 0
+    chunk: List[Dict[str, Any]] = []
+    
+    def best_of(vendors: List[Dict[str, Any]]):
+        nonlocal quote, quote_vendor
+        chunk_quote = get_cheapest_vendor_quote(vendors, customer_location, partners)
+        if chunk_quote and (quote is None or (chunk_quote['cost'], chunk_quote['distance_km']) < (quote['cost'], quote['distance_km'])):
+            quote = chunk_quote
+            quote_vendor = next(v for v in vendors if v['id'] == chunk_quote['vendor_id'])
+    
+    async for vendor in cursor:
+        chunk.append(vendor)
+        candidates += 1
+        if len(chunk) >= QUOTE_VENDOR_CHUNK:
+            best_of(chunk)
+            chunk = []
+    if chunk:
+        best_of(chunk)
+    
+    if quote:
+        quote['candidates'] = candidates
+    if quote and quote['mode'] == 'LIVE':
+        # Rate cards pick the pair; a LIVE partner re-quotes just that one pair
+        live_quotes = await quote_cache.get_quotes(
+            quote_vendor['id'], VendorLocation(**quote_vendor['location']), customer_location, quote_aggregator.get_quotes
+        )
+        live_quote = next((q for q in live_quotes if q['partner_id'] == quote['partner_id']), None)
+        if live_quote:
+            quote.update(cost=live_quote['cost'], estimated_time_minutes=live_quote['estimated_time_minutes'])
+    
+    return quote
+
 @api_router.post("/calculate-estimate", response_model=EstimateResponse)
 async def calculate_order_estimate(request: EstimateRequest):
     """Calculate order estimate"""
     try:
+        delivery_quote = None
+        if request.fulfillment_type.value == "Delivery" and request.customer_location:
+            delivery_quote = await find_cheapest_delivery(request.customer_location)
+        
         estimate = calculate_estimate(request)
         
         # If pickup, find suggested vendor
@@ -1134,17 +1238,11 @@ async def calculate_order_estimate(request: EstimateRequest):
                     ]
                 }
         
-        # If delivery, get delivery quotes
-        if request.fulfillment_type.value == "Delivery" and request.customer_location:
-            vendors = await db.vendors.find({"is_active": True}, {"_id": 0}).limit(1).to_list(1)
-            if vendors:
-                vendor = Vendor(**vendors[0])
-                quotes = get_delivery_quotes(vendor.location, request.customer_location)
-                if quotes:
-                    cheapest = select_cheapest_partner(quotes)
-                    estimate.delivery_quote = cheapest
-                    estimate.delivery_charge = cheapest['cost']
-                    estimate.total = estimate.items_total + estimate.delivery_charge
+        # If delivery, quote the cheapest (vendor, partner) combination
+        if delivery_quote:
+            estimate.delivery_quote = delivery_quote
+            estimate.delivery_charge = delivery_quote['cost']
+            estimate.total = estimate.items_total + estimate.delivery_charge
         
         return estimate
     except Exception as e:
@@ -1163,7 +1261,13 @@ async def create_order(order_data: OrderCreate):
             fulfillment_type=order_data.fulfillment_type,
             customer_location=order_data.customer_location
         )
+        delivery_quote = None
+        if order_data.fulfillment_type.value == "Delivery" and order_data.customer_location:
+            delivery_quote = await find_cheapest_delivery(order_data.customer_location)
         estimate = calculate_estimate(estimate_request)
+        if delivery_quote:
+            estimate.delivery_charge = delivery_quote['cost']
+            estimate.total = estimate.items_total + estimate.delivery_charge
         
         # Get active price rule for snapshot
         price_rule = get_active_price_rule()
@@ -1172,7 +1276,10 @@ async def create_order(order_data: OrderCreate):
         assigned_vendor_id = None
         assigned_vendor_snapshot = None
         
-        if order_data.fulfillment_type.value == "Pickup" and order_data.customer_location:
+        if delivery_quote:
+            # The vendor whose delivery cost was billed fulfils the order
+            assigned_vendor_id = delivery_quote['vendor_id']
+        elif order_data.fulfillment_type.value == "Pickup" and order_data.customer_location:
             from order_assignment import find_eligible_vendors
             eligible_vendors = await find_eligible_vendors(order_data.customer_location, db)
             
@@ -1193,6 +1300,7 @@ async def create_order(order_data: OrderCreate):
             customer_email=order_data.customer_email,
             customer_phone=order_data.customer_phone,
             customer_name=order_data.customer_name,
+            preferred_language=order_data.preferred_language,
             items=order_data.items,
             fulfillment_type=order_data.fulfillment_type,
             customer_location=order_data.customer_location,
@@ -1223,6 +1331,7 @@ async def create_order(order_data: OrderCreate):
             }
         
         await db.orders.insert_one(order_dict)
+        admin_dashboard.order_status_changed(order.id, OrderStatus.ESTIMATED.value)
         
         # Assign to vendor using new system
         if assigned_vendor_id:
@@ -1286,12 +1395,13 @@ async def update_order_status(
         {"id": order_id},
         {"$set": {"status": status.value, "updated_at": datetime.now(timezone.utc).isoformat()}}
     )
+    await publish_order_status(order_id, status.value)
     
     # Send notification
     if status == OrderStatus.READY_FOR_PICKUP:
-        await notification_service.send_whatsapp(
+        await notification_dispatcher.enqueue_whatsapp(
             order_doc['customer_phone'],
-            f"Your order {order_id} is ready for pickup!",
+            render_template("order_awaiting_pickup", order_doc.get('preferred_language'), order_id=order_id),
             order_id
         )
     
@@ -1325,6 +1435,14 @@ async def track_order_public(
         if not orders:
             raise HTTPException(status_code=404, detail="No orders found with provided details")
         
+        # Vendor info for all orders in one query
+        vendor_ids = list({o['vendor_id'] for o in orders if o.get('vendor_id')})
+        vendors = await db.vendors.find(
+            {"id": {"$in": vendor_ids}},
+            {"_id": 0, "id": 1, "name": 1, "location.address": 1}
+        ).to_list(None) if vendor_ids else []
+        vendors_by_id = {v['id']: v for v in vendors}
+        
         # Process each order
         for order_doc in orders:
             # Convert datetime strings if needed
@@ -1334,11 +1452,10 @@ async def track_order_public(
                 order_doc['updated_at'] = datetime.fromisoformat(order_doc['updated_at'])
             
             # Get vendor info if assigned
-            if order_doc.get('vendor_id'):
-                vendor = await db.vendors.find_one({"id": order_doc['vendor_id']}, {"_id": 0})
-                if vendor:
-                    order_doc['vendor_name'] = vendor.get('name')
-                    order_doc['vendor_location'] = vendor.get('location', {}).get('address')
+            vendor = vendors_by_id.get(order_doc.get('vendor_id'))
+            if vendor:
+                order_doc['vendor_name'] = vendor.get('name')
+                order_doc['vendor_location'] = vendor.get('location', {}).get('address')
         
         return orders
         
@@ -1402,9 +1519,7 @@ async def get_my_orders(current_user: dict = Depends(get_current_user)):
 @api_router.get("/admin/payment-gateway/config")
 async def get_payment_gateway_config(current_user: dict = Depends(require_role([UserRole.SUPER_ADMIN]))):
     """Get payment gateway configuration (admin only)"""
-    config_path = Path(__file__).parent / "config" / "payment_gateways.json"
-    with open(config_path, 'r') as f:
-        config = json.load(f)
+    config = load_payment_config()
     
     # Remove sensitive keys before sending
     for gateway in config['gateways']:
@@ -1422,18 +1537,81 @@ async def update_payment_gateway_config(
     current_user: dict = Depends(require_role([UserRole.SUPER_ADMIN]))
 ):
     """Update payment gateway settings"""
-    config_path = Path(__file__).parent / "config" / "payment_gateways.json"
-    
-    with open(config_path, 'r') as f:
-        config = json.load(f)
+    try:
+        update_payment_settings(active_gateway, mode)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     
-    config['activeGateway'] = active_gateway
-    config['mode'] = mode
+    return {"message": "Payment gateway configuration updated", "activeGateway": active_gateway, "mode": mode}
+
+@api_router.post("/admin/payments/reconcile", status_code=202)
+async def reconcile_settlement_report(
+    gateway: str = Form(...),
+    report: UploadFile = File(...),
+    current_user: dict = Depends(require_role([UserRole.SUPER_ADMIN]))
+):
+    """Reconcile a gateway settlement CSV against payment sessions (runs in the background)"""
+    # Spool the upload to disk in chunks; the report is never held in memory
+    fd, report_path = tempfile.mkstemp(prefix="settlement_", suffix=".csv")
+    with os.fdopen(fd, 'wb') as f:
+        while chunk := await report.read(1024 * 1024):
+            f.write(chunk)
+    
+    run_id = str(uuid.uuid4())
+    
+    async def run():
+        try:
+            await run_reconciliation(db, report_path, gateway, run_id=run_id)
+        except Exception as e:
+            logger.error(f"Settlement reconciliation error: {e}")
+        finally:
+            os.remove(report_path)
+    
+    start_background_task(run())
+    return {"run_id": run_id, "status": "running"}
+
+@api_router.get("/admin/payments/reconcile/{run_id}")
+async def get_reconciliation_run(
+    run_id: str,
+    mismatch_type: Optional[str] = None,
+    limit: int = 100,
+    current_user: dict = Depends(require_role([UserRole.SUPER_ADMIN]))
+):
+    """Progress/metrics of a reconciliation run and its mismatches"""
+    run_doc = await db.reconciliation_runs.find_one({"id": run_id}, {"_id": 0})
+    if not run_doc:
+        raise HTTPException(status_code=404, detail="Reconciliation run not found")
+    
+    query = {"run_id": run_id}
+    if mismatch_type:
+        query["type"] = mismatch_type
+    mismatches = await db.reconciliation_mismatches.find(query, {"_id": 0}).limit(min(limit, 1000)).to_list(None)
+    
+    return {**run_doc, "mismatches": mismatches}
+
+@api_router.get("/admin/notifications/logs")
+async def get_notification_logs(
+    order_id: Optional[str] = None,
+    recipient: Optional[str] = None,
+    before: Optional[str] = None,
+    limit: int = 50,
+    current_user: dict = Depends(require_role([UserRole.SUPER_ADMIN, UserRole.SUPERVISOR]))
+):
+    """Delivery audit trail for an order and/or recipient, newest first (admin only); page with
+    the returned ``next_before``"""
+    if not order_id and not recipient:
+        raise HTTPException(status_code=400, detail="order_id or recipient is required")
     
-    with open(config_path, 'w') as f:
-        json.dump(config, f, indent=2)
+    query = {}
+    if order_id:
+        query["order_id"] = order_id
+    if recipient:
+        query["recipient"] = recipient
     
-    return {"message": "Payment gateway configuration updated", "activeGateway": active_gateway, "mode": mode}
+    try:
+        return await get_log_page(db, query, min(limit, 500), before)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid before cursor")
 
 # ==================== PAYMENT ENDPOINTS ====================
 
@@ -1448,14 +1626,10 @@ async def create_payment(order_id: str):
         if order_doc['status'] not in [OrderStatus.ESTIMATED.value, OrderStatus.PAYMENT_PENDING.value]:
             raise HTTPException(status_code=400, detail="Order not ready for payment")
         
-        # Create payment session
-        session = create_payment_session(order_id, order_doc['total'])
-        
-        session_dict = session.model_dump()
-        session_dict['created_at'] = session_dict['created_at'].isoformat()
-        session_dict['updated_at'] = session_dict['updated_at'].isoformat()
-        
-        await db.payment_sessions.insert_one(session_dict)
+        # Create payment session (retries and double-clicks get the open one back)
+        session, created = await payment_session_manager.get_or_create(order_id, order_doc['total'])
+        if not created and order_doc.get('payment_session_id') == session.id:
+            return session
         
         # Update order
         await db.orders.update_one(
@@ -1466,8 +1640,11 @@ async def create_payment(order_id: str):
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        await publish_order_status(order_id, OrderStatus.PAYMENT_PENDING.value)
         
         return session
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Payment session creation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -1485,61 +1662,96 @@ async def get_payment_config():
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.post("/webhooks/payment/{gateway}")
+async def apply_payment_event(event: dict):
+    """Apply one persisted payment event (called by the per-payment workers, safe to repeat)"""
+    if event['status'] != 'success' or not event.get('order_id'):
+        return
+    
+    order_id = event['order_id']
+    now = datetime.now(timezone.utc).isoformat()
+    
+    # Update payment session
+    await db.payment_sessions.update_one(
+        {"order_id": order_id},
+        {"$set": {
+            "status": PaymentStatus.SUCCESS.value,
+            "updated_at": now
+        }}
+    )
+    
+    # Update order; only the first success moves it to PAID and notifies (a replay never moves it back)
+    order_doc = await db.orders.find_one_and_update(
+        {"id": order_id, "status": {"$in": [
+            OrderStatus.DRAFT.value, OrderStatus.ESTIMATED.value, OrderStatus.PAYMENT_PENDING.value
+        ]}},
+        {"$set": {
+            "status": OrderStatus.PAID.value,
+            "updated_at": now
+        }},
+        projection={"_id": 0, "customer_phone": 1, "customer_email": 1, "total": 1, "preferred_language": 1}
+    )
+    if not order_doc:
+        return
+    
+    payment_session_manager.invalidate(order_id)
+    await publish_order_status(order_id, OrderStatus.PAID.value)
+    
+    # Send confirmation notification
+    locale = order_doc.get('preferred_language')
+    message = get_order_confirmation_message(order_id, order_doc['total'], locale)
+    # Payment receipts go out immediately rather than waiting for a digest
+    await notification_dispatcher.enqueue_whatsapp(order_doc['customer_phone'], message, order_id, critical=True)
+    
+    await notification_dispatcher.enqueue_email(
+        order_doc['customer_email'],
+        render_template("order_confirmed_subject", locale),
+        message,
+        order_id
+    )
+
+payment_event_pipeline = PaymentEventPipeline(apply_payment_event)
+payment_session_manager = PaymentSessionManager()
+
+@api_router.post("/webhooks/payment/{gateway}", status_code=202)
 async def payment_webhook(gateway: str, request: Request):
-    """Handle payment gateway webhooks"""
+    """Handle payment gateway webhooks (verified and recorded before acknowledging, applied in the background)"""
     try:
-        payload = await request.json()
-        signature = request.headers.get('X-Signature', '')
+        verifier = create_webhook_verifier(gateway)
+        if verifier is None:
+            raise HTTPException(status_code=401, detail="Invalid signature")
+        
+        # Verify the signature over the raw bytes as they stream in; nothing is parsed until it matches
+        chunks = []
+        async for chunk in request.stream():
+            verifier.update(chunk)
+            chunks.append(chunk)
         
-        # Verify signature
-        if not verify_webhook_signature(gateway, payload, signature):
+        if not verifier.verify(get_webhook_signature(gateway, request.headers)):
             raise HTTPException(status_code=401, detail="Invalid signature")
         
-        # Handle webhook
+        body = b"".join(chunks)
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            # Signed but unparseable: a retry will not fix it
+            logger.warning(f"Payment webhook from {gateway}: body is not valid JSON")
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
+        if not isinstance(payload, dict):
+            raise HTTPException(status_code=400, detail="Invalid JSON body")
         result = handle_payment_webhook(gateway, payload)
         
-        if result['status'] == 'success':
-            order_id = result['order_id']
-            
-            # Update payment session
-            await db.payment_sessions.update_one(
-                {"order_id": order_id},
-                {"$set": {
-                    "status": PaymentStatus.SUCCESS.value,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-            
-            # Update order
-            order_doc = await db.orders.find_one({"id": order_id})
-            await db.orders.update_one(
-                {"id": order_id},
-                {"$set": {
-                    "status": OrderStatus.PAID.value,
-                    "updated_at": datetime.now(timezone.utc).isoformat()
-                }}
-            )
-            
-            # Send confirmation notification
-            if order_doc:
-                await notification_service.send_whatsapp(
-                    order_doc['customer_phone'],
-                    get_order_confirmation_message(order_id, order_doc['total']),
-                    order_id
-                )
-                
-                await notification_service.send_email(
-                    order_doc['customer_email'],
-                    "Order Confirmation",
-                    get_order_confirmation_message(order_id, order_doc['total']),
-                    order_id
-                )
-        
-        return {"status": "processed"}
+        queued = await payment_event_pipeline.accept(
+            gateway, get_event_id(gateway, request.headers, payload, body), payload, result
+        )
+        return {"status": "accepted" if queued else "duplicate"}
+    except (EventQueueFull, EventNotStored) as e:
+        logger.warning(f"Payment webhook rejected: {e}")
+        raise HTTPException(status_code=503, detail="Busy, retry later")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Payment webhook error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=500, detail="Webhook processing failed")
 
 # ==================== DELIVERY ENDPOINTS ====================
 
@@ -1568,7 +1780,9 @@ async def book_order_delivery(
         
         # Get quotes if partner not specified
         if not partner_id:
-            quotes = get_delivery_quotes(vendor.location, customer_location)
+            quotes = await quote_cache.get_quotes(
+                vendor.id, vendor.location, customer_location, quote_aggregator.get_quotes
+            )
             if not quotes:
                 raise HTTPException(status_code=404, detail="No delivery partners available")
             cheapest = select_cheapest_partner(quotes)
@@ -1587,45 +1801,43 @@ async def book_order_delivery(
                 "updated_at": datetime.now(timezone.utc).isoformat()
             }}
         )
+        await publish_order_status(order_id, OrderStatus.OUT_FOR_DELIVERY.value, tracking_id=booking['tracking_id'])
         
         return booking
     except Exception as e:
         logger.error(f"Delivery booking error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
-@api_router.post("/webhooks/delivery/{partner}")
+@api_router.get("/admin/delivery/quote-cache/stats")
+async def get_quote_cache_stats(current_user: dict = Depends(require_role([UserRole.SUPER_ADMIN, UserRole.SUPERVISOR]))):
+    """Delivery quote cache hit ratios (admin only)"""
+    return quote_cache.get_stats()
+
+@api_router.post("/admin/delivery/consolidate")
+async def consolidate_deliveries(current_user: dict = Depends(require_role([UserRole.SUPER_ADMIN, UserRole.SUPERVISOR]))):
+    """Dispatch due ReadyForDelivery batches as multi-drop trips now (admin only)"""
+    return await consolidate_ready_deliveries(db)
+
+@api_router.post("/webhooks/delivery/{partner}", status_code=202)
 async def delivery_webhook(partner: str, request: Request):
-    """Handle delivery partner webhooks"""
+    """Handle delivery partner webhooks (queued and acknowledged once their batch is applied)"""
     try:
         payload = await request.json()
-        tracking_id = payload.get('tracking_id')
-        status = payload.get('status')
-        
-        # Find order by tracking ID
-        order_doc = await db.orders.find_one({"delivery_tracking_id": tracking_id})
-        if not order_doc:
-            raise HTTPException(status_code=404, detail="Order not found")
-        
-        # Update order status based on delivery status
-        status_map = {
-            "Delivered": OrderStatus.DELIVERED.value,
-            "InTransit": OrderStatus.OUT_FOR_DELIVERY.value
-        }
-        
-        new_status = status_map.get(status, order_doc['status'])
-        
-        await db.orders.update_one(
-            {"id": order_doc['id']},
-            {"$set": {
-                "status": new_status,
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }}
-        )
-        
-        return {"status": "processed"}
-    except Exception as e:
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    
+    try:
+        queued = await delivery_webhook_ingestor.accept(partner, payload)
+    except InvalidDeliveryEvent as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except IngestQueueFull as e:
         logger.error(f"Delivery webhook error: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=503, detail="Webhook queue full, retry later")
+    except DeliveryEventNotStored as e:
+        logger.error(f"Delivery webhook error: {e}")
+        raise HTTPException(status_code=503, detail="Update not stored, retry later")
+    
+    return {"status": "accepted" if queued else "duplicate"}
 
 # ==================== ROOT & HEALTH ====================
 
@@ -1647,7 +1859,11 @@ instore_orders.set_database(db)
 google_oauth.set_database(db)
 pricing_manager.set_database(db)
 commission_manager.set_database(db)
+vendor_notifications.set_database(db)
+vendor_outbox.set_database(db)
+socket_auth.set_database(db)
 content_manager.set_database(db)
+order_tracking.set_database(db)
 
 # Include enhanced routers
 app.include_router(admin_enhanced.router)
@@ -1656,6 +1872,7 @@ app.include_router(instore_orders.router)
 app.include_router(google_oauth.router)
 app.include_router(pricing_manager.router)
 app.include_router(commission_manager.router)
+app.include_router(vendor_notifications.router)
 app.include_router(content_manager.router)
 
 app.add_middleware(
@@ -1666,6 +1883,43 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Loops and one-off jobs, held until done so they are not garbage-collected, and cancelled on shutdown
+background_tasks: Set[asyncio.Task] = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
+    return task
+
+@app.on_event("startup")
+async def start_background_jobs():
+    await delivery_webhook_ingestor.start(db)
+    await vendor_notifications.ensure_indexes()
+    await vendor_notifications.migrate_unread_state()
+    await vendor_outbox.ensure_indexes()
+    await notification_log_writer.start(db)
+    await notification_dispatcher.start(db)
+    await payment_event_pipeline.start(db)
+    await payment_session_manager.start(db)
+    start_background_task(watch_payment_config())
+    start_background_task(run_admin_dashboard_resync(db))
+    if load_consolidation_settings().get('enabled'):
+        start_background_task(run_consolidation_loop(db))
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
+    tasks = list(background_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    await delivery_webhook_ingestor.stop()
+    await payment_event_pipeline.stop()
+    await vendor_coalescer.flush_all()
+    await socket_sender.drain()
+    await notification_dispatcher.stop()
+    await notification_log_writer.stop()
+    await notification_service.close()
+    await quote_aggregator.close()
+    await close_gateway_clients()
     client.close()
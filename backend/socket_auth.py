@@ -0,0 +1,195 @@
+"""
+Socket.IO vendor authentication
+Connections must present a vendor JWT (as issued by vendor_auth.create_vendor_token)
+in their auth payload. A reconnect storm after a deploy should not cost a JWT
+decode and a vendor lookup per socket, so:
+
+- decoded tokens are kept in an LRU cache until their own expiry
+- vendor existence comes from a short-TTL directory whose misses are looked up
+  together, one ``$in`` query per event-loop tick, with concurrent callers for
+  the same vendor sharing that lookup
+"""
+
+from typing import Dict, Any, List, Optional, Tuple, Callable, Awaitable, Set
+from collections import OrderedDict
+from jose import jwt, JWTError
+import asyncio
+import logging
+import time
+from notifications import load_notification_settings
+from vendor_auth import SECRET_KEY, ALGORITHM
+
+logger = logging.getLogger(__name__)
+
+SETTINGS = load_notification_settings().get('socketAuth', {})
+
+# Database connection
+db = None
+
+def set_database(database):
+    global db
+    db = database
+
+class TokenCache:
+    """LRU of decoded vendor tokens; an entry is dropped once the token's ``exp`` has passed"""
+
+    def __init__(self, max_entries: int = 20000, clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self.stats = {"hits": 0, "decodes": 0, "rejected": 0}
+
+    def decode(self, token: str) -> Optional[Dict[str, Any]]:
+        """Claims of a valid, unexpired vendor token (None otherwise)"""
+        entry = self._entries.get(token)
+        if entry:
+            if entry[0] > self.clock():
+                self._entries.move_to_end(token)
+                self.stats['hits'] += 1
+                return entry[1]
+            del self._entries[token]
+
+        self.stats['decodes'] += 1
+        try:
+            claims = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        except JWTError:
+            self.stats['rejected'] += 1
+            return None
+        if claims.get('type') != 'vendor' or not claims.get('sub') or 'exp' not in claims:
+            self.stats['rejected'] += 1
+            return None
+
+        self._entries[token] = (float(claims['exp']), claims)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return claims
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+ExistingVendors = Callable[[List[str]], Awaitable[Set[str]]]
+
+async def fetch_active_vendors(vendor_ids: List[str]) -> Set[str]:
+    """Which of these vendors exist and are active (one query)"""
+    docs = await db.vendors.find(
+        {"id": {"$in": vendor_ids}, "is_active": {"$ne": False}}, {"_id": 0, "id": 1}
+    ).to_list(len(vendor_ids))
+    return {doc['id'] for doc in docs}
+
+class VendorDirectory:
+    """Short-TTL answer to "is this an active vendor", with lookups batched per tick"""
+
+    def __init__(
+        self,
+        fetch: ExistingVendors = fetch_active_vendors,
+        ttl_s: float = 300.0,
+        max_entries: int = 50000,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.fetch = fetch
+        self.ttl_s = ttl_s
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries: "OrderedDict[str, Tuple[float, bool]]" = OrderedDict()
+        self._waiting: Dict[str, asyncio.Future] = {}
+        self._scheduled = False
+        self._pending: set = set()
+        self.stats = {"hits": 0, "lookups": 0, "queries": 0}
+
+    async def exists(self, vendor_id: str) -> bool:
+        entry = self._entries.get(vendor_id)
+        if entry and self.clock() - entry[0] <= self.ttl_s:
+            self._entries.move_to_end(vendor_id)
+            self.stats['hits'] += 1
+            return entry[1]
+
+        future = self._waiting.get(vendor_id)
+        if future is None:
+            future = self._waiting[vendor_id] = asyncio.get_running_loop().create_future()
+            self.stats['lookups'] += 1
+            if not self._scheduled:
+                self._scheduled = True
+                asyncio.get_running_loop().call_soon(self._lookup_soon)
+        return await asyncio.shield(future)
+
+    def _lookup_soon(self):
+        task = asyncio.ensure_future(self._lookup())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _lookup(self):
+        self._scheduled = False
+        waiting, self._waiting = self._waiting, {}
+        self.stats['queries'] += 1
+        try:
+            found = await self.fetch(list(waiting))
+        except Exception as e:
+            logger.error(f"Vendor lookup for {len(waiting)} sockets failed: {e}")
+            for future in waiting.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        now = self.clock()
+        for vendor_id, future in waiting.items():
+            self.put(vendor_id, vendor_id in found, now)
+            if not future.done():
+                future.set_result(vendor_id in found)
+
+    def put(self, vendor_id: str, exists: bool, now: Optional[float] = None):
+        self._entries[vendor_id] = (self.clock() if now is None else now, exists)
+        self._entries.move_to_end(vendor_id)
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+token_cache = TokenCache(max_entries=SETTINGS.get('tokenCacheSize', 20000))
+vendor_directory = VendorDirectory(ttl_s=SETTINGS.get('vendorTtlSeconds', 300))
+
+async def authenticate(auth: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Vendor id for a connect auth payload carrying a valid vendor token (None to refuse)"""
+    token = (auth or {}).get('token')
+    if not isinstance(token, str):
+        return None
+    claims = token_cache.decode(token)
+    if claims is None:
+        return None
+    vendor_id = claims['sub']
+    if not await vendor_directory.exists(vendor_id):
+        return None
+    return vendor_id
+
+async def benchmark(vendors: int = 10000) -> Dict[str, Any]:
+    """A reconnect storm: every vendor connects at once, twice (cold caches, then warm)"""
+    from vendor_auth import create_vendor_token
+
+    tokens = [create_vendor_token(f"vendor_{i}", f"v{i}@example.com", f"Vendor {i}") for i in range(vendors)]
+    queries = {"count": 0, "ids": 0}
+
+    async def fetch(vendor_ids):
+        queries["count"] += 1
+        queries["ids"] += len(vendor_ids)
+        await asyncio.sleep(0.002)  # one Mongo round-trip
+        return set(vendor_ids)
+
+    global token_cache, vendor_directory
+    token_cache, vendor_directory = TokenCache(vendors), VendorDirectory(fetch)
+    results: Dict[str, Any] = {"vendors": vendors}
+    for label in ("cold", "warm"):
+        started = time.perf_counter()
+        accepted = await asyncio.gather(*(authenticate({'token': token}) for token in tokens))
+        results[f"{label}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        results[f"{label}_accepted"] = sum(1 for vendor_id in accepted if vendor_id)
+        results[f"{label}_db_queries"] = queries["count"]
+        queries["count"] = 0
+    results["jwt_decodes"] = token_cache.stats['decodes']
+    return results
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Socket auth reconnect-storm benchmark")
+    parser.add_argument("--vendors", type=int, default=10000)
+    args = parser.parse_args()
+
+    for key, value in asyncio.run(benchmark(args.vendors)).items():
+        print(f"{key:>16}: {value}")
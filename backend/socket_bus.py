@@ -0,0 +1,265 @@
+"""
+Socket.IO message bus
+Client managers that let every uvicorn worker emit to sockets held by any
+other worker. SOCKETIO_MESSAGE_QUEUE picks the backend:
+
+    (unset)               single process, in-memory (default)
+    redis://host:6379/0   python-socketio's Redis manager (needs the redis package)
+    unix:///run/printlogic-sio
+                          local pub/sub over Unix sockets, no outside services
+
+The Unix backend is a small mesh: each worker listens on <dir>/<host id>.sock
+and publishes newline-delimited JSON to every other worker's socket.
+"""
+
+from typing import Dict, Any, List, Optional
+from pathlib import Path
+import asyncio
+import atexit
+import json
+import logging
+import os
+import time
+import socketio
+from socketio.async_pubsub_manager import AsyncPubSubManager
+
+logger = logging.getLogger(__name__)
+
+# Longest message accepted from a peer (Engine.IO's default maxPayload is 1 MB)
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+
+class UnixSocketPubSubManager(AsyncPubSubManager):
+    """Pub/sub between processes on one host through Unix stream sockets"""
+
+    name = 'unixsocket'
+
+    def __init__(
+        self,
+        path: str = '/tmp/printlogic-socketio',
+        channel: str = 'socketio',
+        write_only: bool = False,
+        logger=None,
+        peer_refresh_s: float = 1.0,
+        send_timeout_s: float = 1.0,
+        peer_retry_s: float = 10.0
+    ):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.directory = Path(path) / channel
+        self.directory.mkdir(parents=True, exist_ok=True, mode=0o700)
+        self.address = self.directory / f"{self.host_id}.sock"
+        self.peer_refresh_s = peer_refresh_s
+        self.send_timeout_s = send_timeout_s
+        self.peer_retry_s = peer_retry_s
+        self._peers: Dict[str, asyncio.StreamWriter] = {}
+        # Peers that stopped reading: skipped until this time
+        self._suspended: Dict[str, float] = {}
+        self._accepted: set = set()
+        self._peers_listed_at = 0.0
+        self._peer_paths: List[Path] = []
+        self._incoming: Optional[asyncio.Queue] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self.stats = {"published": 0, "sent": 0, "received": 0, "dropped_peers": 0, "stalled_peers": 0}
+
+    async def _start_listening(self):
+        self._incoming = asyncio.Queue()
+        self._server = await asyncio.start_unix_server(
+            self._read_peer, path=str(self.address), limit=MAX_MESSAGE_BYTES
+        )
+        os.chmod(self.address, 0o600)
+        atexit.register(self._unlink)
+
+    def _unlink(self):
+        try:
+            self.address.unlink()
+        except FileNotFoundError:
+            pass
+
+    async def _read_peer(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._accepted.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self.stats['received'] += 1
+                self._incoming.put_nowait(line)
+        except ConnectionError:
+            pass
+        except ValueError:
+            # A line over MAX_MESSAGE_BYTES; the peer reconnects on its next publish
+            logger.error(f"Socket.IO bus message over {MAX_MESSAGE_BYTES} bytes, peer connection reset")
+        finally:
+            self._accepted.discard(writer)
+            writer.close()
+
+    def _list_peers(self) -> List[Path]:
+        now = time.monotonic()
+        if now - self._peers_listed_at >= self.peer_refresh_s:
+            self._peer_paths = [p for p in self.directory.glob("*.sock") if p != self.address]
+            self._peers_listed_at = now
+        return self._peer_paths
+
+    async def _writer_for(self, path: Path) -> Optional[asyncio.StreamWriter]:
+        writer = self._peers.get(path.name)
+        if writer is not None and not writer.is_closing():
+            return writer
+        try:
+            _, writer = await asyncio.open_unix_connection(str(path))
+        except (ConnectionRefusedError, FileNotFoundError):
+            # The worker behind this socket is gone
+            self.stats['dropped_peers'] += 1
+            self._peers.pop(path.name, None)
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            self._peers_listed_at = 0.0
+            return None
+        self._peers[path.name] = writer
+        return writer
+
+    async def _send(self, path: Path, line: bytes):
+        writer = await self._writer_for(path)
+        if writer is None:
+            return
+        try:
+            writer.write(line)
+            # Only waits once the peer has fallen a buffer behind; a hung worker must not hold up this one
+            await asyncio.wait_for(writer.drain(), self.send_timeout_s)
+            self.stats['sent'] += 1
+        except asyncio.TimeoutError:
+            logger.warning(f"Socket.IO bus peer {path.name} stopped reading, skipped for {self.peer_retry_s}s")
+            self.stats['stalled_peers'] += 1
+            self._suspended[path.name] = time.monotonic() + self.peer_retry_s
+            self._peers.pop(path.name, None)
+            writer.close()
+        except (ConnectionError, OSError):
+            self._peers.pop(path.name, None)
+            self._peers_listed_at = 0.0
+
+    async def _publish(self, data: Dict[str, Any]):
+        line = json.dumps(data, separators=(',', ':')).encode() + b"\n"
+        self.stats['published'] += 1
+        now = time.monotonic()
+        peers = [path for path in self._list_peers() if self._suspended.get(path.name, 0) <= now]
+        if len(peers) == 1:
+            await self._send(peers[0], line)
+        elif peers:
+            await asyncio.gather(*(self._send(path, line) for path in peers))
+
+    async def _listen(self):
+        if self._server is None:
+            await self._start_listening()
+        while True:
+            yield await self._incoming.get()
+
+    async def close(self):
+        for writer in self._peers.values():
+            writer.close()
+        self._peers.clear()
+        if self._server is not None:
+            self._server.close()
+            for writer in list(self._accepted):
+                writer.close()
+            self._unlink()
+            await asyncio.sleep(0)
+
+def create_client_manager(url: Optional[str], write_only: bool = False) -> Optional[socketio.AsyncManager]:
+    """Client manager for a SOCKETIO_MESSAGE_QUEUE url (None keeps the in-memory default)"""
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://")):
+        return socketio.AsyncRedisManager(url, write_only=write_only)
+    if url.startswith("unix://"):
+        return UnixSocketPubSubManager(url[len("unix://"):], write_only=write_only)
+    raise ValueError(f"Unsupported SOCKETIO_MESSAGE_QUEUE: {url}")
+
+class _TimedManager(UnixSocketPubSubManager):
+    """Benchmark receiver: records bus latency instead of emitting to local sockets"""
+
+    def __init__(self, *args, expected: int = 0, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.expected = expected
+        self.latencies: List[float] = []
+        self.done = asyncio.Event()
+
+    async def _handle_emit(self, message):
+        self.latencies.append(time.time() - message['data']['sent_at'])
+        if len(self.latencies) >= self.expected:
+            self.done.set()
+
+def _receiver(path: str, expected: int, ready, results):
+    async def main():
+        manager = _TimedManager(path, expected=expected)
+        socketio.AsyncServer(async_mode='asgi', client_manager=manager)
+        await manager._start_listening()
+        listener = asyncio.create_task(manager._thread())
+        ready.set()
+        try:
+            await asyncio.wait_for(manager.done.wait(), timeout=120)
+        finally:
+            listener.cancel()
+            await manager.close()
+        results.put(manager.latencies)
+
+    asyncio.run(main())
+
+async def benchmark(
+    messages: int = 20000,
+    receivers: int = 2,
+    rate: Optional[float] = None,
+    path: str = "/tmp/printlogic-socketio-bench"
+) -> Dict[str, Any]:
+    """Cross-worker emit throughput and latency over the Unix socket bus
+    (as fast as possible, or paced at ``rate`` emits per second)"""
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    processes = []
+    for _ in range(receivers):
+        ready = context.Event()
+        process = context.Process(target=_receiver, args=(path, messages, ready, results))
+        process.start()
+        ready.wait(30)
+        processes.append(process)
+
+    publisher = UnixSocketPubSubManager(path, write_only=True)
+    server = socketio.AsyncServer(async_mode='asgi', client_manager=publisher)
+    started = time.perf_counter()
+    for i in range(messages):
+        await server.emit('notification', {'seq': i, 'sent_at': time.time()}, room="vendor:bench")
+        if rate:
+            await asyncio.sleep(max(0.0, started + (i + 1) / rate - time.perf_counter()))
+    publish_s = time.perf_counter() - started
+
+    latencies = []
+    for _ in processes:
+        latencies.extend(await asyncio.get_running_loop().run_in_executor(None, results.get, True, 120))
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join(10)
+    await publisher.close()
+
+    latencies.sort()
+    return {
+        "messages": messages,
+        "receivers": receivers,
+        "publish_per_second": round(messages / publish_s),
+        "delivered": len(latencies),
+        "delivered_per_second": round(len(latencies) / elapsed),
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+    }
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Cross-worker Socket.IO emit benchmark over the Unix socket bus")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--receivers", type=int, default=2)
+    parser.add_argument("--rate", type=float, default=None, help="emits per second (default: unpaced)")
+    args = parser.parse_args()
+
+    for key, value in asyncio.run(benchmark(args.messages, args.receivers, args.rate)).items():
+        print(f"{key:>22}: {value}")
@@ -0,0 +1,333 @@
+"""
+Socket.IO load test
+Runs the backend as a child process seeded with load-test vendors, connects
+thousands of simulated vendor dashboards (python-socketio AsyncClients over
+WebSocket, authenticated with vendor JWTs), places orders through the HTTP API
+and reports:
+
+- connect time for the initial ramp and for a reconnect storm (every client
+  dropping and reconnecting at once, as after a deploy)
+- notification end-to-end latency, from POST /api/orders to the vendor's socket
+- backend memory per connected socket (RSS growth / sockets)
+
+Everything runs on one Linux box. MONGO_URL defaults to memory://, the
+in-memory stand-in (memory_db.py); pass --mongo-url for a local MongoDB, whose
+load-test vendors are replaced on every run.
+
+    python socket_load_test.py --vendors 2000 --orders 500 --rate 50
+"""
+
+from typing import Dict, Any, List, Optional
+import asyncio
+import logging
+import os
+import resource
+import socket
+import time
+import httpx
+import socketio
+
+logger = logging.getLogger(__name__)
+
+VENDOR_PREFIX = "loadtest_vendor_"
+# Open vendors sit on a grid ~33 km apart, so each order's location (inside the
+# 10 km assignment radius of exactly one of them) decides which vendor gets it
+GRID_STEP = 0.3
+GRID_WIDTH = 10
+
+def vendor_id_for(i: int) -> str:
+    return f"{VENDOR_PREFIX}{i:06d}"
+
+def grid_location(i: int) -> Dict[str, Any]:
+    return {
+        "latitude": 12.0 + (i // GRID_WIDTH) * GRID_STEP,
+        "longitude": 77.0 + (i % GRID_WIDTH) * GRID_STEP,
+        "address": f"Load test shop {i}",
+        "city": "Bengaluru",
+        "pincode": "560001"
+    }
+
+def seed_vendor(i: int, open_vendors: int) -> Dict[str, Any]:
+    now = time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+    return {
+        "id": vendor_id_for(i),
+        "name": f"Load Test Vendor {i}",
+        "shop_name": f"Load Test Shop {i}",
+        "location": grid_location(i),
+        "contact_phone": f"+9190000{i:05d}",
+        "contact_email": f"vendor{i}@loadtest.local",
+        # Only the first few take orders (assignment considers the first 100 open vendors)
+        "store_open": i < open_vendors,
+        "is_active": True,
+        "current_workload_count": 0,
+        "created_at": now,
+        "updated_at": now
+    }
+
+def rss_bytes(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) * 1024
+    return 0
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def _serve(port: int, vendors: int, open_vendors: int, mongo_url: str, db_name: str, log_path: str, ready):
+    """Child process: seed vendors and run the backend (server:socket_app)"""
+    os.environ["MONGO_URL"] = mongo_url
+    os.environ["DB_NAME"] = db_name
+    logging.basicConfig(level=logging.WARNING, filename=log_path)
+    raise_fd_limit()
+
+    import uvicorn
+    import server
+
+    async def main():
+        await server.db.vendors.delete_many({"id": {"$regex": f"^{VENDOR_PREFIX}"}})
+        await server.db.vendors.insert_many([seed_vendor(i, open_vendors) for i in range(vendors)])
+
+        config = uvicorn.Config(server.socket_app, host="127.0.0.1", port=port, log_level="warning", backlog=8192)
+        uvicorn_server = uvicorn.Server(config)
+        task = asyncio.create_task(uvicorn_server.serve())
+        while not uvicorn_server.started:
+            if task.done():
+                task.result()
+            await asyncio.sleep(0.05)
+        ready.set()
+        await task
+
+    asyncio.run(main())
+
+class LatencyTracker:
+    """Order id -> time the order was placed, matched against notifications as they arrive"""
+
+    def __init__(self):
+        self.placed: Dict[str, float] = {}
+        self.early: Dict[str, float] = {}
+        self.latencies: List[float] = []
+
+    def order_placed(self, order_id: str, started: float):
+        # The notification may beat the HTTP response back
+        notified = self.early.pop(order_id, None)
+        if notified is not None:
+            self.latencies.append(notified - started)
+        else:
+            self.placed[order_id] = started
+
+    def notified(self, order_id: Optional[str], at: float):
+        if not order_id:
+            return
+        started = self.placed.pop(order_id, None)
+        if started is None:
+            self.early[order_id] = at
+        else:
+            self.latencies.append(at - started)
+
+class SimulatedVendor:
+    """One vendor dashboard: a Socket.IO client that acks what it receives"""
+
+    def __init__(self, vendor_id: str, token: str, url: str, tracker: LatencyTracker):
+        self.vendor_id = vendor_id
+        self.token = token
+        self.url = url
+        self.tracker = tracker
+        self.last_seq = 0
+        self.received = 0
+        self.client = socketio.AsyncClient(reconnection=False)
+        self.client.on('notification', self._on_notification)
+        self.client.on('notification_digest', self._on_digest)
+        self.client.on('notification_replay', self._on_digest)
+        self.client.on('batch', self._on_batch)
+
+    async def connect(self, timeout: float = 30) -> float:
+        started = time.perf_counter()
+        await self.client.connect(
+            self.url,
+            auth={'token': self.token, 'last_seq': self.last_seq},
+            transports=['websocket'],
+            socketio_path='socket.io',
+            wait_timeout=timeout
+        )
+        return time.perf_counter() - started
+
+    async def disconnect(self):
+        await self.client.disconnect()
+
+    async def _received(self, notifications: List[Dict[str, Any]]):
+        now = time.perf_counter()
+        for notification in notifications:
+            self.received += 1
+            self.tracker.notified((notification.get('data') or {}).get('orderId'), now)
+            self.last_seq = max(self.last_seq, notification.get('seq') or 0)
+        if self.last_seq:
+            await self.client.emit('ack', {'seq': self.last_seq})
+
+    async def _on_notification(self, data):
+        await self._received([data])
+
+    async def _on_digest(self, data):
+        await self._received(data.get('notifications', []))
+
+    async def _on_batch(self, data):
+        for event in data.get('events', []):
+            if event['event'] == 'notification':
+                await self._received([event['data']])
+            elif event['event'] in ('notification_digest', 'notification_replay'):
+                await self._received(event['data'].get('notifications', []))
+
+def _percentiles(values: List[float], prefix: str) -> Dict[str, float]:
+    if not values:
+        return {f"{prefix}_p50_ms": None, f"{prefix}_p99_ms": None, f"{prefix}_max_ms": None}
+    values = sorted(values)
+    return {
+        f"{prefix}_p50_ms": round(values[len(values) // 2] * 1000, 1),
+        f"{prefix}_p99_ms": round(values[max(int(len(values) * 0.99) - 1, 0)] * 1000, 1),
+        f"{prefix}_max_ms": round(values[-1] * 1000, 1)
+    }
+
+async def _connect_all(clients: List[SimulatedVendor], concurrency: Optional[int]) -> Dict[str, Any]:
+    """Connect every client (``concurrency`` at a time, or all at once); returns timings and failures"""
+    semaphore = asyncio.Semaphore(concurrency or len(clients))
+
+    async def connect(client: SimulatedVendor):
+        async with semaphore:
+            try:
+                return await client.connect()
+            except Exception as e:
+                logger.warning(f"{client.vendor_id} failed to connect: {e}")
+                return None
+
+    started = time.perf_counter()
+    timings = await asyncio.gather(*(connect(c) for c in clients))
+    elapsed = time.perf_counter() - started
+    connected = [t for t in timings if t is not None]
+    return {"seconds": round(elapsed, 2), "connected": len(connected), "failed": len(timings) - len(connected), "timings": connected}
+
+async def _place_orders(base_url: str, orders: int, rate: float, open_vendors: int, tracker: LatencyTracker) -> Dict[str, Any]:
+    """POST /api/orders at ``rate`` per second, spread over the open vendors"""
+    item = {
+        "file_url": "/uploads/loadtest.pdf", "file_name": "loadtest.pdf", "num_pages": 4, "num_copies": 1,
+        "paper_type_id": "a4_70gsm", "is_color": False, "perPagePriceApplied": 3, "itemSubtotal": 12
+    }
+    failures = 0
+
+    async def place(http: httpx.AsyncClient, i: int):
+        nonlocal failures
+        started = time.perf_counter()
+        try:
+            response = await http.post(f"{base_url}/api/orders", json={
+                "customer_email": f"customer{i}@loadtest.local",
+                "customer_phone": f"+9180000{i:05d}",
+                "customer_name": f"Load Test Customer {i}",
+                "items": [item],
+                "fulfillment_type": "Pickup",
+                "customer_location": grid_location(i % open_vendors)
+            })
+            response.raise_for_status()
+            tracker.order_placed(response.json()['id'], started)
+        except Exception as e:
+            failures += 1
+            logger.warning(f"Order {i} failed: {e}")
+
+    started = time.perf_counter()
+    async with httpx.AsyncClient(timeout=30, limits=httpx.Limits(max_connections=100)) as http:
+        tasks = []
+        for i in range(orders):
+            tasks.append(asyncio.create_task(place(http, i)))
+            await asyncio.sleep(max(0.0, started + (i + 1) / rate - time.perf_counter()))
+        await asyncio.gather(*tasks)
+    return {"orders_per_second": round(orders / (time.perf_counter() - started), 1), "order_failures": failures}
+
+async def run(
+    vendors: int = 2000,
+    open_vendors: int = 100,
+    orders: int = 500,
+    rate: float = 50,
+    connect_concurrency: int = 200,
+    mongo_url: str = "memory://",
+    db_name: str = "loadtest",
+    settle_s: float = 3.0,
+    log_path: str = os.devnull
+) -> Dict[str, Any]:
+    import multiprocessing
+    from vendor_auth import create_vendor_token
+
+    raise_fd_limit()
+    open_vendors = min(open_vendors, vendors, 100)
+    port = free_port()
+    base_url = f"http://127.0.0.1:{port}"
+
+    context = multiprocessing.get_context("spawn")
+    ready = context.Event()
+    process = context.Process(target=_serve, args=(port, vendors, open_vendors, mongo_url, db_name, log_path, ready))
+    process.start()
+    try:
+        if not await asyncio.get_running_loop().run_in_executor(None, ready.wait, 120):
+            raise RuntimeError("Backend did not start (see --server-log)")
+        await asyncio.sleep(1)
+        rss_idle = rss_bytes(process.pid)
+
+        tracker = LatencyTracker()
+        clients = [
+            SimulatedVendor(vendor_id_for(i), create_vendor_token(vendor_id_for(i), f"vendor{i}@loadtest.local", f"Load Test Vendor {i}"), base_url, tracker)
+            for i in range(vendors)
+        ]
+        results: Dict[str, Any] = {"vendors": vendors, "open_vendors": open_vendors}
+
+        ramp = await _connect_all(clients, connect_concurrency)
+        results.update({"ramp_seconds": ramp["seconds"], "ramp_connected": ramp["connected"], "ramp_failed": ramp["failed"]})
+        results.update(_percentiles(ramp["timings"], "ramp_connect"))
+        await asyncio.sleep(settle_s)
+        rss_connected = rss_bytes(process.pid)
+        results["server_rss_idle_mb"] = round(rss_idle / 2**20, 1)
+        results["server_rss_connected_mb"] = round(rss_connected / 2**20, 1)
+        results["bytes_per_socket"] = round((rss_connected - rss_idle) / max(ramp["connected"], 1))
+
+        results.update(await _place_orders(base_url, orders, rate, open_vendors, tracker))
+        await asyncio.sleep(settle_s)
+        results["notifications_received"] = sum(c.received for c in clients)
+        results.update(_percentiles(tracker.latencies, "notify"))
+
+        # Reconnect storm: everyone drops, then everyone comes back at once
+        await asyncio.gather(*(c.disconnect() for c in clients if c.client.connected), return_exceptions=True)
+        await asyncio.sleep(1)
+        storm = await _connect_all(clients, None)
+        results.update({"storm_seconds": storm["seconds"], "storm_connected": storm["connected"], "storm_failed": storm["failed"]})
+        results.update(_percentiles(storm["timings"], "storm_connect"))
+
+        await asyncio.gather(*(c.disconnect() for c in clients if c.client.connected), return_exceptions=True)
+        return results
+    finally:
+        process.terminate()
+        process.join(10)
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Socket.IO load test with simulated vendor dashboards")
+    parser.add_argument("--vendors", type=int, default=2000, help="simulated vendor dashboards")
+    parser.add_argument("--open-vendors", type=int, default=100, help="vendors taking orders (max 100)")
+    parser.add_argument("--orders", type=int, default=500)
+    parser.add_argument("--rate", type=float, default=50, help="orders per second")
+    parser.add_argument("--connect-concurrency", type=int, default=200, help="parallel connects during the initial ramp")
+    parser.add_argument("--mongo-url", default=os.environ.get("LOADTEST_MONGO_URL", "memory://"))
+    parser.add_argument("--db-name", default="loadtest")
+    parser.add_argument("--server-log", default=os.devnull, help="backend log file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    results = asyncio.run(run(
+        args.vendors, args.open_vendors, args.orders, args.rate, args.connect_concurrency,
+        args.mongo_url, args.db_name, log_path=args.server_log
+    ))
+    for key, value in results.items():
+        print(f"{key:>26}: {value}")
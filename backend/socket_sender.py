@@ -0,0 +1,201 @@
+"""
+Socket.IO send layer
+Emits made within one event-loop tick are grouped per room: a single event is
+sent as is, several go out as one 'batch' packet, and repeated state updates
+(the unread count) for a room collapse to the latest.
+
+Socket.IO and Engine.IO log every packet at INFO; sampled_logger() keeps one
+record in every N and hands the kept ones to a background thread, so packet
+logging costs next to nothing on the event loop.
+"""
+
+from typing import Dict, Any, List, Optional, Tuple, Iterable
+import asyncio
+import atexit
+import itertools
+import logging
+import logging.handlers
+import queue
+import time
+
+logger = logging.getLogger(__name__)
+
+class SamplingFilter(logging.Filter):
+    """Pass one INFO/DEBUG record in every ``every``; warnings and errors always pass"""
+
+    def __init__(self, every: int):
+        super().__init__()
+        self.every = max(every, 1)
+        self._counter = itertools.count()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or next(self._counter) % self.every == 0
+
+class _RootHandler(logging.Handler):
+    """Hands records from the queue thread to whatever the root logger is configured with"""
+
+    def emit(self, record: logging.LogRecord):
+        logging.getLogger().handle(record)
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_log_queue: "queue.SimpleQueue" = queue.SimpleQueue()
+
+def _start_listener():
+    global _listener
+    if _listener is None:
+        _listener = logging.handlers.QueueListener(_log_queue, _RootHandler())
+        _listener.start()
+        atexit.register(_listener.stop)
+
+def sampled_logger(name: str, every: int = 100) -> logging.Logger:
+    """Logger for per-packet messages: 1 in ``every`` records (0 = warnings only), written off the event loop"""
+    packet_logger = logging.getLogger(name)
+    packet_logger.propagate = False
+    packet_logger.setLevel(logging.INFO if every > 0 else logging.WARNING)
+    if not any(isinstance(f, SamplingFilter) for f in packet_logger.filters):
+        packet_logger.addFilter(SamplingFilter(every))
+    if not packet_logger.handlers:
+        packet_logger.addHandler(logging.handlers.QueueHandler(_log_queue))
+        _start_listener()
+    return packet_logger
+
+class PacketBatcher:
+    """Queues emits and sends them per room once the current loop tick is done"""
+
+    def __init__(
+        self,
+        sio,
+        batch_event: str = 'batch',
+        latest_only: Iterable[str] = ('notification_count',)
+    ):
+        self.sio = sio
+        self.batch_event = batch_event
+        self.latest_only = set(latest_only)
+        self._rooms: Dict[Optional[str], List[Tuple[str, Any]]] = {}
+        self._scheduled = False
+        self._pending: set = set()
+        self.stats = {"events": 0, "packets": 0, "collapsed": 0}
+
+    def send(self, event: str, data: Any, room: Optional[str] = None):
+        """Queue an event for ``room`` (None: every client)"""
+        self.stats['events'] += 1
+        events = self._rooms.setdefault(room, [])
+        if event in self.latest_only:
+            for i, (queued, _) in enumerate(events):
+                if queued == event:
+                    events[i] = (event, data)
+                    self.stats['collapsed'] += 1
+                    return
+        events.append((event, data))
+
+        if not self._scheduled:
+            self._scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_soon)
+
+    def _flush_soon(self):
+        task = asyncio.ensure_future(self.flush())
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def flush(self):
+        """Send everything queued (also called on shutdown)"""
+        self._scheduled = False
+        rooms, self._rooms = self._rooms, {}
+        for room, events in rooms.items():
+            self.stats['packets'] += 1
+            try:
+                if len(events) == 1:
+                    await self.sio.emit(events[0][0], events[0][1], room=room)
+                else:
+                    await self.sio.emit(self.batch_event, {
+                        'events': [{'event': event, 'data': data} for event, data in events]
+                    }, room=room)
+            except Exception as e:
+                logger.error(f"Socket emit to {room or 'all'} failed: {e}")
+
+    async def drain(self):
+        await self.flush()
+        if self._pending:
+            await asyncio.gather(*self._pending, return_exceptions=True)
+
+async def benchmark(notifications: int = 10000, vendors: int = 200, burst: int = 10) -> Dict[str, Any]:
+    """Emits/s and CPU ms per 1k notifications: two emits per notification with
+    per-packet logging (before) against one merged, batched emit with sampled
+    logging (after). Engine.IO delivery is replaced by encoding plus its log line."""
+    import os
+    import socketio
+
+    devnull = open(os.devnull, 'w')
+    root = logging.getLogger()
+    handler = logging.StreamHandler(devnull)
+    root.addHandler(handler)
+    previous_level = root.level
+    root.setLevel(logging.INFO)
+
+    async def make_server(sio_logger, eio_logger):
+        sio = socketio.AsyncServer(async_mode='asgi', logger=sio_logger, engineio_logger=eio_logger)
+        counts = {"packets": 0}
+
+        async def send_packet(eio_sid, pkt):
+            # What Engine.IO's socket.send does per packet: encode and log
+            sio.eio.logger.info('%s: Sending packet %s data %s', eio_sid, 'MESSAGE', pkt.encode())
+            counts["packets"] += 1
+
+        sio.eio.send_packet = send_packet
+        for i in range(vendors):
+            sid = await sio.manager.connect(f"eio-{i}", '/')
+            await sio.manager.enter_room(sid, '/', f"vendor:v{i}")
+        return sio, counts
+
+    def notification(i):
+        return {'type': 'new_order', 'data': {'orderId': f"ORD{i:06d}", 'total': 120.5}, 'seq': i}
+
+    async def run(label, send_one, flush=None, sio_counts=None):
+        cpu, wall = time.process_time(), time.perf_counter()
+        for i in range(notifications):
+            await send_one(i)
+            if (i + 1) % burst == 0:
+                await asyncio.sleep(0)
+        if flush:
+            await flush()
+        cpu, wall = time.process_time() - cpu, time.perf_counter() - wall
+        return {
+            f"{label}_notifications_per_second": round(notifications / wall),
+            f"{label}_cpu_ms_per_1k": round(cpu * 1000 / (notifications / 1000), 1),
+            f"{label}_packets": sio_counts["packets"]
+        }
+
+    try:
+        before, before_counts = await make_server(True, True)
+
+        async def send_before(i):
+            room = f"vendor:v{i % vendors}"
+            await before.emit('notification', notification(i), room=room)
+            await before.emit('notification_count', {'count': i}, room=room)
+
+        results = await run("before", send_before, sio_counts=before_counts)
+
+        after, after_counts = await make_server(sampled_logger('socketio.bench', 100), sampled_logger('engineio.bench', 100))
+        batcher = PacketBatcher(after)
+
+        async def send_after(i):
+            batcher.send('notification', {**notification(i), 'unread_count': i}, room=f"vendor:v{i % vendors}")
+
+        results.update(await run("after", send_after, flush=batcher.drain, sio_counts=after_counts))
+    finally:
+        root.removeHandler(handler)
+        root.setLevel(previous_level)
+        devnull.close()
+    return {"notifications": notifications, "vendors": vendors, "burst": burst, **results}
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Socket.IO send layer benchmark")
+    parser.add_argument("--notifications", type=int, default=10000)
+    parser.add_argument("--vendors", type=int, default=200)
+    parser.add_argument("--burst", type=int, default=10, help="notifications per loop tick")
+    args = parser.parse_args()
+
+    for key, value in asyncio.run(benchmark(args.notifications, args.vendors, args.burst)).items():
+        print(f"{key:>32}: {value}")
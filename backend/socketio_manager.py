@@ -1,34 +1,67 @@
 import socketio
-from typing import Dict, Set
+from socketio.async_pubsub_manager import AsyncPubSubManager
+from typing import Dict, Set, List, Optional
 import logging
+import os
+from socketio.exceptions import ConnectionRefusedError
+import socket_auth
+from connection_registry import ConnectionRegistry, vendor_room
+from notification_coalescer import NotificationCoalescer
+from notifications import load_notification_settings
+from socket_bus import create_client_manager
+from socket_sender import PacketBatcher, sampled_logger
 
 logger = logging.getLogger(__name__)
 
+SETTINGS = load_notification_settings()
+# Keep 1 in N per-packet log lines (0: warnings only)
+PACKET_LOG_EVERY = SETTINGS.get('socketLogging', {}).get('sampleEvery', 100)
+
 # Create Socket.IO server
 sio = socketio.AsyncServer(
     async_mode='asgi',
     cors_allowed_origins='*',  # Restrict in production
-    logger=True,
-    engineio_logger=True
+    # With several workers, emits reach sockets on every worker through the message bus
+    client_manager=create_client_manager(os.environ.get('SOCKETIO_MESSAGE_QUEUE')),
+    logger=sampled_logger('socketio.packets', PACKET_LOG_EVERY),
+    engineio_logger=sampled_logger('engineio.packets', PACKET_LOG_EVERY)
 )
 
-# Track connected vendors
-connected_vendors: Dict[str, str] = {}  # vendor_id -> sid
-vendor_unread_counts: Dict[str, int] = {}  # vendor_id -> count
+# Emits within one loop tick go out as one packet per room
+sender = PacketBatcher(sio)
+
+# Track connected vendors (every device of a vendor also joins the vendor's room)
+connections = ConnectionRegistry()
+# vendor_id -> unread count as last read from the vendor document (see vendor_notifications)
+vendor_unread_counts: Dict[str, int] = {}
 
 @sio.event
 async def connect(sid, environ, auth):
     """Handle vendor connection"""
     logger.info(f"Client connected: {sid}")
     
-    # Extract vendor_id from auth
-    if auth and 'vendor_id' in auth:
-        vendor_id = auth['vendor_id']
-        connected_vendors[vendor_id] = sid
-        logger.info(f"Vendor {vendor_id} connected with sid {sid}")
-        
-        # Send current unread count
-        unread_count = vendor_unread_counts.get(vendor_id, 0)
+    # The vendor is whoever the token says, never a vendor_id sent by the client
+    vendor_id = await socket_auth.authenticate(auth)
+    if vendor_id is None:
+        raise ConnectionRefusedError('authentication failed')
+    if connections.add(vendor_id, sid):
+        from admin_dashboard import dashboard
+        dashboard.changed()
+    await sio.enter_room(sid, vendor_room(vendor_id))
+    logger.info(f"Vendor {vendor_id} connected with sid {sid}")
+    
+    from vendor_notifications import get_unread_count
+    unread_count = vendor_unread_counts[vendor_id] = await get_unread_count(vendor_id)
+    
+    # Replay what was missed since the client's (or else the stored) last acknowledged seq,
+    # with the current unread count in the same packet
+    import vendor_outbox
+    backlog, last_seq = await vendor_outbox.get_backlog(vendor_id, auth.get('last_seq'))
+    if backlog:
+        await sio.emit('notification_replay', {
+            'notifications': backlog, 'last_seq': last_seq, 'unread_count': unread_count
+        }, room=sid)
+    else:
         await sio.emit('notification_count', {'count': unread_count}, room=sid)
 
 @sio.event
@@ -36,54 +69,85 @@ async def disconnect(sid):
     """Handle vendor disconnect"""
     logger.info(f"Client disconnected: {sid}")
     
-    # Remove from connected vendors
-    vendor_id = None
-    for vid, vsid in connected_vendors.items():
-        if vsid == sid:
-            vendor_id = vid
-            break
-    
+    # Remove from connected vendors (Socket.IO drops the sid from its rooms itself)
+    vendor_id = connections.remove(sid)
     if vendor_id:
-        del connected_vendors[vendor_id]
-        logger.info(f"Vendor {vendor_id} disconnected")
+        if not connections.is_connected(vendor_id):
+            from admin_dashboard import dashboard
+            dashboard.changed()
+        logger.info(f"Vendor {vendor_id} disconnected ({len(connections.sids_for(vendor_id))} devices left)")
 
 @sio.event
 async def mark_read(sid, data):
     """Mark notifications as read"""
-    vendor_id = None
-    for vid, vsid in connected_vendors.items():
-        if vsid == sid:
-            vendor_id = vid
-            break
-    
+    vendor_id = connections.vendor_for(sid)
     if vendor_id:
-        vendor_unread_counts[vendor_id] = 0
-        await sio.emit('notification_count', {'count': 0}, room=sid)
+        from vendor_notifications import mark_all_read
+        await push_unread_count(vendor_id, await mark_all_read(vendor_id))
 
-async def notify_vendor(vendor_id: str, event_type: str, payload: dict):
-    """Send notification to specific vendor"""
-    if vendor_id in connected_vendors:
-        sid = connected_vendors[vendor_id]
-        
-        # Increment unread count
-        vendor_unread_counts[vendor_id] = vendor_unread_counts.get(vendor_id, 0) + 1
-        
-        # Send notification
+@sio.event
+async def ack(sid, data):
+    """Client has received every notification up to data['seq']"""
+    vendor_id = connections.vendor_for(sid)
+    if vendor_id and isinstance(data, dict) and isinstance(data.get('seq'), int):
+        import vendor_outbox
+        await vendor_outbox.ack(vendor_id, data['seq'])
+
+def is_reachable(vendor_id: str) -> bool:
+    """Connected to this worker, or possibly to another one when a message bus is configured"""
+    return vendor_id in connections or isinstance(sio.manager, AsyncPubSubManager)
+
+async def _deliver_to_vendor(vendor_id: str, notifications: List[dict]):
+    """Send a vendor's coalesced notifications, with their unread count, to all their devices as one packet"""
+    if not is_reachable(vendor_id):
+        return
+    room = vendor_room(vendor_id)
+    unread_count = vendor_unread_counts.get(vendor_id, 0)
+    if len(notifications) == 1:
+        sender.send('notification', {**notifications[0], 'unread_count': unread_count}, room=room)
+    else:
+        sender.send('notification_digest', {
+            'notifications': notifications, 'count': len(notifications), 'unread_count': unread_count
+        }, room=room)
+
+# Bursts of notifications to one vendor go out as a single digest
+vendor_coalescer = NotificationCoalescer.from_settings(_deliver_to_vendor, SETTINGS.get('socketCoalescing', {}))
+
+async def push_unread_count(vendor_id: str, unread_count: int):
+    """Send a vendor's unread count (as stored on the vendor document)"""
+    vendor_unread_counts[vendor_id] = unread_count
+    if is_reachable(vendor_id):
+        sender.send('notification_count', {'count': unread_count}, room=vendor_room(vendor_id))
+
+async def notify_vendor(
+    vendor_id: str,
+    event_type: str,
+    payload: dict,
+    unread_count: Optional[int] = None,
+    critical: bool = False,
+    seq: Optional[int] = None
+):
+    """Push a notification to a connected vendor (critical ones skip the coalescing window).
+
+    Use vendor_notifications.notify_vendor to also store it in the vendor's inbox.
+    """
+    if unread_count is not None:
+        vendor_unread_counts[vendor_id] = unread_count
+    
+    if is_reachable(vendor_id):
         notification = {
             'type': event_type,
             'data': payload,
             'timestamp': payload.get('createdAt')
         }
+        if seq is not None:
+            notification['seq'] = seq
+        await vendor_coalescer.add(vendor_id, notification, critical)
         
-        await sio.emit('notification', notification, room=sid)
-        await sio.emit('notification_count', {'count': vendor_unread_counts[vendor_id]}, room=sid)
-        
-        logger.info(f"Notification sent to vendor {vendor_id}: {event_type}")
+        logger.info(f"Notification for vendor {vendor_id} buffered: {event_type}")
         return True
     else:
-        logger.info(f"Vendor {vendor_id} not connected, notification queued")
-        # Queue notification for later (in production, use Redis)
-        vendor_unread_counts[vendor_id] = vendor_unread_counts.get(vendor_id, 0) + 1
+        logger.info(f"Vendor {vendor_id} not connected, notification kept for replay")
         return False
 
 async def notify_all_vendors(event_type: str, payload: dict):
@@ -93,5 +157,5 @@ async def notify_all_vendors(event_type: str, payload: dict):
         'data': payload,
         'timestamp': payload.get('createdAt')
     }
-    await sio.emit('notification', notification)
+    sender.send('notification', notification)
     logger.info(f"Broadcast notification: {event_type}")
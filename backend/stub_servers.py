@@ -0,0 +1,160 @@
+"""
+Local stub servers for partner, payment gateway and notification provider integrations
+Used by tests and load runs: inject latency and failures without outside services
+"""
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from contextlib import asynccontextmanager
+from typing import List, Optional
+import asyncio
+import random
+import uuid
+import uvicorn
+
+def create_stub_partner_app(
+    base_rate: float = 40.0,
+    per_km_rate: float = 8.0,
+    estimated_time_minutes: int = 45,
+    latency_ms: float = 0.0,
+    latency_schedule_ms: Optional[List[float]] = None,
+    failure_rate: float = 0.0,
+    seed: Optional[int] = None
+) -> FastAPI:
+    """Delivery partner quote API stub.
+
+    ``latency_schedule_ms`` overrides ``latency_ms`` per request (cycled), so a
+    test can make e.g. only the first request slow.
+    """
+    app = FastAPI()
+    rng = random.Random(seed)
+    app.state.requests = 0
+
+    @app.post("/quote")
+    async def quote(request: Request):
+        index = app.state.requests
+        app.state.requests += 1
+
+        delay_ms = latency_schedule_ms[index % len(latency_schedule_ms)] if latency_schedule_ms else latency_ms
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+
+        if failure_rate and rng.random() < failure_rate:
+            return JSONResponse(status_code=503, content={"error": "partner unavailable"})
+
+        body = await request.json()
+        return {
+            "cost": base_rate + body['distance_km'] * per_km_rate,
+            "estimated_time_minutes": estimated_time_minutes
+        }
+
+    return app
+
+def create_stub_gateway_app(
+    latency_ms: float = 0.0,
+    latency_schedule_ms: Optional[List[float]] = None,
+    failure_rate: float = 0.0,
+    seed: Optional[int] = None
+) -> FastAPI:
+    """Payment gateway create-order API stub (Razorpay, Paytm and PayU shaped responses)"""
+    app = FastAPI()
+    rng = random.Random(seed)
+    app.state.requests = 0
+
+    async def simulate():
+        index = app.state.requests
+        app.state.requests += 1
+
+        delay_ms = latency_schedule_ms[index % len(latency_schedule_ms)] if latency_schedule_ms else latency_ms
+        if delay_ms:
+            await asyncio.sleep(delay_ms / 1000)
+
+        if failure_rate and rng.random() < failure_rate:
+            return JSONResponse(status_code=503, content={"error": "gateway unavailable"})
+        return None
+
+    @app.post("/v1/orders")
+    async def razorpay_order(request: Request):
+        failure = await simulate()
+        if failure:
+            return failure
+        body = await request.json()
+        order_id = f"order_{uuid.uuid4().hex[:14]}"
+        return {"id": order_id, "amount": body['amount'], "currency": body['currency'], "receipt": body['receipt'], "status": "created"}
+
+    @app.post("/theia/api/v1/initiateTransaction")
+    async def paytm_transaction(request: Request):
+        failure = await simulate()
+        if failure:
+            return failure
+        await request.json()
+        return {"body": {"resultInfo": {"resultStatus": "S"}, "txnToken": uuid.uuid4().hex}}
+
+    @app.post("/payment-links")
+    async def payu_payment_link(request: Request):
+        failure = await simulate()
+        if failure:
+            return failure
+        await request.json()
+        link_id = uuid.uuid4().hex[:12]
+        return {"status": 0, "result": {"paymentLinkId": link_id, "paymentLink": f"https://stub-payu.local/{link_id}"}}
+
+    return app
+
+def create_stub_notification_app(
+    latency_ms: float = 0.0,
+    failure_rate: float = 0.0,
+    seed: Optional[int] = None
+) -> FastAPI:
+    """WhatsApp Cloud API and SendGrid send stubs; ``app.state.messages`` counts delivered messages"""
+    app = FastAPI()
+    rng = random.Random(seed)
+    app.state.requests = 0
+    app.state.messages = 0
+
+    async def simulate():
+        app.state.requests += 1
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        if failure_rate and rng.random() < failure_rate:
+            return JSONResponse(status_code=503, content={"error": "provider unavailable"})
+        return None
+
+    @app.post("/{phone_number_id}/messages")
+    async def whatsapp_message(phone_number_id: str, request: Request):
+        failure = await simulate()
+        if failure:
+            return failure
+        body = await request.json()
+        app.state.messages += 1
+        return {"messaging_product": "whatsapp", "contacts": [{"wa_id": body['to']}], "messages": [{"id": f"wamid.{uuid.uuid4().hex}"}]}
+
+    @app.post("/v3/mail/send")
+    async def send_mail(request: Request):
+        failure = await simulate()
+        if failure:
+            return failure
+        body = await request.json()
+        app.state.messages += len(body['personalizations'])
+        return JSONResponse(status_code=202, content=None)
+
+    return app
+
+@asynccontextmanager
+async def serve_stub(app: FastAPI, host: str = "127.0.0.1"):
+    """Run a stub app on a free local port, yielding its base URL"""
+    config = uvicorn.Config(app, host=host, port=0, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    task = asyncio.create_task(server.serve())
+
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://{host}:{port}"
+    finally:
+        server.should_exit = True
+        await task
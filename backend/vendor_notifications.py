@@ -0,0 +1,274 @@
+"""
+Vendor notification inbox
+Direct notifications are stored per vendor; admin-to-all-vendors broadcasts are
+stored once with a sequence number and merged into each vendor's inbox at read
+time, with a per-vendor read cursor instead of a copy per vendor.
+
+Unread counts live on the vendor document: ``unread_notifications`` is kept
+up to date with $inc as direct notifications are added and read, and unread
+broadcasts are the latest broadcast seq minus ``broadcast_read_seq``. Both the
+API and the Socket.IO badge read them from there.
+"""
+
+from fastapi import APIRouter, Depends
+from pydantic import BaseModel
+from typing import Dict, Any, List, Optional
+from datetime import datetime, timezone
+from pymongo import ReturnDocument, UpdateOne
+import heapq
+import logging
+import uuid
+from commission_manager import verify_admin
+from vendor_enhanced import verify_vendor
+import socketio_manager
+import vendor_outbox
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter(prefix="/api", tags=["vendor_notifications"])
+
+# Database connection
+db = None
+
+def set_database(database):
+    global db
+    db = database
+
+class BroadcastRequest(BaseModel):
+    title: str
+    message: str
+    type: str = "announcement"
+
+class MarkReadRequest(BaseModel):
+    ids: List[str] = []
+    broadcast_seq: Optional[int] = None
+
+async def ensure_indexes():
+    await db.broadcast_notifications.create_index("seq", unique=True)
+    await db.broadcast_notifications.create_index([("created_at", -1), ("id", -1)])
+    await db.notifications.create_index([("vendor_id", 1), ("created_at", -1), ("id", -1)])
+
+UNREAD_STATE_MIGRATION = "vendor_unread_state"
+
+async def migrate_unread_state() -> bool:
+    """One-off move of unread state onto the vendor document (run at startup, by one worker).
+
+    Copies broadcast_read_seq from the old vendor_notification_state collection and
+    sets unread_notifications from the vendor's unread direct notifications.
+    Returns True when this call did the migration.
+    """
+    claim = await db.migrations.update_one(
+        {"id": UNREAD_STATE_MIGRATION},
+        {"$setOnInsert": {"id": UNREAD_STATE_MIGRATION, "started_at": datetime.now(timezone.utc).isoformat()}},
+        upsert=True
+    )
+    if claim.upserted_id is None:
+        return False
+
+    cursors = []
+    async for state in db.vendor_notification_state.find({}, {"_id": 0, "vendor_id": 1, "broadcast_read_seq": 1}):
+        cursors.append(UpdateOne(
+            {"id": state['vendor_id']}, {"$max": {"broadcast_read_seq": state.get('broadcast_read_seq', 0)}}
+        ))
+    unread = await db.notifications.aggregate([
+        {"$match": {"read": False}},
+        {"$group": {"_id": "$vendor_id", "count": {"$sum": 1}}}
+    ]).to_list(None)
+    counts = [UpdateOne({"id": row['_id']}, {"$set": {"unread_notifications": row['count']}}) for row in unread]
+    if cursors or counts:
+        await db.vendors.bulk_write(cursors + counts, ordered=False)
+
+    await db.migrations.update_one(
+        {"id": UNREAD_STATE_MIGRATION}, {"$set": {"completed_at": datetime.now(timezone.utc).isoformat()}}
+    )
+    logger.info(f"Unread state migrated: {len(cursors)} broadcast cursors, {len(counts)} unread counts")
+    return True
+
+async def _next_broadcast_seq() -> int:
+    counter = await db.counters.find_one_and_update(
+        {"id": "broadcast_notifications"},
+        {"$inc": {"seq": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return counter['seq']
+
+async def get_latest_broadcast_seq() -> int:
+    counter = await db.counters.find_one({"id": "broadcast_notifications"}, {"_id": 0, "seq": 1})
+    return (counter or {}).get('seq', 0)
+
+async def create_broadcast(notification: Dict[str, Any]) -> Dict[str, Any]:
+    """Store one notification for every vendor (a single write, whatever the vendor count)"""
+    seq = await _next_broadcast_seq()
+    broadcast = {
+        **notification,
+        "id": f"broadcast_{seq}",
+        "seq": seq,
+        "broadcast": True,
+        "created_at": datetime.now(timezone.utc).isoformat()
+    }
+    await db.broadcast_notifications.insert_one(dict(broadcast))
+
+    # Connected vendors hear about it live; everyone else sees it on their next inbox read
+    await socketio_manager.notify_all_vendors(broadcast['type'], {
+        "id": broadcast['id'],
+        "title": broadcast.get('title'),
+        "message": broadcast.get('message'),
+        "createdAt": broadcast['created_at']
+    })
+    return broadcast
+
+async def initial_inbox_state() -> Dict[str, int]:
+    """Inbox fields for a new vendor document: broadcasts sent before the vendor joined start out read"""
+    return {"broadcast_read_seq": await get_latest_broadcast_seq(), "unread_notifications": 0}
+
+def _unread_from(vendor: Optional[Dict[str, Any]], latest_seq: int) -> int:
+    vendor = vendor or {}
+    return max(vendor.get('unread_notifications', 0), 0) + max(latest_seq - vendor.get('broadcast_read_seq', 0), 0)
+
+async def get_unread_count(vendor_id: str) -> int:
+    """Unread direct notifications plus unread broadcasts, from two point reads"""
+    vendor = await db.vendors.find_one(
+        {"id": vendor_id}, {"_id": 0, "unread_notifications": 1, "broadcast_read_seq": 1}
+    )
+    return _unread_from(vendor, await get_latest_broadcast_seq())
+
+async def add_vendor_notification(vendor_id: str, notification: Dict[str, Any]) -> int:
+    """Store a notification for one vendor; returns the vendor's new unread count"""
+    doc = {
+        "id": f"notif_{uuid.uuid4().hex}",
+        **notification,
+        "vendor_id": vendor_id,
+        "read": False,
+        "created_at": notification.get("created_at") or datetime.now(timezone.utc).isoformat()
+    }
+    await db.notifications.insert_one(doc)
+    vendor = await db.vendors.find_one_and_update(
+        {"id": vendor_id},
+        {"$inc": {"unread_notifications": 1}},
+        projection={"_id": 0, "unread_notifications": 1, "broadcast_read_seq": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return _unread_from(vendor, await get_latest_broadcast_seq())
+
+async def notify_vendor(vendor_id: str, event_type: str, payload: dict, critical: bool = False):
+    """Persist a notification in the vendor's inbox and outbox, and push it over Socket.IO"""
+    unread_count = await add_vendor_notification(vendor_id, {
+        "type": event_type,
+        "title": payload.get('title'),
+        "message": payload.get('message') or payload.get('summary'),
+        "data": payload
+    })
+    seq = await vendor_outbox.append(vendor_id, event_type, payload)
+    return await socketio_manager.notify_vendor(
+        vendor_id, event_type, payload, unread_count=unread_count, critical=critical, seq=seq
+    )
+
+def page_cursor(notification: Dict[str, Any]) -> str:
+    """``before`` value for the page after this notification: created_at plus id, so ties are not skipped"""
+    return f"{notification['created_at']}|{notification['id']}"
+
+def _before_query(before: str) -> Dict[str, Any]:
+    created_at, _, notification_id = before.partition("|")
+    if not notification_id:
+        return {"created_at": {"$lt": created_at}}
+    return {"$or": [
+        {"created_at": {"$lt": created_at}},
+        {"created_at": created_at, "id": {"$lt": notification_id}}
+    ]}
+
+async def get_vendor_notifications(
+    vendor_id: str,
+    limit: int = 50,
+    locale: Optional[str] = None,
+    before: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """Newest-first inbox page after the ``before`` cursor (see page_cursor): the vendor's
+    own notifications merged with broadcasts (in ``locale`` where translated)"""
+    vendor = await db.vendors.find_one({"id": vendor_id}, {"_id": 0, "broadcast_read_seq": 1})
+    read_seq = (vendor or {}).get('broadcast_read_seq', 0)
+
+    direct_query: Dict[str, Any] = {"vendor_id": vendor_id}
+    broadcast_query: Dict[str, Any] = {}
+    if before:
+        direct_query.update(_before_query(before))
+        broadcast_query.update(_before_query(before))
+
+    newest_first = [("created_at", -1), ("id", -1)]
+    direct = await db.notifications.find(direct_query, {"_id": 0}).sort(newest_first).limit(limit).to_list(limit)
+    broadcasts = await db.broadcast_notifications.find(broadcast_query, {"_id": 0}).sort(newest_first).limit(limit).to_list(limit)
+    for broadcast in broadcasts:
+        broadcast['read'] = broadcast['seq'] <= read_seq
+        broadcast.update(broadcast.pop('translations', {}).get(locale, {}))
+
+    merged = heapq.merge(direct, broadcasts, key=lambda n: (n['created_at'], n['id']), reverse=True)
+    return [notification for _, notification in zip(range(limit), merged)]
+
+async def mark_read(vendor_id: str, ids: Optional[List[str]] = None, broadcast_seq: Optional[int] = None) -> int:
+    """Mark direct notifications read in one update (all of them when ``ids`` is None)
+    and move the broadcast cursor forward (never back); returns the new unread count"""
+    query: Dict[str, Any] = {"vendor_id": vendor_id, "read": False}
+    if ids is not None:
+        query["id"] = {"$in": ids}
+    marked = 0
+    if ids is None or ids:
+        result = await db.notifications.update_many(query, {"$set": {"read": True}})
+        marked = result.modified_count
+
+    latest_seq = await get_latest_broadcast_seq()
+    if ids is None and broadcast_seq is None:
+        broadcast_seq = latest_seq
+    # A cursor past the latest broadcast would mark future broadcasts read
+    broadcast_seq = min(broadcast_seq or 0, latest_seq)
+
+    update: List[Dict[str, Any]] = [{"$set": {
+        # Clamped at zero: notifications stored before counting began were never counted
+        "unread_notifications": {"$max": [0, {"$subtract": [{"$ifNull": ["$unread_notifications", 0]}, marked]}]},
+        "broadcast_read_seq": {"$max": [{"$ifNull": ["$broadcast_read_seq", 0]}, broadcast_seq]}
+    }}]
+    vendor = await db.vendors.find_one_and_update(
+        {"id": vendor_id},
+        update,
+        projection={"_id": 0, "unread_notifications": 1, "broadcast_read_seq": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return _unread_from(vendor, latest_seq)
+
+async def mark_all_read(vendor_id: str) -> int:
+    return await mark_read(vendor_id)
+
+@router.get("/vendor/notifications")
+async def list_vendor_notifications(limit: int = 50, before: Optional[str] = None, token: dict = Depends(verify_vendor)):
+    """Vendor inbox page (pass ``next_before`` back as ``before`` for the next one) with unread count"""
+    limit = min(limit, 200)
+    notifications = await get_vendor_notifications(token["id"], limit, token.get("preferred_language"), before)
+    return {
+        "notifications": notifications,
+        "unread_count": _unread_from(token, await get_latest_broadcast_seq()),
+        "next_before": page_cursor(notifications[-1]) if len(notifications) == limit else None
+    }
+
+@router.post("/vendor/notifications/mark-read")
+async def mark_vendor_notifications_read(data: MarkReadRequest, token: dict = Depends(verify_vendor)):
+    """Mark the given notifications (and broadcasts up to ``broadcast_seq``) as read"""
+    unread_count = await mark_read(token["id"], data.ids, data.broadcast_seq)
+    await socketio_manager.push_unread_count(token["id"], unread_count)
+    return {"success": True, "unread_count": unread_count}
+
+@router.post("/vendor/notifications/mark-all-read")
+async def mark_all_vendor_notifications_read(token: dict = Depends(verify_vendor)):
+    """Mark every notification, including broadcasts, as read"""
+    unread_count = await mark_all_read(token["id"])
+    await socketio_manager.push_unread_count(token["id"], unread_count)
+    return {"success": True, "unread_count": unread_count}
+
+@router.post("/admin/notifications/broadcast")
+async def broadcast_to_vendors(data: BroadcastRequest, token: dict = Depends(verify_admin)):
+    """Send a message to all vendors"""
+    broadcast = await create_broadcast({
+        "type": data.type,
+        "title": data.title,
+        "message": data.message,
+        "created_by": token["id"]
+    })
+    return {"success": True, "id": broadcast['id'], "seq": broadcast['seq']}
@@ -0,0 +1,96 @@
+"""
+Vendor notification outbox
+Every real-time event for a vendor is recorded with a per-vendor sequence
+number until the vendor acknowledges it, so events sent while a vendor is
+offline (or reconnecting) are replayed on the next connect. Storage is bounded
+per vendor and by a TTL; offers that have timed out are never replayed
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timezone, timedelta
+from pymongo import ReturnDocument
+import logging
+from notifications import load_notification_settings
+
+logger = logging.getLogger(__name__)
+
+SETTINGS = load_notification_settings().get('vendorOutbox', {})
+MAX_PER_VENDOR = SETTINGS.get('maxPerVendor', 200)
+MAX_REPLAY = SETTINGS.get('maxReplay', 100)
+RETENTION = timedelta(hours=SETTINGS.get('retentionHours', 72))
+# Old entries are trimmed every TRIM_EVERY appends rather than on each one
+TRIM_EVERY = SETTINGS.get('trimEvery', 50)
+
+# Database connection
+db = None
+
+def set_database(database):
+    global db
+    db = database
+
+async def ensure_indexes():
+    await db.vendor_outbox.create_index([("vendor_id", 1), ("seq", 1)], unique=True)
+    await db.vendor_outbox.create_index("expires_at", expireAfterSeconds=0)
+
+def event_expires_at(payload: Dict[str, Any], now: datetime) -> datetime:
+    """Offers expire with their acceptance timeout; everything else after the retention period"""
+    timeout_minutes = payload.get('timeoutMinutes')
+    if timeout_minutes:
+        return now + timedelta(minutes=timeout_minutes)
+    return now + RETENTION
+
+async def append(vendor_id: str, event_type: str, payload: Dict[str, Any]) -> Optional[int]:
+    """Record an event for a vendor; returns its sequence number (None for unknown vendors)"""
+    vendor = await db.vendors.find_one_and_update(
+        {"id": vendor_id},
+        {"$inc": {"outbox_seq": 1}},
+        projection={"_id": 0, "outbox_seq": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    if vendor is None:
+        return None
+
+    seq = vendor['outbox_seq']
+    now = datetime.now(timezone.utc)
+    await db.vendor_outbox.insert_one({
+        "vendor_id": vendor_id,
+        "seq": seq,
+        "type": event_type,
+        "data": payload,
+        "timestamp": payload.get('createdAt'),
+        "created_at": now,
+        "expires_at": event_expires_at(payload, now)
+    })
+    if seq % TRIM_EVERY == 0:
+        await db.vendor_outbox.delete_many({"vendor_id": vendor_id, "seq": {"$lte": seq - MAX_PER_VENDOR}})
+    return seq
+
+async def get_backlog(vendor_id: str, after_seq: Optional[int] = None) -> Tuple[List[Dict[str, Any]], int]:
+    """Unexpired events after ``after_seq`` (default: the vendor's last ack), oldest first and at
+    most MAX_REPLAY of the newest; returns (events, last seq)"""
+    if after_seq is None:
+        vendor = await db.vendors.find_one({"id": vendor_id}, {"_id": 0, "outbox_acked_seq": 1})
+        after_seq = (vendor or {}).get('outbox_acked_seq', 0)
+
+    docs = await db.vendor_outbox.find(
+        {"vendor_id": vendor_id, "seq": {"$gt": after_seq}, "expires_at": {"$gt": datetime.now(timezone.utc)}},
+        {"_id": 0, "seq": 1, "type": 1, "data": 1, "timestamp": 1}
+    ).sort("seq", -1).limit(MAX_REPLAY).to_list(MAX_REPLAY)
+    docs.reverse()
+    return docs, (docs[-1]['seq'] if docs else after_seq)
+
+async def ack(vendor_id: str, seq: int):
+    """The vendor has everything up to ``seq``; drop it from the outbox. An ack past the last
+    issued seq is clamped to it, so events appended later are still replayed"""
+    result = await db.vendors.update_one(
+        {"id": vendor_id, "outbox_seq": {"$gte": seq}}, {"$max": {"outbox_acked_seq": seq}}
+    )
+    if result.matched_count == 0:
+        vendor = await db.vendors.find_one({"id": vendor_id}, {"_id": 0, "outbox_seq": 1})
+        if vendor is None:
+            return
+        seq = vendor.get('outbox_seq', 0)
+        await db.vendors.update_one(
+            {"id": vendor_id, "outbox_seq": {"$gte": seq}}, {"$max": {"outbox_acked_seq": seq}}
+        )
+    await db.vendor_outbox.delete_many({"vendor_id": vendor_id, "seq": {"$lte": seq}})
@@ -1,5 +1,6 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
+import { io } from 'socket.io-client';
 import { Button } from '@/components/ui/button';
 import { Card, CardContent, CardHeader, CardTitle } from '@/components/ui/card';
 import { Badge } from '@/components/ui/badge';
@@ -7,17 +8,46 @@ import { toast } from 'sonner';
 import { X, Minimize2, Maximize2, RefreshCw, CheckCircle, DollarSign, Clock } from 'lucide-react';
 
 const API = `${process.env.REACT_APP_BACKEND_URL}/api`;
+const SOCKET_URL = process.env.REACT_APP_BACKEND_URL || '';
 
 const SystemTrayPopup = () => {
   const [minimized, setMinimized] = useState(false);
   const [pendingOrders, setPendingOrders] = useState([]);
   const [activeOrders, setActiveOrders] = useState([]);
   const [loading, setLoading] = useState(false);
+  const lastCountsRef = useRef(null);
 
   useEffect(() => {
     fetchOrders();
-    const interval = setInterval(fetchOrders, 10000); // Refresh every 10s
-    return () => clearInterval(interval);
+
+    // Live counts from the admin dashboard; the lists are only re-fetched when they change
+    let interval = null;
+    const socket = io(`${SOCKET_URL}/admin`, {
+      path: '/socket.io',
+      auth: { token: localStorage.getItem('admin_token') },
+      transports: ['websocket', 'polling']
+    });
+    socket.on('dashboard', (data) => {
+      const counts = `${data.instore_pending_approval}:${data.print_queue_depth}`;
+      if (lastCountsRef.current !== null && lastCountsRef.current !== counts) {
+        fetchOrders();
+      }
+      lastCountsRef.current = counts;
+    });
+    socket.on('connect_error', () => {
+      // Not signed in as an admin (or no socket): fall back to polling every 10s
+      socket.disconnect();
+      if (!interval) {
+        interval = setInterval(fetchOrders, 10000);
+      }
+    });
+
+    return () => {
+      socket.disconnect();
+      if (interval) {
+        clearInterval(interval);
+      }
+    };
   }, []);
 
   const fetchOrders = async () => {
@@ -25,7 +25,7 @@ const InStorePage = () => {
                 <h3 className="font-semibold text-indigo-900 mb-2">How to use:</h3>
                 <ul className="list-disc list-inside space-y-1 text-sm text-indigo-800">
                   <li>Keep this page open during store hours</li>
-                  <li>The notification tray updates automatically every 10 seconds</li>
+                  <li>The notification tray updates automatically as orders come in</li>
                   <li>Approve cash payments when customer pays at counter</li>
                   <li>Monitor active print jobs in real-time</li>
                   <li>You can minimize the tray when not needed</li>
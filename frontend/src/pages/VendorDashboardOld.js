@@ -33,7 +33,7 @@ const VendorDashboard = () => {
     if (vendorId) {
       socketRef.current = io(SOCKET_URL, {
         path: '/socket.io',
-        auth: { vendor_id: vendorId },
+        auth: { token },
         transports: ['websocket', 'polling']
       });
 
@@ -43,6 +43,12 @@ const VendorDashboard = () => {
 
       socketRef.current.on('notification', (data) => {
         console.log('Notification received:', data);
+        if (data.seq) {
+          socketRef.current.emit('ack', { seq: data.seq });
+        }
+        if (data.unread_count !== undefined) {
+          setUnreadCount(data.unread_count);
+        }
         toast.info(`New order: ${data.data.orderId}`);
         if (audioRef.current) {
           audioRef.current.play().catch(e => console.log('Audio play failed:', e));
@@ -50,10 +56,41 @@ const VendorDashboard = () => {
         fetchOrders();
       });
 
+      socketRef.current.on('notification_digest', (data) => {
+        console.log('Notification digest received:', data);
+        const lastSeq = Math.max(0, ...data.notifications.map(n => n.seq || 0));
+        if (lastSeq) {
+          socketRef.current.emit('ack', { seq: lastSeq });
+        }
+        if (data.unread_count !== undefined) {
+          setUnreadCount(data.unread_count);
+        }
+        toast.info(`${data.count} new notifications`);
+        if (audioRef.current) {
+          audioRef.current.play().catch(e => console.log('Audio play failed:', e));
+        }
+        fetchOrders();
+      });
+
+      socketRef.current.on('notification_replay', (data) => {
+        console.log('Missed notifications:', data);
+        toast.info(`${data.notifications.length} notifications while you were away`);
+        setUnreadCount(data.unread_count);
+        fetchOrders();
+        socketRef.current.emit('ack', { seq: data.last_seq });
+      });
+
       socketRef.current.on('notification_count', (data) => {
         setUnreadCount(data.count);
       });
 
+      // Several events for this vendor sent in one packet
+      socketRef.current.on('batch', (data) => {
+        data.events.forEach(({ event, data: eventData }) => {
+          socketRef.current.listeners(event).forEach((handler) => handler(eventData));
+        });
+      });
+
       socketRef.current.on('disconnect', () => {
         console.log('Socket disconnected');
       });
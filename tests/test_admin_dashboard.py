@@ -0,0 +1,105 @@
+import asyncio
+import pytest
+from datetime import datetime, timezone, timedelta
+from backend.admin_dashboard import OperationsDashboard
+from backend.memory_db import MemoryClient
+
+def make_dashboard(pushes, min_interval_s=1.0, online=("v1", "v2", "v3"), **kwargs):
+    async def push(snapshot):
+        pushes.append(snapshot)
+
+    return OperationsDashboard(push, lambda: online, min_interval_s=min_interval_s, **kwargs)
+
+@pytest.mark.asyncio
+async def test_transitions_move_counts_between_statuses():
+    dashboard = make_dashboard([])
+
+    dashboard.order_status_changed("o1", "Estimated")
+    dashboard.order_status_changed("o2", "Estimated")
+    dashboard.order_status_changed("o1", "Paid")
+    dashboard.order_status_changed("o1", "OutForDelivery", tracking_id="t1")
+    dashboard.delivery_status_changed("t1", "Delivered")
+    dashboard.adjust("print_queue_depth", 2)
+    dashboard.adjust("print_queue_depth", -3)
+
+    snapshot = dashboard.snapshot()
+    assert snapshot["orders_by_status"] == {"Estimated": 1, "Delivered": 1}
+    assert (snapshot["print_queue_depth"], snapshot["vendors_online"]) == (0, 3)
+    # Finished orders are no longer tracked
+    assert "o1" not in dashboard._open_orders and "t1" not in dashboard._tracking
+
+@pytest.mark.asyncio
+async def test_vendors_online_is_the_union_over_live_workers():
+    db = MemoryClient()["test"]
+    worker_a = make_dashboard([], online=["v1", "v2"])
+    worker_b = make_dashboard([], online=["v2", "v3"])
+    dead = make_dashboard([], online=["v9"])
+    await worker_a.publish_presence(db, ttl_s=45)
+    await worker_b.publish_presence(db, ttl_s=45)
+    await dead.publish_presence(db, ttl_s=45)
+    await db.worker_presence.update_one(
+        {"_id": dead.worker_id}, {"$set": {"expires_at": datetime.now(timezone.utc) - timedelta(seconds=1)}}
+    )
+
+    assert worker_a.snapshot()["vendors_online"] == 2
+    await worker_a.load_presence(db)
+    assert worker_a.snapshot()["vendors_online"] == 3
+
+@pytest.mark.asyncio
+async def test_load_remembers_only_the_newest_open_orders():
+    db = MemoryClient()["test"]
+    await db.orders.insert_many([
+        {"id": f"o{i}", "status": "Estimated", "created_at": f"2026-01-0{i}"} for i in range(1, 6)
+    ] + [{"id": "o6", "status": "Delivered", "created_at": "2026-01-06"}])
+    dashboard = make_dashboard([], max_tracked_orders=2)
+
+    await dashboard.load(db)
+
+    assert dashboard.snapshot()["orders_by_status"] == {"Estimated": 5, "Delivered": 1}
+    assert set(dashboard._open_orders) == {"o4", "o5"}
+
+@pytest.mark.asyncio
+async def test_pushes_are_throttled_to_one_per_interval():
+    pushes = []
+    dashboard = make_dashboard(pushes, min_interval_s=0.1)
+
+    dashboard.order_status_changed("o1", "Estimated")
+    await asyncio.sleep(0.01)
+    assert len(pushes) == 1
+
+    for i in range(50):
+        dashboard.order_status_changed(f"o{i + 2}", "Estimated")
+    await asyncio.sleep(0.05)
+    assert len(pushes) == 1
+
+    await asyncio.sleep(0.1)
+    assert len(pushes) == 2
+    assert pushes[-1]["orders_by_status"] == {"Estimated": 51}
+
+@pytest.mark.asyncio
+async def test_admin_namespace_refuses_vendor_tokens():
+    import socketio
+    from backend.admin_dashboard import AdminNamespace
+    from backend.auth import create_access_token
+    from backend.vendor_auth import create_vendor_token
+
+    namespace = AdminNamespace("/admin")
+    with pytest.raises(socketio.exceptions.ConnectionRefusedError):
+        await namespace.on_connect("sid-1", {}, {"token": create_vendor_token("v1", "v@x.y", "V")})
+    with pytest.raises(socketio.exceptions.ConnectionRefusedError):
+        await namespace.on_connect("sid-1", {}, {"token": create_access_token({"sub": "u1", "role": "Designer"})})
+
+@pytest.mark.asyncio
+async def test_resync_loop_only_publishes_presence_without_local_admins(monkeypatch):
+    from backend import admin_dashboard
+
+    db = MemoryClient()["test"]
+    monkeypatch.setitem(admin_dashboard.SETTINGS, "presenceSeconds", 0.01)
+    resyncs = admin_dashboard.dashboard.stats["resyncs"]
+    task = asyncio.create_task(admin_dashboard.run_resync_loop(db))
+    await asyncio.sleep(0.05)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+    assert admin_dashboard.dashboard.stats["resyncs"] == resyncs
+    assert await db.worker_presence.count_documents({"_id": admin_dashboard.dashboard.worker_id}) == 1
@@ -0,0 +1,73 @@
+import pytest
+from backend import socketio_manager
+from backend.connection_registry import ConnectionRegistry, memory_per_connection
+
+def test_tracks_several_devices_per_vendor_in_both_directions():
+    registry = ConnectionRegistry()
+
+    assert registry.add("v1", "phone") is True
+    assert registry.add("v1", "pc") is False
+    assert registry.add("v2", "tablet") is True
+
+    assert registry.sids_for("v1") == {"phone", "pc"}
+    assert registry.vendor_for("pc") == "v1"
+    assert (len(registry), registry.vendor_count) == (3, 2)
+
+    assert registry.remove("phone") == "v1"
+    assert "v1" in registry and registry.sids_for("v1") == {"pc"}
+    assert registry.remove("pc") == "v1"
+    assert "v1" not in registry
+    assert registry.remove("pc") is None
+    assert sorted(registry.vendors()) == ["v2"]
+
+def test_reused_sid_moves_to_the_new_vendor():
+    registry = ConnectionRegistry()
+    registry.add("v1", "sid")
+    registry.add("v1", "sid")
+    assert registry.sids_for("v1") == {"sid"}
+
+    registry.add("v2", "sid")
+    assert "v1" not in registry
+    assert registry.vendor_for("sid") == "v2"
+
+def test_memory_per_connection_stays_small():
+    assert memory_per_connection(10000) < 200
+
+@pytest.mark.asyncio
+async def test_socket_handlers_use_the_registry_and_vendor_rooms(monkeypatch):
+    import socket_auth
+    import vendor_notifications
+    import vendor_outbox
+    from vendor_auth import create_vendor_token
+
+    rooms = []
+
+    async def fake_enter_room(sid, room):
+        rooms.append((sid, room))
+
+    async def fake_emit(event, data, room=None):
+        pass
+
+    async def fake_unread_count(vendor_id):
+        return 4
+
+    async def fake_backlog(vendor_id, after_seq=None):
+        return [], 0
+
+    async def fake_active_vendors(vendor_ids):
+        return set(vendor_ids)
+
+    monkeypatch.setattr(socketio_manager, "connections", ConnectionRegistry())
+    monkeypatch.setattr(socketio_manager.sio, "enter_room", fake_enter_room)
+    monkeypatch.setattr(socketio_manager.sio, "emit", fake_emit)
+    monkeypatch.setattr(vendor_notifications, "get_unread_count", fake_unread_count)
+    monkeypatch.setattr(vendor_outbox, "get_backlog", fake_backlog)
+    monkeypatch.setattr(socket_auth, "vendor_directory", socket_auth.VendorDirectory(fake_active_vendors))
+
+    token = create_vendor_token("v1", "v1@example.com", "Vendor 1")
+    await socketio_manager.connect("phone", {}, {"token": token})
+    await socketio_manager.connect("pc", {}, {"token": token})
+    assert rooms == [("phone", "vendor:v1"), ("pc", "vendor:v1")]
+
+    await socketio_manager.disconnect("phone")
+    assert socketio_manager.connections.sids_for("v1") == {"pc"}
@@ -1,5 +1,5 @@
 import pytest
-from backend.delivery import get_delivery_quotes, select_cheapest_partner, book_delivery
+from backend.delivery import get_delivery_quotes, select_cheapest_partner, book_delivery, get_cheapest_vendor_quote
 from backend.models import VendorLocation
 
 def test_get_delivery_quotes():
@@ -69,3 +69,50 @@ def test_book_delivery():
     assert 'tracking_id' in booking
     assert booking['partner_id'] == 'uber_direct'
     assert booking['mode'] == 'SIMULATED'
+
+def test_cheapest_vendor_quote_prefers_nearby_vendor():
+    """Test the vectorized quote picks the cheapest (vendor, partner) pair"""
+    delivery = VendorLocation(
+        latitude=13.0358,
+        longitude=77.5970,
+        address="Hebbal",
+        city="Bangalore",
+        pincode="560024"
+    )
+    vendors = [
+        {"id": "far", "name": "Far", "location": {"latitude": 12.9000, "longitude": 77.5000}},
+        {"id": "near", "name": "Near", "location": {"latitude": 13.0300, "longitude": 77.5950}},
+        {"id": "mid", "name": "Mid", "location": {"latitude": 12.9716, "longitude": 77.5946}}
+    ]
+    
+    quote = get_cheapest_vendor_quote(vendors, delivery)
+    near_quotes = get_delivery_quotes(
+        VendorLocation(latitude=13.0300, longitude=77.5950, address="Near", city="Bangalore", pincode="560024"),
+        delivery
+    )
+    
+    assert quote['vendor_id'] == 'near'
+    assert quote['candidates'] == 3
+    assert quote['partner_id'] == near_quotes[0]['partner_id']
+    assert quote['cost'] == near_quotes[0]['cost']
+
+def test_cheapest_vendor_quote_out_of_range():
+    """Test no quote when every vendor is beyond every partner's range"""
+    delivery = VendorLocation(latitude=13.0358, longitude=77.5970, address="Hebbal", city="Bangalore", pincode="560024")
+    vendors = [{"id": "hyd", "name": "Hyderabad", "location": {"latitude": 17.3850, "longitude": 78.4867}}]
+    
+    assert get_cheapest_vendor_quote(vendors, delivery) is None
+
+def test_cheapest_vendor_quote_skips_vendors_without_coordinates():
+    """Test a vendor document without a location does not fail the quote"""
+    delivery = VendorLocation(latitude=13.0358, longitude=77.5970, address="Hebbal", city="Bangalore", pincode="560024")
+    vendors = [
+        {"id": "new", "name": "New"},
+        {"id": "partial", "name": "Partial", "location": {"latitude": 13.03}},
+        {"id": "near", "name": "Near", "location": {"latitude": 13.0300, "longitude": 77.5950}}
+    ]
+    
+    quote = get_cheapest_vendor_quote(vendors, delivery)
+    
+    assert quote['vendor_id'] == 'near'
+    assert quote['candidates'] == 1
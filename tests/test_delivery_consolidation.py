@@ -0,0 +1,119 @@
+import pytest
+from backend.delivery import book_delivery
+from datetime import datetime, timezone
+from backend.delivery_consolidation import (
+    build_distance_matrix, route_length, nearest_neighbour_routes, two_opt, plan_routes,
+    synthetic_day_report, consolidate_ready_deliveries
+)
+from backend.memory_db import MemoryClient
+from backend.models import VendorLocation
+
+def location(latitude: float, longitude: float) -> VendorLocation:
+    return VendorLocation(latitude=latitude, longitude=longitude, address="Test", city="Bangalore", pincode="560001")
+
+def test_two_opt_never_lengthens_route():
+    """Test 2-opt untangles a crossing path without making it longer"""
+    points = [(12.97, 77.59), (12.98, 77.59), (12.99, 77.60), (12.98, 77.60), (12.99, 77.59)]
+    matrix = build_distance_matrix(points)
+
+    crossing = [1, 2, 3, 4]
+    improved = two_opt(crossing, matrix)
+
+    assert sorted(improved) == crossing
+    assert route_length(improved, matrix) < route_length(crossing, matrix)
+
+def test_routes_respect_capacity():
+    """Test no route carries more stops than maxStopsPerTrip"""
+    points = [(12.97, 77.59)] + [(12.97 + i * 0.001, 77.59 + i * 0.001) for i in range(1, 12)]
+    matrix = build_distance_matrix(points)
+
+    routes = nearest_neighbour_routes(matrix, max_stops=5, max_trip_km=100)
+
+    assert [len(r) for r in routes] == [5, 5, 1]
+    assert sorted(node for r in routes for node in r) == list(range(1, 12))
+
+def test_multi_drop_booking_keeps_per_order_tracking():
+    """Test one trip booking returns a tracking id per order"""
+    depot = location(12.9716, 77.5946)
+    drops = [
+        {"order_id": "o1", "location": location(12.98, 77.60)},
+        {"order_id": "o2", "location": location(12.99, 77.61)}
+    ]
+    route = plan_routes(depot, drops, max_stops=5, max_trip_km=20)[0]
+
+    booking = book_delivery("uber_direct", "trip_1", depot, route['drops'][-1]['location'], drops=route['drops'])
+
+    assert booking['status'] == 'booked'
+    assert [d['order_id'] for d in booking['drops']] == ["o1", "o2"]
+    assert len({d['tracking_id'] for d in booking['drops']}) == 2
+    assert all(d['tracking_id'].startswith(booking['tracking_id']) for d in booking['drops'])
+
+def test_synthetic_day_saves_cost_and_km():
+    """Test consolidation beats one trip per order on a synthetic day"""
+    report = synthetic_day_report(num_vendors=3, num_orders=120, seed=7)
+
+    assert report['orders'] == 120
+    assert report['trips'] < report['orders']
+    assert report['cost'] < report['individual_cost']
+    assert report['km'] <= report['individual_km']
+
+def ready_order(order_id: str, vendor_id: str, **fields):
+    return {
+        "id": order_id, "assigned_vendor_id": vendor_id, "status": "ReadyForDelivery", "fulfillment_type": "Delivery",
+        "delivery_tracking_id": None, "customer_location": location(12.98, 77.60).model_dump(),
+        "updated_at": "2024-01-01T09:00:00+00:00", "statusHistory": [], **fields
+    }
+
+@pytest.mark.asyncio
+async def test_consolidation_books_only_unclaimed_orders_and_skips_bad_vendors():
+    """Test orders claimed by another run and vendors without a location are left alone"""
+    db = MemoryClient()["test"]
+    await db.vendors.insert_many([
+        {"id": "v1", "location": location(12.9716, 77.5946).model_dump()},
+        {"id": "v2"}
+    ])
+    await db.orders.insert_many([
+        ready_order("o1", "v1"),
+        ready_order("o2", "v1", consolidation_claim="other_run", consolidation_claimed_at="2024-01-01T09:59:00+00:00"),
+        ready_order("o3", "v2"),
+        ready_order("o4", "v1", updated_at=None)
+    ])
+
+    report = await consolidate_ready_deliveries(db, now=datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc))
+
+    assert report['orders'] == 1
+    orders = {o['id']: o for o in await db.orders.find({}).to_list(None)}
+    assert orders['o1']['status'] == "OutForDelivery" and "consolidation_claim" not in orders['o1']
+    assert orders['o2']['status'] == "ReadyForDelivery" and orders['o2']['consolidation_claim'] == "other_run"
+    assert orders['o3']['status'] == "ReadyForDelivery" and "consolidation_claim" not in orders['o3']
+    assert orders['o4']['status'] == "ReadyForDelivery"
+
+@pytest.mark.asyncio
+async def test_orders_that_change_before_booking_get_no_trip_or_status_push(monkeypatch):
+    """Test an order cancelled between claim and booking is left out of the trip and not pushed"""
+    from backend import delivery_consolidation
+
+    pushed = []
+
+    async def fake_publish(order_id, status, tracking_id=None):
+        pushed.append(order_id)
+
+    monkeypatch.setattr(delivery_consolidation, "publish_order_status", fake_publish)
+    db = MemoryClient()["test"]
+    await db.vendors.insert_one({"id": "v1", "location": location(12.9716, 77.5946).model_dump()})
+    await db.orders.insert_many([ready_order("o1", "v1"), ready_order("o2", "v1")])
+    bulk_write = db.orders.bulk_write
+
+    async def cancel_then_write(updates, ordered=True):
+        await db.orders.update_one({"id": "o2"}, {"$set": {"status": "Cancelled"}})
+        return await bulk_write(updates, ordered=ordered)
+
+    monkeypatch.setattr(db.orders, "bulk_write", cancel_then_write)
+
+    report = await consolidate_ready_deliveries(db, now=datetime(2024, 1, 1, 10, 0, tzinfo=timezone.utc))
+
+    trips = await db.delivery_trips.find({}).to_list(None)
+    assert [[d['order_id'] for d in trip['drops']] for trip in trips] == [["o1"]]
+    assert pushed == ["o1"]
+    assert (report['trips'], report['orders']) == (1, 1)
+    assert (await db.orders.find_one({"id": "o2"}))['status'] == "Cancelled"
@@ -0,0 +1,149 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from backend.memory_db import MemoryClient
+from backend.delivery_webhooks import (
+    DeliveryWebhookIngestor, IngestQueueFull, InvalidDeliveryEvent, DeliveryEventNotStored
+)
+
+class RecordingOrders:
+    """Captures bulk_write batches instead of talking to MongoDB"""
+    def __init__(self):
+        self.batches = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.batches.append(operations)
+        return SimpleNamespace(matched_count=len(operations), modified_count=len(operations))
+
+def test_duplicate_callbacks_dropped():
+    """Test retries of the same (tracking id, status, timestamp) are not queued twice"""
+    ingestor = DeliveryWebhookIngestor()
+    event = {"tracking_id": "uber_direct_ab12cd34", "status": "InTransit", "timestamp": "2024-01-01T10:00:00Z"}
+
+    assert ingestor.submit("uber_direct", event) is True
+    assert ingestor.submit("uber_direct", dict(event)) is False
+    assert ingestor.submit("uber_direct", {**event, "status": "Delivered"}) is True
+    assert ingestor.queue.qsize() == 2
+    assert ingestor.stats['duplicates'] == 1
+
+def test_queue_full_rejected():
+    """Test a full ingest queue surfaces as IngestQueueFull"""
+    ingestor = DeliveryWebhookIngestor(max_queue=1)
+    ingestor.submit("rapido", {"tracking_id": "t1", "status": "Assigned", "timestamp": "1"})
+
+    with pytest.raises(IngestQueueFull):
+        ingestor.submit("rapido", {"tracking_id": "t2", "status": "Assigned", "timestamp": "1"})
+
+def test_malformed_callbacks_rejected():
+    """Test payloads without a usable tracking id / status are refused before queueing"""
+    ingestor = DeliveryWebhookIngestor()
+
+    for payload in (["t1"], {"status": "Delivered"}, {"tracking_id": 42}, {"tracking_id": "t1", "status": {"x": 1}}):
+        with pytest.raises(InvalidDeliveryEvent):
+            ingestor.submit("rapido", payload)
+    assert ingestor.queue.qsize() == 0
+
+@pytest.mark.asyncio
+async def test_failed_batch_retried_on_next_flush():
+    """Test a bulk_write failure keeps the batch for the next flush"""
+    ingestor = DeliveryWebhookIngestor()
+    orders = RecordingOrders()
+    real_bulk_write = orders.bulk_write
+
+    async def failing_bulk_write(operations, ordered=True):
+        raise ConnectionError("primary stepped down")
+
+    orders.bulk_write = failing_bulk_write
+    ingestor._db = SimpleNamespace(orders=orders)
+    ingestor.submit("rapido", {"tracking_id": "t1", "status": "Delivered", "timestamp": "1"})
+
+    with pytest.raises(ConnectionError):
+        await ingestor.flush()
+
+    orders.bulk_write = real_bulk_write
+    assert await ingestor.flush() == 1
+    assert orders.batches[0][0]._filter["delivery_tracking_id"] == "t1"
+
+@pytest.mark.asyncio
+async def test_callbacks_are_acknowledged_only_once_written():
+    """Test accept waits for the batch write and fails when the write does"""
+    ingestor = DeliveryWebhookIngestor()
+    orders = RecordingOrders()
+    real_bulk_write = orders.bulk_write
+
+    async def failing_bulk_write(operations, ordered=True):
+        raise ConnectionError("primary stepped down")
+
+    ingestor._db = SimpleNamespace(orders=orders)
+    event = {"tracking_id": "t1", "status": "Delivered", "timestamp": "1"}
+    first = asyncio.create_task(ingestor.accept("rapido", event))
+    duplicate = asyncio.create_task(ingestor.accept("rapido", dict(event)))
+    await asyncio.sleep(0)
+    assert not first.done() and not duplicate.done()
+
+    orders.bulk_write = failing_bulk_write
+    with pytest.raises(ConnectionError):
+        await ingestor.flush()
+    with pytest.raises(DeliveryEventNotStored):
+        await first
+    with pytest.raises(DeliveryEventNotStored):
+        await duplicate
+
+    # The partner's retry is accepted again and acknowledged once written
+    orders.bulk_write = real_bulk_write
+    retry = asyncio.create_task(ingestor.accept("rapido", dict(event)))
+    await asyncio.sleep(0)
+    await ingestor.flush()
+    assert await retry is True
+
+@pytest.mark.asyncio
+async def test_flush_writes_status_and_history_in_batches():
+    """Test queued events become batched conditional updates"""
+    ingestor = DeliveryWebhookIngestor(batch_size=2)
+    orders = RecordingOrders()
+    ingestor._db = SimpleNamespace(orders=orders)
+
+    ingestor.submit("uber_direct", {"tracking_id": "t1", "status": "InTransit", "timestamp": "1"})
+    ingestor.submit("uber_direct", {"tracking_id": "t1", "status": "Delivered", "timestamp": "2"})
+    ingestor.submit("uber_direct", {"tracking_id": "t2", "status": "PickedUp", "timestamp": "1"})
+
+    applied = await ingestor.flush()
+
+    assert applied == 3
+    assert [len(b) for b in orders.batches] == [2, 1]
+
+    in_transit, delivered = (op._doc for op in orders.batches[0])
+    assert orders.batches[0][0]._filter["status"] == {"$ne": "Delivered"}
+    assert in_transit["$set"]["status"] == "OutForDelivery"
+    assert delivered["$set"]["status"] == "Delivered"
+    assert delivered["$push"]["statusHistory"]["event_key"] == "t1|Delivered|2"
+
+    picked_up = orders.batches[1][0]._doc
+    assert "status" not in picked_up["$set"]
+    assert picked_up["$set"]["delivery_status"] == "PickedUp"
+
+@pytest.mark.asyncio
+async def test_only_events_that_changed_an_order_are_published():
+    """Test replays, unknown tracking ids and a late InTransit after Delivered are not pushed"""
+    published = []
+
+    async def on_applied(events):
+        published.extend(events)
+
+    db = MemoryClient()["test"]
+    await db.orders.insert_one({
+        "id": "VP-1", "delivery_tracking_id": "t1", "status": "Delivered",
+        "statusHistory": [{"status": "Delivered", "event_key": "t1|Delivered|5"}]
+    })
+    ingestor = DeliveryWebhookIngestor(on_applied=on_applied)
+    ingestor._db = db
+
+    ingestor.submit("rapido", {"tracking_id": "t1", "status": "Delivered", "timestamp": "5"})   # replay
+    ingestor.submit("rapido", {"tracking_id": "t1", "status": "InTransit", "timestamp": "6"})   # late
+    ingestor.submit("rapido", {"tracking_id": "t9", "status": "PickedUp", "timestamp": "1"})    # unknown
+    ingestor.submit("rapido", {"tracking_id": "t1", "status": "ProofUploaded", "timestamp": "7"})
+
+    assert await ingestor.flush() == 1
+    assert published == [{
+        "order_id": "VP-1", "tracking_id": "t1", "delivery_status": "ProofUploaded", "status": None, "at": "7"
+    }]
@@ -0,0 +1,97 @@
+import httpx
+import pytest
+from backend.gateway_clients import (
+    GatewayClient, CircuitBreaker, CircuitOpenError, GatewayError, build_order_request, _credentials
+)
+from backend.stub_servers import create_stub_gateway_app, serve_stub
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_circuit_breaker_opens_and_half_opens():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout_s=10, clock=clock)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()          # single trial call
+    assert not breaker.allow()
+    breaker.record_failure()        # trial failed: open again
+    assert breaker.state == "open"
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_order_request_in_minor_units_for_razorpay():
+    path, body = build_order_request("razorpay", "ORD-1", 249.99, "INR")
+    assert path == "/v1/orders"
+    assert body == {"amount": 24999, "currency": "INR", "receipt": "ORD-1"}
+
+@pytest.mark.asyncio
+async def test_retries_transient_failures_over_pooled_connection():
+    app = create_stub_gateway_app(failure_rate=0.5, seed=3)
+    async with serve_stub(app) as base_url:
+        client = GatewayClient("razorpay", base_url, auth=("key", "secret"), max_retries=5, backoff_base_s=0.001)
+        session_ids = [(await client.create_order(f"ORD-{i}", 100.0))[0] for i in range(10)]
+        await client.close()
+
+    assert all(session_id.startswith("order_") for session_id in session_ids)
+    assert client.stats['retries'] > 0
+    assert app.state.requests == 10 + client.stats['retries']
+
+@pytest.mark.asyncio
+async def test_breaker_rejects_without_network_after_repeated_failures():
+    app = create_stub_gateway_app(failure_rate=1.0)
+    async with serve_stub(app) as base_url:
+        client = GatewayClient(
+            "paytm", base_url, max_retries=1, backoff_base_s=0.001,
+            breaker=CircuitBreaker(failure_threshold=2, reset_timeout_s=60)
+        )
+        for _ in range(2):
+            with pytest.raises(GatewayError):
+                await client.create_order("ORD-1", 100.0)
+        with pytest.raises(CircuitOpenError):
+            await client.create_order("ORD-1", 100.0)
+        await client.close()
+
+    assert app.state.requests == 4
+
+def mock_client(gateway_id, handler, **kwargs):
+    client = GatewayClient(gateway_id, "http://gateway.test", max_retries=2, backoff_base_s=0.001, **kwargs)
+    client._client = httpx.AsyncClient(base_url="http://gateway.test", transport=httpx.MockTransport(handler))
+    return client
+
+@pytest.mark.asyncio
+async def test_post_without_idempotency_key_not_retried_after_it_may_have_landed():
+    seen = []
+
+    def handler(request):
+        seen.append(request.headers.get("Idempotency-Key"))
+        return httpx.Response(503)
+
+    client = mock_client("razorpay", handler)
+    with pytest.raises(GatewayError):
+        await client.request("POST", "/v1/orders", {"amount": 100})
+    assert seen == [None]
+
+    # create_order retries, every attempt carrying the same key
+    seen.clear()
+    with pytest.raises(GatewayError):
+        await client.create_order("ORD-1", 1.0)
+    assert len(seen) == 3 and len(set(seen)) == 1 and seen[0].startswith("ORD-1-")
+    await client.close()
+
+def test_credentials_never_send_the_secret_as_username():
+    assert _credentials({"prodKeyId": "rzp_key", "prodKeySecret": "s"}, "prod") == ("rzp_key", "s")
+    assert _credentials({"prodMerchantId": "mid", "prodMerchantKey": "mkey"}, "prod") == ("mid", "mkey")
+    assert _credentials({"prodMerchantKey": "payu_key", "prodMerchantSalt": "salt"}, "prod") == ("payu_key", "salt")
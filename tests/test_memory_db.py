@@ -0,0 +1,63 @@
+import pytest
+from pymongo import ReturnDocument
+from backend.memory_db import MemoryClient
+from backend.socket_load_test import LatencyTracker
+
+@pytest.mark.asyncio
+async def test_queries_projections_and_cursors():
+    db = MemoryClient()["test"]
+    await db.vendors.insert_many([
+        {"id": f"v{i}", "store_open": i % 2 == 0, "is_active": True, "workload": i} for i in range(6)
+    ])
+
+    docs = await db.vendors.find(
+        {"store_open": True, "workload": {"$gte": 2}}, {"_id": 0, "id": 1}
+    ).sort("workload", -1).limit(2).to_list(None)
+    assert docs == [{"id": "v4"}, {"id": "v2"}]
+    assert await db.vendors.count_documents({"id": {"$in": ["v1", "v3", "v9"]}, "is_active": {"$ne": False}}) == 2
+    assert await db.vendors.find_one({"id": "v9"}) is None
+
+@pytest.mark.asyncio
+async def test_updates_and_upserts():
+    db = MemoryClient()["test"]
+    await db.orders.insert_one({"id": "o1", "status": "Pending", "items": []})
+
+    before = await db.orders.find_one_and_update({"id": "o1"}, {"$set": {"status": "Accepted"}, "$inc": {"seq": 1}})
+    assert before["status"] == "Pending"
+    after = await db.orders.find_one_and_update(
+        {"id": "o1"}, {"$inc": {"seq": 1}, "$push": {"items": "a"}}, {"_id": 0}, return_document=ReturnDocument.AFTER
+    )
+    assert after == {"id": "o1", "status": "Accepted", "items": ["a"], "seq": 2}
+
+    result = await db.counters.update_one({"_id": "vendor:v1"}, {"$inc": {"seq": 1}, "$setOnInsert": {"kind": "outbox"}}, upsert=True)
+    assert result.upserted_id == "vendor:v1"
+    assert await db.counters.find_one({"_id": "vendor:v1"}) == {"_id": "vendor:v1", "seq": 1, "kind": "outbox"}
+
+@pytest.mark.asyncio
+async def test_dotted_paths_match_inside_arrays():
+    db = MemoryClient()["test"]
+    await db.orders.insert_one({"id": "o1", "statusHistory": [{"event_key": "a"}, {"event_key": "b"}]})
+
+    assert await db.orders.count_documents({"statusHistory.event_key": "b"}) == 1
+    assert await db.orders.count_documents({"statusHistory.event_key": {"$ne": "a"}}) == 0
+    assert await db.orders.count_documents({"statusHistory.event_key": {"$in": ["c", "a"]}}) == 1
+    assert await db.orders.count_documents({"statusHistory.1.event_key": "b"}) == 1
+
+@pytest.mark.asyncio
+async def test_group_aggregation():
+    db = MemoryClient()["test"]
+    await db.orders.insert_many([{"status": status} for status in ["Pending", "Pending", "Accepted"]])
+
+    rows = await db.orders.aggregate([{"$group": {"_id": "$status", "count": {"$sum": 1}}}]).to_list(None)
+    assert {row["_id"]: row["count"] for row in rows} == {"Pending": 2, "Accepted": 1}
+
+def test_latency_tracker_matches_notifications_that_beat_the_response():
+    tracker = LatencyTracker()
+    tracker.notified("o1", at=10.2)   # socket push arrived before the HTTP response
+    tracker.order_placed("o1", started=10.0)
+    tracker.order_placed("o2", started=11.0)
+    tracker.notified("o2", at=11.5)
+    tracker.notified(None, at=12.0)
+
+    assert [round(t, 3) for t in tracker.latencies] == [0.2, 0.5]
+    assert not tracker.placed and not tracker.early
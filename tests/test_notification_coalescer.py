@@ -0,0 +1,70 @@
+import asyncio
+import pytest
+from backend import socketio_manager
+from backend.connection_registry import ConnectionRegistry
+from backend.notification_coalescer import NotificationCoalescer
+
+class Recorder:
+    def __init__(self):
+        self.deliveries = []
+
+    async def __call__(self, recipient, events):
+        self.deliveries.append((recipient, [e['type'] for e in events]))
+
+@pytest.mark.asyncio
+async def test_burst_is_delivered_once_per_recipient_after_the_window():
+    deliver = Recorder()
+    coalescer = NotificationCoalescer(deliver, window_s=0.02)
+
+    for event_type in ("order.new", "order.status", "badge.upgrade"):
+        await coalescer.add("v1", {"type": event_type})
+    await coalescer.add("v2", {"type": "order.new"})
+    assert deliver.deliveries == []
+
+    await asyncio.sleep(0.05)
+
+    assert sorted(deliver.deliveries) == [
+        ("v1", ["order.new", "order.status", "badge.upgrade"]),
+        ("v2", ["order.new"])
+    ]
+    assert coalescer.stats == {"events": 4, "deliveries": 2, "critical": 0}
+
+@pytest.mark.asyncio
+async def test_critical_events_and_full_buffers_flush_immediately_in_order():
+    deliver = Recorder()
+    coalescer = NotificationCoalescer(deliver, window_s=10, max_batch=3, critical_types={"order.cancelled"})
+
+    await coalescer.add("v1", {"type": "order.status"})
+    await coalescer.add("v1", {"type": "order.cancelled"})
+    await coalescer.add("v2", {"type": "a"})
+    await coalescer.add("v2", {"type": "b"}, critical=True)
+    for event_type in ("c", "d", "e"):
+        await coalescer.add("v3", {"type": event_type})
+
+    assert deliver.deliveries == [
+        ("v1", ["order.status", "order.cancelled"]),
+        ("v2", ["a", "b"]),
+        ("v3", ["c", "d", "e"])
+    ]
+    assert coalescer.buffered == 0
+
+@pytest.mark.asyncio
+async def test_vendor_socket_burst_is_one_digest_carrying_the_count(monkeypatch):
+    emitted = []
+
+    async def fake_emit(event, data, room=None):
+        emitted.append((event, room, data.get("unread_count")))
+
+    monkeypatch.setattr(socketio_manager.sio, "emit", fake_emit)
+    connections = ConnectionRegistry()
+    connections.add("vendor_1", "sid-1")
+    monkeypatch.setattr(socketio_manager, "connections", connections)
+    monkeypatch.setattr(socketio_manager, "vendor_unread_counts", {})
+
+    for i in range(3):
+        await socketio_manager.notify_vendor("vendor_1", "order.new", {"orderId": f"ORD-{i}"}, unread_count=i + 1)
+    await socketio_manager.vendor_coalescer.flush_all()
+    await socketio_manager.sender.drain()
+
+    assert emitted == [("notification_digest", "vendor:vendor_1", 3)]
+    assert socketio_manager.vendor_unread_counts["vendor_1"] == 3
@@ -0,0 +1,177 @@
+import asyncio
+import pytest
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+from backend.memory_db import MemoryClient
+from backend.models import NotificationLog
+from backend.notification_dispatcher import NotificationDispatcher, RateLimiter
+
+SETTINGS = {
+    "whatsapp": {"workers": 2, "ratePerSecond": 10000, "maxQueue": 100, "maxRetries": 2, "backoffBaseMs": 1},
+    "email": {"workers": 1, "batchSize": 50, "ratePerSecond": 10000, "maxQueue": 100, "maxRetries": 2, "backoffBaseMs": 1},
+    "spillRefillIntervalSeconds": 60
+}
+
+class RecordingService:
+    def __init__(self, failures=None):
+        self.whatsapp = []
+        self.email_batches = []
+        self.failures = failures or {}
+
+    async def send_whatsapp(self, recipient, message, order_id=None):
+        if self.failures.get(recipient):
+            self.failures[recipient] -= 1
+            raise RuntimeError("provider down")
+        self.whatsapp.append(recipient)
+        return NotificationLog(type="WhatsApp", recipient=recipient, message=message, order_id=order_id, status="Sent")
+
+    async def send_email_batch(self, emails):
+        self.email_batches.append([e['recipient'] for e in emails])
+        return [NotificationLog(type="Email", recipient=e['recipient'], message=e['message'], status="Sent") for e in emails]
+
+class FakeOutbox:
+    def __init__(self):
+        self.docs = []
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def insert_many(self, docs):
+        for i, doc in enumerate(docs):
+            self.docs.append({**doc, "_id": len(self.docs) + i})
+
+@pytest.mark.asyncio
+async def test_emails_batched_and_whatsapp_sent_individually():
+    service = RecordingService()
+    sent = []
+
+    async def on_sent(logs):
+        sent.extend(logs)
+
+    dispatcher = NotificationDispatcher(service, SETTINGS, on_sent=on_sent)
+    await dispatcher.start(SimpleNamespace(notification_outbox=FakeOutbox()))
+    # Enqueueing never yields, so the whole burst is queued before a worker runs
+    for i in range(120):
+        await dispatcher.enqueue_email(f"c{i}@example.com", "Update", "Ready")
+    for i in range(10):
+        await dispatcher.enqueue_whatsapp(f"+91{i}", "Ready")
+
+    await dispatcher.stop()
+
+    # 100 fit in memory; the overflow went to the outbox
+    assert [len(b) for b in service.email_batches] == [50, 50]
+    assert dispatcher.stats['email']['spilled'] == 20
+    assert len(service.whatsapp) == 10
+    assert len(sent) == 110
+
+@pytest.mark.asyncio
+async def test_retries_with_backoff_then_reports_failure():
+    service = RecordingService(failures={"+911": 3, "+912": 1})
+    sent = []
+
+    async def on_sent(logs):
+        sent.extend(logs)
+
+    dispatcher = NotificationDispatcher(service, {**SETTINGS, "whatsapp": {**SETTINGS['whatsapp'], "workers": 1}}, on_sent=on_sent)
+    await dispatcher.start(SimpleNamespace(notification_outbox=FakeOutbox()))
+    await dispatcher.enqueue_whatsapp("+911", "first")    # fails 3 times: gives up
+    await dispatcher.enqueue_whatsapp("+912", "second")   # fails once, then sent
+
+    for _ in range(200):
+        if dispatcher.idle:
+            break
+        await asyncio.sleep(0.005)
+    await dispatcher.stop()
+
+    assert service.whatsapp == ["+912"]
+    assert sorted((log.recipient, log.status) for log in sent) == [("+911", "Failed"), ("+912", "Sent")]
+    assert dispatcher.stats['whatsapp']['retried'] == 3
+
+def spilled(count, **extra):
+    return [
+        {"channel": "whatsapp", "item": {"recipient": f"+91{i}", "message": "Ready", "attempts": 0}, "created_at": f"{i:03d}", **extra}
+        for i in range(count)
+    ]
+
+@pytest.mark.asyncio
+async def test_refill_moves_spilled_messages_back():
+    db = MemoryClient()["test"]
+    dispatcher = NotificationDispatcher(RecordingService(), SETTINGS)
+    dispatcher._db = db
+    await db.notification_outbox.insert_many(spilled(80))
+
+    moved = await dispatcher.refill()
+
+    assert moved == 50
+    assert dispatcher.channels['whatsapp']['queue'].qsize() == 50
+    assert await db.notification_outbox.count_documents({}) == 30
+    assert await db.notification_outbox.count_documents({"claimed_by": {"$ne": None}}) == 0
+
+@pytest.mark.asyncio
+async def test_refill_skips_messages_claimed_by_another_worker():
+    db = MemoryClient()["test"]
+    dispatcher = NotificationDispatcher(RecordingService(), SETTINGS)
+    dispatcher._db = db
+    now = datetime.now(timezone.utc)
+    await db.notification_outbox.insert_many(spilled(10, claimed_by="other", claimed_at=now.isoformat()))
+    await db.notification_outbox.insert_many(spilled(5, claimed_by="dead", claimed_at=(now - timedelta(hours=1)).isoformat()))
+
+    # Only the stale claims are taken over
+    assert await dispatcher.refill() == 5
+    assert await db.notification_outbox.count_documents({"claimed_by": "other"}) == 10
+    assert await db.notification_outbox.count_documents({}) == 10
+
+@pytest.mark.asyncio
+async def test_refill_releases_claims_that_no_longer_fit():
+    db = MemoryClient()["test"]
+    dispatcher = NotificationDispatcher(RecordingService(), SETTINGS)
+    dispatcher._db = db
+    await db.notification_outbox.insert_many(spilled(20))
+    queue = dispatcher.channels['whatsapp']['queue']
+    original_find = db.notification_outbox.find
+
+    def find(query, projection=None):
+        # New messages arrive while the claim is being made
+        if "claimed_by" in query and isinstance(query["claimed_by"], str):
+            while queue.qsize() < queue.maxsize - 5:
+                queue.put_nowait({"recipient": "+910", "message": "new", "attempts": 0})
+        return original_find(query, projection)
+
+    db.notification_outbox.find = find
+    assert await dispatcher.refill() == 5
+    assert await db.notification_outbox.count_documents({}) == 15
+    assert await db.notification_outbox.count_documents({"claimed_by": {"$ne": None}}) == 0
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_out_messages():
+    limiter = RateLimiter(rate=100)
+    limiter.tokens = 0
+    started = asyncio.get_running_loop().time()
+    await limiter.acquire(5)
+    assert asyncio.get_running_loop().time() - started >= 0.04
+
+@pytest.mark.asyncio
+async def test_whatsapp_burst_to_one_number_is_sent_as_one_digest():
+    service = RecordingService()
+    sent = []
+
+    async def on_sent(logs):
+        sent.extend(logs)
+
+    settings = {**SETTINGS, "whatsapp": {**SETTINGS['whatsapp'], "coalesceWindowMs": 20, "coalesceMaxBatch": 5}}
+    dispatcher = NotificationDispatcher(service, settings, on_sent=on_sent)
+    await dispatcher.start(SimpleNamespace(notification_outbox=FakeOutbox()))
+    await dispatcher.enqueue_whatsapp("+911", "Order A accepted", "A")
+    await dispatcher.enqueue_whatsapp("+911", "Order B accepted", "B")
+    await dispatcher.enqueue_whatsapp("+912", "Receipt", "C", critical=True)
+    assert service.whatsapp == []
+
+    for _ in range(200):
+        if dispatcher.idle:
+            break
+        await asyncio.sleep(0.005)
+    await dispatcher.stop()
+
+    assert sorted(service.whatsapp) == ["+911", "+912"]
+    assert sorted(log.order_id for log in sent) == ["A", "B", "C"]
+    assert len({log.id for log in sent}) == 3
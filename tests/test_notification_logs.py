@@ -0,0 +1,103 @@
+import asyncio
+import pytest
+from datetime import datetime
+from types import SimpleNamespace
+from backend.models import NotificationLog
+from backend.notifications import NotificationLogWriter
+
+class RecordingLogs:
+    def __init__(self, fail: int = 0):
+        self.batches = []
+        self.indexes = []
+        self.fail = fail
+
+    async def create_index(self, keys, **kwargs):
+        self.indexes.append((keys, kwargs))
+
+    async def insert_many(self, docs, ordered=True):
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("db unavailable")
+        self.batches.append(list(docs))
+
+def logs(n, order_id="ORD-1"):
+    return [NotificationLog(type="WhatsApp", recipient=f"+91{i}", message="Ready", status="Sent", order_id=order_id) for i in range(n)]
+
+@pytest.mark.asyncio
+async def test_flushes_on_size_and_on_stop_with_ttl_index():
+    collection = RecordingLogs()
+    writer = NotificationLogWriter({"batchSize": 10, "flushIntervalSeconds": 60, "retentionDays": 30})
+    await writer.start(SimpleNamespace(notification_logs=collection))
+
+    await writer.add(logs(25))
+    await asyncio.sleep(0)
+    await writer.add(logs(3))
+    await writer.stop()
+
+    assert [len(b) for b in collection.batches] == [10, 10, 5, 3]
+    assert isinstance(collection.batches[0][0]['created_at'], datetime)
+    assert ("created_at", {"expireAfterSeconds": 30 * 86400}) in collection.indexes
+
+@pytest.mark.asyncio
+async def test_failed_flush_keeps_logs_and_buffer_is_bounded():
+    collection = RecordingLogs(fail=1)
+    writer = NotificationLogWriter({"batchSize": 100, "maxBuffer": 5})
+    writer._db = SimpleNamespace(notification_logs=collection)
+
+    await writer.add(logs(8))
+    assert writer.stats['dropped'] == 3
+
+    with pytest.raises(RuntimeError):
+        await writer.flush()
+    assert await writer.flush() == 5
+    assert [log['recipient'] for log in collection.batches[0]] == ["+913", "+914", "+915", "+916", "+917"]
+
+@pytest.mark.asyncio
+async def test_partial_failure_requeues_only_failed_logs():
+    from pymongo.errors import BulkWriteError
+
+    class PartlyFailingLogs(RecordingLogs):
+        async def insert_many(self, docs, ordered=True):
+            for doc in docs:
+                doc['_id'] = doc['recipient']
+            self.batches.append(list(docs))
+            if len(self.batches) == 1:
+                raise BulkWriteError({"writeErrors": [{"index": 1, "code": 11000}, {"index": 2, "code": 91}]})
+
+    collection = PartlyFailingLogs()
+    writer = NotificationLogWriter({"batchSize": 100})
+    writer._db = SimpleNamespace(notification_logs=collection)
+    await writer.add(logs(4))
+
+    with pytest.raises(BulkWriteError):
+        await writer.flush()
+    assert [log['recipient'] for log in writer._buffer] == ["+912"]
+    assert "_id" not in writer._buffer[0]
+
+    assert await writer.flush() == 1
+    assert writer.stats['written'] == 4
+
+@pytest.mark.asyncio
+async def test_log_pages_do_not_skip_logs_sharing_a_timestamp():
+    from datetime import timezone
+    from backend.memory_db import MemoryClient
+    from backend.notifications import get_log_page
+
+    db = MemoryClient()["test"]
+    same_batch = datetime(2026, 1, 1, 10, 0, tzinfo=timezone.utc)
+    await db.notification_logs.insert_many(
+        [{**log.model_dump(), "created_at": same_batch} for log in logs(5)]
+        + [{**log.model_dump(), "created_at": datetime(2026, 1, 1, 9, 0, tzinfo=timezone.utc)} for log in logs(2)]
+    )
+
+    seen, before = [], None
+    while True:
+        page = await get_log_page(db, {"order_id": "ORD-1"}, 2, before)
+        seen.extend(log['id'] for log in page['logs'])
+        before = page['next_before']
+        if before is None:
+            break
+
+    assert len(seen) == len(set(seen)) == 7
+    with pytest.raises(ValueError):
+        await get_log_page(db, {}, 2, "not-a-date|x")
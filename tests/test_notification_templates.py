@@ -0,0 +1,38 @@
+import pytest
+from backend.notification_templates import TemplateRegistry, compile_template, get_template_registry
+from backend.notifications import get_order_confirmation_message, get_order_ready_message
+
+def test_compiled_template_matches_str_format():
+    source = "Order {order_id}: ₹{total:.2f} {{literal}} 'quoted' \"double\" \\ done"
+    values = {"order_id": "ORD-1", "total": 12.5}
+
+    render = compile_template(source)
+
+    assert render(values) == source.format(**values)
+    assert render.fields == ("order_id", "total")
+
+@pytest.mark.parametrize("source", ["{order.id}", "{items[0]}", "{name!r}", "{total:{width}}", "{x:')}"])
+def test_rejects_expressions_in_fields(source):
+    with pytest.raises(ValueError):
+        compile_template(source)
+
+def test_registry_compiles_once_per_locale_and_falls_back_to_default():
+    registry = TemplateRegistry({"ready": {"en": "Order {order_id} ready", "te": "ఆర్డర్ {order_id} సిద్ధం"}})
+
+    assert registry.render("ready", "te", order_id="A") == "ఆర్డర్ A సిద్ధం"
+    assert registry.render("ready", "hi", order_id="A") == "Order A ready"
+    assert registry.get("ready", "te") is registry.get("ready", "te")
+    assert registry.render_batch("ready", [
+        {"order_id": "A"}, {"order_id": "B", "locale": "te"}
+    ]) == ["Order A ready", "ఆర్డర్ B సిద్ధం"]
+
+def test_every_configured_locale_renders_with_the_same_fields():
+    registry = get_template_registry()
+    for name, variants in registry.templates.items():
+        fields = {compile_template(source).fields for source in variants.values()}
+        assert len({frozenset(f) for f in fields}) == 1, name
+        assert {"en", "te", "hi"} <= set(variants), name
+
+def test_message_helpers_keep_english_text():
+    assert get_order_confirmation_message("ORD-1", 250) == "Your order ORD-1 has been confirmed! Total: ₹250.00. We'll notify you once it's ready."
+    assert get_order_ready_message("ORD-1", "Pickup", "hi") == "आपका ऑर्डर ORD-1 पिकअप के लिए तैयार है! कृपया इसे स्टोर से ले लें।"
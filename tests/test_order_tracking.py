@@ -0,0 +1,19 @@
+import pytest
+from backend import order_tracking
+
+def test_delta_only_sends_changed_fields():
+    """Test repeated publishes only carry what changed"""
+    first = order_tracking._delta("VP-1", {"s": "Paid", "at": "t1"})
+    repeat = order_tracking._delta("VP-1", {"s": "Paid", "at": "t2"})
+    delivery = order_tracking._delta("VP-1", {"s": "Paid", "t": "uber_direct_1", "at": "t3"})
+
+    assert first == {"o": "VP-1", "s": "Paid", "at": "t1"}
+    assert repeat is None
+    assert delivery == {"o": "VP-1", "t": "uber_direct_1", "at": "t3"}
+
+@pytest.mark.asyncio
+async def test_publish_without_subscribers_is_noop():
+    """Test publishing for an order nobody follows does no work"""
+    await order_tracking.publish_order_status("VP-unwatched", "Assigned")
+
+    assert "VP-unwatched" not in order_tracking._last_sent
@@ -0,0 +1,245 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from pymongo.errors import BulkWriteError
+from backend.payment_events import PaymentEventPipeline, EventQueueFull, EventNotStored, get_event_id
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, *args):
+        return self
+
+    def __aiter__(self):
+        self._it = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakePaymentEvents:
+    """Unique (gateway, event_id) like the real index"""
+    def __init__(self):
+        self.docs = {}
+        self.insert_calls = 0
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def insert_many(self, docs, ordered=True):
+        self.insert_calls += 1
+        errors = []
+        for i, doc in enumerate(docs):
+            key = (doc['gateway'], doc['event_id'])
+            if key in self.docs:
+                errors.append({"index": i, "code": 11000})
+            else:
+                self.docs[key] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+    async def update_one(self, query, update):
+        for doc in self.docs.values():
+            if doc['id'] == query['id']:
+                doc.update(update['$set'])
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.docs.values() if d['processed_at'] is None and d.get('failed_at') is None])
+
+def success(order_id):
+    return {"status": "success", "order_id": order_id, "payment_id": "pay_1", "amount": 100.0}
+
+def test_event_id_prefers_gateway_id_then_body_digest():
+    assert get_event_id("razorpay", {"X-Razorpay-Event-Id": "evt_1"}, {}, b"{}") == "evt_1"
+    assert get_event_id("payu", {}, {"id": "p1"}, b"{}") == "p1"
+    assert get_event_id("paytm", {}, {}, b"{}") == get_event_id("paytm", {}, {}, b"{}")
+
+def test_duplicates_dropped_before_queueing():
+    pipeline = PaymentEventPipeline(apply_event=None)
+
+    assert pipeline.submit("razorpay", "evt_1", {}, success("o1")) is True
+    assert pipeline.submit("razorpay", "evt_1", {}, success("o1")) is False
+    assert pipeline.queue.qsize() == 1
+
+    full = PaymentEventPipeline(apply_event=None, max_queue=1)
+    full.submit("razorpay", "evt_1", {}, success("o1"))
+    with pytest.raises(EventQueueFull):
+        full.submit("razorpay", "evt_2", {}, success("o1"))
+
+@pytest.mark.asyncio
+async def test_events_persisted_once_and_applied_in_order_per_payment():
+    applied = []
+
+    async def apply_event(event):
+        await asyncio.sleep(0.001 if event['event_id'].endswith("a") else 0)
+        applied.append(event['event_id'])
+
+    events = FakePaymentEvents()
+    pipeline = PaymentEventPipeline(apply_event, shards=4, flush_interval_s=60)
+    await pipeline.start(SimpleNamespace(payment_events=events))
+
+    for event_id in ["o1-a", "o1-b", "o2-a", "o1-c"]:
+        pipeline.submit("razorpay", event_id, {}, success(event_id.split("-")[0]))
+    # Already stored by an earlier process: dropped by the unique index, never applied
+    pipeline._seen.clear()
+    pipeline.submit("razorpay", "o1-a", {}, success("o1"))
+
+    await pipeline.stop()
+
+    assert events.insert_calls == 1
+    assert [e for e in applied if e.startswith("o1")] == ["o1-a", "o1-b", "o1-c"]
+    assert sorted(applied) == ["o1-a", "o1-b", "o1-c", "o2-a"]
+    assert pipeline.stats['duplicates'] == 1
+    assert all(doc['processed_at'] for doc in events.docs.values())
+
+@pytest.mark.asyncio
+async def test_unprocessed_events_replayed_on_start():
+    applied = []
+
+    async def apply_event(event):
+        applied.append(event['event_id'])
+
+    events = FakePaymentEvents()
+    events.docs[("razorpay", "evt_9")] = {
+        "id": "e9", "gateway": "razorpay", "event_id": "evt_9", "order_id": "o9",
+        "status": "success", "received_at": "2024-01-01T00:00:00", "processed_at": None
+    }
+    pipeline = PaymentEventPipeline(apply_event, flush_interval_s=60)
+    await pipeline.start(SimpleNamespace(payment_events=events))
+    await pipeline.stop()
+
+    assert applied == ["evt_9"]
+    assert pipeline.submit("razorpay", "evt_9", {}, success("o9")) is False
+
+class FlakyPaymentEvents(FakePaymentEvents):
+    """Fails (non-duplicate) every event whose id is in ``failing``"""
+    def __init__(self, failing):
+        super().__init__()
+        self.failing = set(failing)
+
+    async def insert_many(self, docs, ordered=True):
+        self.insert_calls += 1
+        errors = []
+        for i, doc in enumerate(docs):
+            if doc['event_id'] in self.failing:
+                errors.append({"index": i, "code": 91})
+            else:
+                self.docs[(doc['gateway'], doc['event_id'])] = doc
+        if errors:
+            raise BulkWriteError({"writeErrors": errors})
+
+@pytest.mark.asyncio
+async def test_failures_from_every_batch_retried_and_not_acknowledged():
+    async def apply_event(event):
+        pass
+
+    events = FlakyPaymentEvents({"evt_0", "evt_3"})
+    pipeline = PaymentEventPipeline(apply_event, batch_size=2, flush_interval_s=60)
+    pipeline._db = SimpleNamespace(payment_events=events)
+
+    waiting = [asyncio.create_task(pipeline.accept("razorpay", f"evt_{i}", {}, success(f"o{i}"))) for i in range(4)]
+    await asyncio.sleep(0)
+    await pipeline.flush()
+    results = await asyncio.gather(*waiting, return_exceptions=True)
+
+    assert [isinstance(r, EventNotStored) for r in results] == [True, False, False, True]
+    assert sorted(e['event_id'] for e in pipeline._retry) == ["evt_0", "evt_3"]
+    # The gateway's retry of a failed event is accepted again, not dropped as a duplicate
+    assert pipeline.submit("razorpay", "evt_3", {}, success("o3")) is True
+
+    events.failing.clear()
+    await pipeline.flush()
+    assert set(events.docs) == {("razorpay", f"evt_{i}") for i in range(4)}
+
+@pytest.mark.asyncio
+async def test_failed_apply_is_retried_then_marked_failed():
+    calls = {"ORD-1": 0, "ORD-2": 0}
+
+    async def apply_event(event):
+        calls[event['order_id']] += 1
+        if event['order_id'] == "ORD-2" or calls["ORD-1"] < 3:
+            raise RuntimeError("mongo unavailable")
+
+    events = FakePaymentEvents()
+    pipeline = PaymentEventPipeline(apply_event, flush_interval_s=60, max_attempts=4, retry_base_s=0.001, retry_max_s=0.005)
+    await pipeline.start(SimpleNamespace(payment_events=events))
+    pipeline.submit("razorpay", "evt_1", {}, success("ORD-1"))
+    pipeline.submit("razorpay", "evt_2", {}, success("ORD-2"))
+    await pipeline.flush()
+    for _ in range(200):
+        if not pipeline._retry_timers and all(q.empty() for q in pipeline._shard_queues):
+            break
+        await asyncio.sleep(0.005)
+    await pipeline.stop()
+
+    recovered, given_up = events.docs[("razorpay", "evt_1")], events.docs[("razorpay", "evt_2")]
+    assert calls == {"ORD-1": 3, "ORD-2": 4}
+    assert recovered['processed_at'] and recovered.get('failed_at') is None
+    assert given_up['processed_at'] is None and given_up['failed_at']
+    assert (given_up['attempts'], given_up['last_error']) == (4, "mongo unavailable")
+    assert (pipeline.stats['applied'], pipeline.stats['retried'], pipeline.stats['failed']) == (1, 5, 1)
+    # Not picked up again on the next start
+    assert [e for e in events.find({}).docs] == []
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setenv("MONGO_URL", "memory://")
+    monkeypatch.setenv("DB_NAME", "test")
+    import server
+    return server
+
+@pytest.mark.asyncio
+async def test_payment_confirmation_is_sent_in_the_order_language(server, monkeypatch):
+    sent = []
+
+    async def fake_publish(order_id, status):
+        pass
+
+    async def enqueue_whatsapp(recipient, message, order_id=None, critical=False):
+        sent.append(message)
+
+    async def enqueue_email(recipient, subject, message, order_id=None):
+        sent.append(subject)
+
+    monkeypatch.setattr(server, "publish_order_status", fake_publish)
+    monkeypatch.setattr(server.notification_dispatcher, "enqueue_whatsapp", enqueue_whatsapp)
+    monkeypatch.setattr(server.notification_dispatcher, "enqueue_email", enqueue_email)
+    await server.db.orders.insert_one({
+        "id": "ORD-TE", "status": "PaymentPending", "total": 120.0, "preferred_language": "te",
+        "customer_phone": "+919000000000", "customer_email": "c@example.com"
+    })
+
+    await server.apply_payment_event({"status": "success", "order_id": "ORD-TE"})
+
+    assert sent[0] == server.render_template("order_confirmed", "te", order_id="ORD-TE", total=120.0)
+    assert sent[1] == server.render_template("order_confirmed_subject", "te")
+    assert sent[0] != server.render_template("order_confirmed", "en", order_id="ORD-TE", total=120.0)
+
+@pytest.mark.asyncio
+async def test_signed_but_malformed_webhook_is_rejected_with_400(server, monkeypatch):
+    import httpx
+
+    class AcceptingVerifier:
+        def update(self, chunk):
+            pass
+
+        def verify(self, signature):
+            return True
+
+    def broken_handler(gateway, payload):
+        raise RuntimeError("secret internals")
+
+    monkeypatch.setattr(server, "create_webhook_verifier", lambda gateway: AcceptingVerifier())
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        malformed = await client.post("/api/webhooks/payment/razorpay", content=b"{not json")
+        not_an_object = await client.post("/api/webhooks/payment/razorpay", content=b"[1, 2]")
+        monkeypatch.setattr(server, "handle_payment_webhook", broken_handler)
+        failing = await client.post("/api/webhooks/payment/razorpay", content=b"{}")
+
+    assert (malformed.status_code, not_an_object.status_code) == (400, 400)
+    assert failing.status_code == 500
+    assert "secret internals" not in failing.text
@@ -0,0 +1,67 @@
+import asyncio
+import pytest
+from types import SimpleNamespace
+from pymongo.errors import DuplicateKeyError
+from backend import payment_sessions
+from backend.payment_sessions import PaymentSessionManager, session_idempotency_key
+
+class FakePaymentSessions:
+    """Enforces the partial unique index on open sessions"""
+    def __init__(self):
+        self.docs = []
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    async def find_one(self, query, projection=None):
+        await asyncio.sleep(0)
+        return next((dict(d) for d in self.docs if all(d.get(k) == v for k, v in query.items())), None)
+
+    async def insert_one(self, doc):
+        await asyncio.sleep(0)
+        if any(d['idempotency_key'] == doc['idempotency_key'] and d['status'] == "Pending" for d in self.docs):
+            raise DuplicateKeyError("duplicate idempotency_key")
+        self.docs.append(doc)
+
+@pytest.fixture
+def manager(monkeypatch):
+    gateway_calls = []
+    real_create = payment_sessions.create_payment_session
+
+    async def counting_create(order_id, amount):
+        gateway_calls.append(order_id)
+        return await real_create(order_id, amount)
+
+    monkeypatch.setattr(payment_sessions, "create_payment_session", counting_create)
+    monkeypatch.setattr(payment_sessions, "get_active_gateway", lambda: {"id": "razorpay", "mode": "SIMULATED"})
+    manager = PaymentSessionManager()
+    manager._db = SimpleNamespace(payment_sessions=FakePaymentSessions())
+    manager.gateway_calls = gateway_calls
+    return manager
+
+def test_idempotency_key():
+    assert session_idempotency_key("ORD-1", 250, "razorpay") == "ORD-1:250.00:razorpay"
+
+@pytest.mark.asyncio
+async def test_concurrent_requests_share_one_session(manager):
+    results = await asyncio.gather(*[manager.get_or_create("ORD-1", 250.0) for _ in range(5)])
+
+    assert len({session.id for session, _ in results}) == 1
+    assert sum(created for _, created in results) == 1
+    assert manager.gateway_calls == ["ORD-1"]
+
+    session, created = await manager.get_or_create("ORD-1", 250.0)
+    assert not created and manager.stats['cache_hits'] == 1
+
+@pytest.mark.asyncio
+async def test_open_session_reused_across_processes_and_amount_change_creates_new(manager):
+    first, _ = await manager.get_or_create("ORD-2", 100.0)
+    manager.invalidate("ORD-2")
+
+    again, created = await manager.get_or_create("ORD-2", 100.0)
+    assert again.id == first.id and not created
+    assert manager.stats['reused'] == 1
+
+    changed, created = await manager.get_or_create("ORD-2", 120.0)
+    assert created and changed.id != first.id
+    assert manager.gateway_calls == ["ORD-2", "ORD-2"]
@@ -0,0 +1,91 @@
+import hashlib
+import hmac
+import json
+import os
+import pytest
+from backend import payments
+
+RAW_CONFIG = {
+    "gateways": [
+        {"id": "razorpay", "name": "Razorpay", "enabled": True, "webhookSecret": "rzp_secret"},
+        {"id": "payu", "name": "PayU", "enabled": False, "webhookSecret": ""}
+    ],
+    "activeGateway": "razorpay",
+    "mode": "SIMULATED"
+}
+
+@pytest.fixture
+def config_file(tmp_path, monkeypatch):
+    path = tmp_path / "payment_gateways.json"
+    path.write_text(json.dumps(RAW_CONFIG))
+    monkeypatch.setattr(payments, "CONFIG_PATH", path)
+    monkeypatch.setattr(payments, "_payment_config", None)
+    return path
+
+def test_compiled_config_indexes_gateways_and_encodes_secrets(config_file):
+    config = payments.get_payment_config()
+
+    assert config.active_gateway_id == "razorpay"
+    assert config.get_gateway("razorpay").webhook_secret == b"rzp_secret"
+    assert payments.get_active_gateway()["mode"] == "SIMULATED"
+
+def test_hot_path_does_not_read_file(config_file, monkeypatch):
+    payments.get_payment_config()
+
+    def fail():
+        raise AssertionError("config file read on the hot path")
+
+    monkeypatch.setattr(payments, "load_payment_config", fail)
+    assert payments.get_active_gateway()["id"] == "razorpay"
+    assert payments.verify_webhook_signature("razorpay", b'{"event": "x"}', "sig")
+    assert payments.handle_payment_webhook("razorpay", {"status": "success"})["status"] == "success"
+
+def test_reload_only_when_file_changes(config_file):
+    payments.get_payment_config()
+    assert payments.reload_payment_config() is False
+
+    changed = {**RAW_CONFIG, "activeGateway": "payu"}
+    config_file.write_text(json.dumps(changed))
+    stat = config_file.stat()
+    os.utime(config_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+
+    assert payments.reload_payment_config() is True
+    assert payments.get_active_gateway()["id"] == "payu"
+
+def test_update_payment_settings_applies_immediately(config_file):
+    payments.get_payment_config()
+    payments.update_payment_settings("payu", "LIVE")
+
+    config = payments.get_payment_config()
+    assert (config.active_gateway_id, config.mode) == ("payu", "LIVE")
+    assert json.loads(config_file.read_text())["activeGateway"] == "payu"
+
+    with pytest.raises(ValueError):
+        payments.update_payment_settings("unknown", "LIVE")
+
+@pytest.fixture
+def live_config(config_file):
+    config_file.write_text(json.dumps({**RAW_CONFIG, "mode": "LIVE"}))
+    return config_file
+
+def test_signature_checked_on_raw_bytes(live_config):
+    # Whitespace/key order that json.dumps would not reproduce
+    body = b'{"event":"payment.captured",  "payload": {}}'
+    signature = hmac.new(b"rzp_secret", body, hashlib.sha256).hexdigest()
+
+    assert payments.verify_webhook_signature("razorpay", body, signature)
+    assert not payments.verify_webhook_signature("razorpay", body + b" ", signature)
+
+    verifier = payments.create_webhook_verifier("razorpay")
+    for i in range(0, len(body), 7):
+        verifier.update(body[i:i + 7])
+    assert verifier.verify(signature.upper())
+
+def test_gateway_without_secret_rejects_webhooks(live_config):
+    body = b"{}"
+    assert payments.create_webhook_verifier("payu") is None
+    assert not payments.verify_webhook_signature("payu", body, hmac.new(b"", body, hashlib.sha512).hexdigest())
+
+def test_signature_header_per_gateway():
+    assert payments.get_webhook_signature("razorpay", {"X-Razorpay-Signature": "abc"}) == "abc"
+    assert payments.get_webhook_signature("payu", {"X-Signature": "def"}) == "def"
@@ -0,0 +1,108 @@
+import time
+import pytest
+from backend.quote_aggregator import QuoteAggregator
+from backend.stub_servers import create_stub_partner_app, serve_stub
+from backend.models import VendorLocation
+
+PICKUP = VendorLocation(
+    latitude=12.9716,
+    longitude=77.5946,
+    address="MG Road",
+    city="Bangalore",
+    pincode="560001"
+)
+
+DROP = VendorLocation(
+    latitude=13.0358,
+    longitude=77.5970,
+    address="Hebbal",
+    city="Bangalore",
+    pincode="560024"
+)
+
+def live_partner(partner_id: str, base_url: str, **overrides) -> dict:
+    partner = {
+        "id": partner_id,
+        "name": partner_id.title(),
+        "enabled": True,
+        "mode": "LIVE",
+        "quoteUrl": f"{base_url}/quote",
+        "baseRate": 0.0,
+        "perKmRate": 0.0,
+        "minCharge": 0.0,
+        "maxDistanceKm": 25,
+        "estimatedTimeMinutes": 30
+    }
+    partner.update(overrides)
+    return partner
+
+@pytest.mark.asyncio
+async def test_simulated_partners_quoted_locally():
+    """Test SIMULATED partners are priced from the rate card without HTTP"""
+    aggregator = QuoteAggregator()
+    quotes = await aggregator.get_quotes(PICKUP, DROP)
+
+    assert len(quotes) > 0
+    assert aggregator.stats['requests'] == 0
+    for i in range(len(quotes) - 1):
+        assert quotes[i]['cost'] <= quotes[i + 1]['cost']
+
+@pytest.mark.asyncio
+async def test_slow_and_failing_partners_dropped_at_deadline():
+    """Test only partners answering in time are returned"""
+    fast_app = create_stub_partner_app(base_rate=50.0, per_km_rate=5.0, latency_ms=10)
+    slow_app = create_stub_partner_app(base_rate=10.0, per_km_rate=1.0, latency_ms=2000)
+    failing_app = create_stub_partner_app(failure_rate=1.0)
+
+    aggregator = QuoteAggregator(partner_timeout_s=0.3, deadline_s=0.5, hedge_after_s=10.0)
+
+    async with serve_stub(fast_app) as fast_url, serve_stub(slow_app) as slow_url, serve_stub(failing_app) as failing_url:
+        partners = [
+            live_partner("fast", fast_url),
+            live_partner("slow", slow_url),
+            live_partner("failing", failing_url)
+        ]
+        started = time.monotonic()
+        quotes = await aggregator.get_quotes(PICKUP, DROP, partners)
+        elapsed = time.monotonic() - started
+        await aggregator.close()
+
+    assert [q['partner_id'] for q in quotes] == ["fast"]
+    assert elapsed < 0.5 + 0.2
+    assert aggregator.stats['timeouts'] == 1
+    assert aggregator.stats['failures'] == 1
+
+@pytest.mark.asyncio
+async def test_hedged_request_rescues_slow_partner():
+    """Test a hedged duplicate answers when the first request stalls"""
+    app = create_stub_partner_app(latency_schedule_ms=[2000, 10])
+    aggregator = QuoteAggregator(partner_timeout_s=0.5, deadline_s=1.0, hedge_after_s=0.05)
+
+    async with serve_stub(app) as url:
+        quotes = await aggregator.get_quotes(PICKUP, DROP, [live_partner("hedged", url)])
+        await aggregator.close()
+
+    assert len(quotes) == 1
+    assert quotes[0]['partner_id'] == "hedged"
+    assert aggregator.stats['hedged'] == 1
+    assert aggregator.stats['requests'] == 2
+
+@pytest.mark.asyncio
+async def test_malformed_partner_response_only_drops_that_partner():
+    """Test a partner answering "cost": null misses its quote without failing the others"""
+    import httpx
+
+    def handler(request):
+        if request.url.host == "broken":
+            return httpx.Response(200, json={"cost": None})
+        return httpx.Response(200, json={"cost": 42.0})
+
+    aggregator = QuoteAggregator(partner_timeout_s=1.0, deadline_s=1.0)
+    aggregator._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    partners = [live_partner("broken", "http://broken"), live_partner("working", "http://working")]
+
+    quotes = await aggregator.get_quotes(PICKUP, DROP, partners)
+    await aggregator.close()
+
+    assert [(q['partner_id'], q['cost']) for q in quotes] == [("working", 42.0)]
+    assert aggregator.stats['failures'] == 1
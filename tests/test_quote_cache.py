@@ -0,0 +1,125 @@
+import asyncio
+import pytest
+from backend.quote_cache import QuoteCache, encode_geohash
+from backend.models import VendorLocation
+
+PICKUP = VendorLocation(
+    latitude=12.9716,
+    longitude=77.5946,
+    address="MG Road",
+    city="Bangalore",
+    pincode="560001"
+)
+
+def drop(latitude: float, longitude: float) -> VendorLocation:
+    return VendorLocation(latitude=latitude, longitude=longitude, address="Drop", city="Bangalore", pincode="560024")
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class CountingFetcher:
+    def __init__(self, delay: float = 0.0):
+        self.calls = 0
+        self.delay = delay
+
+    async def __call__(self, pickup, delivery):
+        self.calls += 1
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        return [{"partner_id": "p1", "cost": 50.0 + self.calls}]
+
+def test_encode_geohash():
+    """Test geohash encoding against a known reference value"""
+    assert encode_geohash(57.64911, 10.40744, 11) == "u4pruydqqvj"
+    # Two points ~100m apart share a precision-6 cell
+    assert encode_geohash(13.0358, 77.5970) == encode_geohash(13.0362, 77.5975)
+
+@pytest.mark.asyncio
+async def test_hit_within_ttl_and_cell():
+    """Test repeated quotes for the same vendor and cell hit the cache"""
+    cache = QuoteCache(ttl_s=60, stale_s=0, max_entries=10, precision=6, clock=FakeClock())
+    fetch = CountingFetcher()
+
+    first = await cache.get_quotes("v1", PICKUP, drop(13.0358, 77.5970), fetch)
+    second = await cache.get_quotes("v1", PICKUP, drop(13.0362, 77.5975), fetch)
+    await cache.get_quotes("v2", PICKUP, drop(13.0358, 77.5970), fetch)
+
+    assert first == second
+    assert fetch.calls == 2
+    stats = cache.get_stats()
+    assert stats['hits'] == 1
+    assert stats['misses'] == 2
+
+@pytest.mark.asyncio
+async def test_stale_while_revalidate():
+    """Test stale entries are served immediately while one refresh runs"""
+    clock = FakeClock()
+    cache = QuoteCache(ttl_s=60, stale_s=300, max_entries=10, precision=6, clock=clock)
+    fetch = CountingFetcher()
+    location = drop(13.0358, 77.5970)
+
+    await cache.get_quotes("v1", PICKUP, location, fetch)
+    clock.now = 120
+
+    stale = await cache.get_quotes("v1", PICKUP, location, fetch)
+    await cache.get_quotes("v1", PICKUP, location, fetch)
+    assert stale[0]['cost'] == 51.0
+
+    await asyncio.sleep(0.01)
+    refreshed = await cache.get_quotes("v1", PICKUP, location, fetch)
+
+    assert refreshed[0]['cost'] == 52.0
+    assert fetch.calls == 2
+    assert cache.get_stats()['refreshes'] == 1
+
+@pytest.mark.asyncio
+async def test_empty_results_are_not_cached():
+    """Test a fetch where every partner failed is retried on the next request"""
+    clock = FakeClock()
+    cache = QuoteCache(ttl_s=60, stale_s=300, max_entries=10, precision=6, clock=clock)
+    location = drop(13.0358, 77.5970)
+    partners_up = False
+
+    async def fetch(pickup, delivery):
+        return [{"partner_id": "p1", "cost": 50.0}] if partners_up else []
+
+    assert await cache.get_quotes("v1", PICKUP, location, fetch) == []
+    partners_up = True
+    assert await cache.get_quotes("v1", PICKUP, location, fetch) == [{"partner_id": "p1", "cost": 50.0}]
+
+    # An empty refresh keeps serving the stale quotes
+    partners_up = False
+    clock.now = 120
+    await cache.get_quotes("v1", PICKUP, location, fetch)
+    await asyncio.sleep(0.01)
+    assert await cache.get_quotes("v1", PICKUP, location, fetch) == [{"partner_id": "p1", "cost": 50.0}]
+    assert cache.get_stats()['empty'] == 2
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_single_flight():
+    """Test concurrent misses for one key share a single fetch"""
+    cache = QuoteCache(ttl_s=60, stale_s=0, max_entries=10, precision=6, clock=FakeClock())
+    fetch = CountingFetcher(delay=0.01)
+    location = drop(13.0358, 77.5970)
+
+    results = await asyncio.gather(*[cache.get_quotes("v1", PICKUP, location, fetch) for _ in range(5)])
+
+    assert fetch.calls == 1
+    assert all(r == results[0] for r in results)
+
+@pytest.mark.asyncio
+async def test_bounded_size_evicts_lru():
+    """Test the cache never grows beyond max_entries"""
+    cache = QuoteCache(ttl_s=60, stale_s=0, max_entries=2, precision=6, clock=FakeClock())
+    fetch = CountingFetcher()
+
+    for vendor_id in ["v1", "v2", "v3"]:
+        await cache.get_quotes(vendor_id, PICKUP, drop(13.0358, 77.5970), fetch)
+
+    stats = cache.get_stats()
+    assert stats['entries'] == 2
+    assert stats['evictions'] == 1
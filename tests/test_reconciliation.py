@@ -0,0 +1,129 @@
+import csv
+import pytest
+from types import SimpleNamespace
+from backend.reconciliation import (
+    run_reconciliation, read_settlement_rows, sort_settlement_runs, merge_settlement_runs,
+    MISSING_SESSION, MISSING_SETTLEMENT, AMOUNT_DIFFERS, STATUS_DIFFERS
+)
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[field])
+        return self
+
+    def batch_size(self, size):
+        return self
+
+    def __aiter__(self):
+        self._it = iter(self.docs)
+        return self
+
+    async def __anext__(self):
+        try:
+            return next(self._it)
+        except StopIteration:
+            raise StopAsyncIteration
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = docs or []
+        self.updates = []
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.docs if all(d.get(k) == v for k, v in query.items())])
+
+    async def insert_many(self, docs):
+        self.docs.extend(docs)
+
+    async def update_one(self, query, update, upsert=False):
+        self.updates.append(update['$set'])
+
+def write_report(path, rows):
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(["entity_id", "order_receipt", "amount", "type"])
+        writer.writerows(rows)
+
+def session(order_id, amount, status="Success", gateway="razorpay"):
+    return {"id": f"session_{order_id}", "order_id": order_id, "amount": amount, "status": status, "gateway": gateway}
+
+def test_external_sort_merges_runs_in_order(tmp_path):
+    report = tmp_path / "report.csv"
+    write_report(report, [[f"pay_{i}", f"order_{i % 97:03d}", 100, "settlement"] for i in range(500)])
+
+    runs = sort_settlement_runs(read_settlement_rows(str(report), "razorpay"), str(tmp_path), chunk_rows=64)
+    order_ids = [row['order_id'] for row in merge_settlement_runs(runs)]
+
+    assert len(runs) == 8
+    assert order_ids == sorted(order_ids)
+    assert len(order_ids) == 500
+
+@pytest.mark.asyncio
+async def test_reconciliation_reports_each_mismatch_type(tmp_path):
+    report = tmp_path / "report.csv"
+    write_report(report, [
+        ["pay_4", "order_4", 50000, "settlement"],   # no session
+        ["pay_1", "order_1", 25000, "settlement"],   # matches
+        ["pay_2", "order_2", 30000, "settlement"],   # amount differs
+        ["pay_3", "order_3", 10000, "settlement"],
+        ["pay_3", "order_3", 10000, "refund"],       # refunded at the gateway only
+    ])
+    sessions = FakeCollection([
+        session("order_1", 250.0),
+        session("order_2", 299.0),
+        session("order_3", 100.0),
+        session("order_5", 80.0),                    # paid but never settled
+        session("order_6", 80.0, status="Pending"),  # never paid, not expected in the report
+        session("order_7", 40.0, gateway="payu")
+    ])
+    db = SimpleNamespace(
+        payment_sessions=sessions,
+        reconciliation_runs=FakeCollection(),
+        reconciliation_mismatches=FakeCollection()
+    )
+
+    result = await run_reconciliation(db, str(report), "razorpay", chunk_rows=2)
+
+    found = {(m['type'], m['order_id']) for m in db.reconciliation_mismatches.docs}
+    assert found == {
+        (MISSING_SESSION, "order_4"),
+        (AMOUNT_DIFFERS, "order_2"),
+        (STATUS_DIFFERS, "order_3"),
+        (MISSING_SETTLEMENT, "order_5")
+    }
+    assert result['settlement_rows'] == 5
+    assert result['sessions'] == 5
+    assert result['matched'] == 1
+    assert db.reconciliation_runs.updates[-1]['status'] == "completed"
+
+@pytest.mark.asyncio
+async def test_malformed_rows_are_skipped_and_progress_is_recorded(tmp_path, monkeypatch):
+    from backend import reconciliation
+
+    monkeypatch.setattr(reconciliation, "PROGRESS_EVERY_ROWS", 1)
+    monkeypatch.setattr(reconciliation, "PROGRESS_INTERVAL_S", 0)
+    report = tmp_path / "report.csv"
+    write_report(report, [
+        ["pay_1", "order_1", 25000, "settlement"],
+        ["pay_2", "order_2", "n/a", "settlement"],
+        ["pay_3", "order_3", "nan", "settlement"],
+        ["pay_4", "order_4", 10000, "settlement"],
+    ])
+    db = SimpleNamespace(
+        payment_sessions=FakeCollection([session("order_1", 250.0), session("order_4", 100.0)]),
+        reconciliation_runs=FakeCollection(),
+        reconciliation_mismatches=FakeCollection()
+    )
+
+    result = await run_reconciliation(db, str(report), "razorpay")
+
+    assert (result['settlement_rows'], result['malformed_rows'], result['matched']) == (2, 2, 2)
+    progress = [update['progress'] for update in db.reconciliation_runs.updates if 'progress' in update]
+    assert [p['settlement_rows'] for p in progress] == [1, 2]
+    assert progress[0]['matched'] == 0 and 'mismatches' in progress[0]
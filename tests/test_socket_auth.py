@@ -0,0 +1,72 @@
+import asyncio
+import pytest
+from jose import jwt
+from backend import socketio_manager
+from backend.socket_auth import TokenCache, VendorDirectory
+from backend.vendor_auth import create_vendor_token, SECRET_KEY
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+def test_token_cache_decodes_once_until_expiry():
+    token = create_vendor_token("v1", "v1@example.com", "Vendor 1")
+    exp = jwt.get_unverified_claims(token)["exp"]
+    clock = FakeClock(exp - 60)
+    cache = TokenCache(clock=clock)
+
+    assert cache.decode(token)["sub"] == "v1"
+    assert cache.decode(token)["sub"] == "v1"
+    assert cache.stats == {"hits": 1, "decodes": 1, "rejected": 0}
+
+    # Past its exp the cached entry is dropped and the real decode rejects it
+    clock.now = exp + 1
+    cache.decode(token)
+    assert cache.stats["decodes"] == 2
+
+def test_token_cache_rejects_forged_and_non_vendor_tokens():
+    cache = TokenCache(max_entries=1)
+    forged = jwt.encode({"sub": "v1", "type": "vendor", "exp": 9999999999}, "wrong-secret", algorithm="HS256")
+    admin = jwt.encode({"sub": "a1", "role": "admin", "exp": 9999999999}, SECRET_KEY, algorithm="HS256")
+
+    assert cache.decode(forged) is None
+    assert cache.decode(admin) is None
+    assert cache.decode("not-a-token") is None
+    assert len(cache) == 0
+
+    cache.decode(create_vendor_token("v1", "v1@example.com", "Vendor 1"))
+    cache.decode(create_vendor_token("v2", "v2@example.com", "Vendor 2"))
+    assert len(cache) == 1
+
+@pytest.mark.asyncio
+async def test_reconnect_storm_is_one_vendor_query():
+    queries = []
+
+    async def fetch(vendor_ids):
+        queries.append(sorted(vendor_ids))
+        return {"v1", "v2"}
+
+    directory = VendorDirectory(fetch)
+    results = await asyncio.gather(*(directory.exists(v) for v in ["v1", "v2", "v1", "gone"]))
+
+    assert results == [True, True, True, False]
+    assert queries == [["gone", "v1", "v2"]]
+    assert await directory.exists("gone") is False
+    assert len(queries) == 1
+
+@pytest.mark.asyncio
+async def test_connect_refuses_a_claimed_vendor_id(monkeypatch):
+    import socketio
+    import socket_auth as server_socket_auth
+
+    async def fetch(vendor_ids):
+        return set(vendor_ids)
+
+    monkeypatch.setattr(server_socket_auth, "vendor_directory", VendorDirectory(fetch))
+
+    with pytest.raises(socketio.exceptions.ConnectionRefusedError):
+        await socketio_manager.connect("sid-1", {}, {"vendor_id": "v1"})
+    assert await server_socket_auth.authenticate({"token": create_vendor_token("v1", "a@b.c", "V")}) == "v1"
@@ -0,0 +1,102 @@
+import asyncio
+import shutil
+import tempfile
+import pytest
+import socketio
+from backend.socket_bus import UnixSocketPubSubManager, create_client_manager
+
+class RecordingManager(UnixSocketPubSubManager):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.received = []
+
+    async def _handle_emit(self, message):
+        self.received.append((message['event'], message['room'], message['data']))
+
+@pytest.fixture
+def bus_dir():
+    # Unix socket paths are limited to ~100 characters, so stay out of pytest's long tmp paths
+    path = tempfile.mkdtemp(prefix="sio", dir="/tmp")
+    yield path
+    shutil.rmtree(path, ignore_errors=True)
+
+@pytest.mark.asyncio
+async def test_emit_on_one_worker_reaches_the_other_workers(bus_dir):
+    receivers = [RecordingManager(bus_dir) for _ in range(2)]
+    listeners = []
+    for manager in receivers:
+        socketio.AsyncServer(async_mode='asgi', client_manager=manager)
+        await manager._start_listening()
+        listeners.append(asyncio.create_task(manager._thread()))
+
+    publisher = UnixSocketPubSubManager(bus_dir, write_only=True)
+    server = socketio.AsyncServer(async_mode='asgi', client_manager=publisher)
+    for i in range(3):
+        await server.emit('notification', {'seq': i}, room='vendor:v1')
+
+    for _ in range(100):
+        if all(len(m.received) == 3 for m in receivers):
+            break
+        await asyncio.sleep(0.01)
+
+    for manager in receivers:
+        assert manager.received == [('notification', 'vendor:v1', {'seq': i}) for i in range(3)]
+    for task in listeners:
+        task.cancel()
+    for manager in receivers + [publisher]:
+        await manager.close()
+
+@pytest.mark.asyncio
+async def test_sockets_of_dead_workers_are_removed(bus_dir):
+    stale = UnixSocketPubSubManager(bus_dir)
+    await stale._start_listening()
+    stale._server.close()
+    await stale._server.wait_closed()
+    stale.address.touch()
+
+    publisher = UnixSocketPubSubManager(bus_dir, write_only=True)
+    await publisher._publish({'method': 'emit'})
+
+    assert publisher.stats['dropped_peers'] == 1
+    assert not stale.address.exists()
+    await publisher.close()
+
+@pytest.mark.asyncio
+async def test_peer_that_stops_reading_does_not_stall_the_others(bus_dir):
+    stalled = asyncio.Event()
+
+    async def never_read(reader, writer):
+        await stalled.wait()
+        writer.close()
+
+    hung = UnixSocketPubSubManager(bus_dir)
+    hung_server = await asyncio.start_unix_server(never_read, path=str(hung.address))
+    healthy = RecordingManager(bus_dir)
+    socketio.AsyncServer(async_mode='asgi', client_manager=healthy)
+    await healthy._start_listening()
+    listener = asyncio.create_task(healthy._thread())
+
+    publisher = UnixSocketPubSubManager(bus_dir, write_only=True, send_timeout_s=0.1)
+    big = {'method': 'emit', 'event': 'e', 'room': None, 'namespace': '/', 'data': 'x' * 1_000_000}
+    for _ in range(5):
+        await asyncio.wait_for(publisher._publish(big), timeout=1)
+
+    assert publisher.stats['stalled_peers'] == 1
+    assert hung.address.name in publisher._suspended
+    for _ in range(200):
+        if len(healthy.received) == 5:
+            break
+        await asyncio.sleep(0.01)
+    assert len(healthy.received) == 5
+
+    stalled.set()
+    listener.cancel()
+    hung_server.close()
+    for manager in (healthy, publisher):
+        await manager.close()
+
+def test_message_queue_url_selects_the_manager(bus_dir):
+    assert create_client_manager(None) is None
+    assert isinstance(create_client_manager(f"unix://{bus_dir}"), UnixSocketPubSubManager)
+    with pytest.raises(ValueError):
+        create_client_manager("amqp://localhost")
@@ -0,0 +1,56 @@
+import asyncio
+import logging
+import pytest
+from backend.socket_sender import PacketBatcher, SamplingFilter
+
+class FakeSio:
+    def __init__(self):
+        self.emitted = []
+
+    async def emit(self, event, data, room=None):
+        self.emitted.append((event, room, data))
+
+@pytest.mark.asyncio
+async def test_events_in_one_tick_go_out_as_one_packet_per_room():
+    sio = FakeSio()
+    batcher = PacketBatcher(sio)
+
+    batcher.send("notification", {"id": 1}, room="vendor:v1")
+    batcher.send("notification_count", {"count": 1}, room="vendor:v1")
+    batcher.send("notification_count", {"count": 2}, room="vendor:v1")
+    batcher.send("notification", {"id": 2}, room="vendor:v2")
+    assert sio.emitted == []
+
+    await asyncio.sleep(0)
+    await batcher.drain()
+
+    assert sio.emitted == [
+        ("batch", "vendor:v1", {"events": [
+            {"event": "notification", "data": {"id": 1}},
+            {"event": "notification_count", "data": {"count": 2}}
+        ]}),
+        ("notification", "vendor:v2", {"id": 2})
+    ]
+    assert batcher.stats == {"events": 4, "packets": 2, "collapsed": 1}
+
+@pytest.mark.asyncio
+async def test_later_ticks_are_sent_separately():
+    sio = FakeSio()
+    batcher = PacketBatcher(sio)
+
+    batcher.send("notification", {"id": 1}, room="vendor:v1")
+    await batcher.drain()
+    batcher.send("notification", {"id": 2}, room="vendor:v1")
+    await batcher.drain()
+
+    assert [data["id"] for _, _, data in sio.emitted] == [1, 2]
+
+def test_sampling_keeps_one_in_n_but_every_warning():
+    sampler = SamplingFilter(10)
+
+    def record(level):
+        return logging.LogRecord("socketio.packets", level, __file__, 0, "packet", None, None)
+
+    kept = sum(sampler.filter(record(logging.INFO)) for _ in range(100))
+    assert kept == 10
+    assert all(sampler.filter(record(logging.WARNING)) for _ in range(5))
@@ -0,0 +1,242 @@
+import pytest
+from types import SimpleNamespace
+from backend import vendor_notifications
+from backend.memory_db import MemoryClient
+
+def matches(doc, query):
+    for key, cond in query.items():
+        if key == "$or":
+            if not any(matches(doc, q) for q in cond):
+                return False
+            continue
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            if "$gt" in cond and not (value is not None and value > cond["$gt"]):
+                return False
+            if "$lt" in cond and not (value is not None and value < cond["$lt"]):
+                return False
+            if "$in" in cond and value not in cond["$in"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+def evaluate(expr, doc):
+    """Just enough of the aggregation expression language for mark_read"""
+    if isinstance(expr, str) and expr.startswith("$"):
+        return doc.get(expr[1:])
+    if isinstance(expr, dict):
+        (op, args), = expr.items()
+        values = [evaluate(arg, doc) for arg in args]
+        if op == "$ifNull":
+            return values[0] if values[0] is not None else values[1]
+        if op == "$max":
+            return max(values)
+        if op == "$subtract":
+            return values[0] - values[1]
+    return expr
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction=None):
+        keys = key if isinstance(key, list) else [(key, direction)]
+        self.docs = sorted(self.docs, key=lambda d: tuple(d[k] for k, _ in keys), reverse=keys[0][1] < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return [dict(d) for d in self.docs[:length]]
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+        self.writes = 0
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.docs if matches(d, query)])
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.docs if matches(d, query)), None)
+
+    async def insert_one(self, doc):
+        self.writes += 1
+        self.docs.append(doc)
+
+    async def update_many(self, query, update):
+        hits = [d for d in self.docs if matches(d, query)]
+        for d in hits:
+            d.update(update["$set"])
+        return SimpleNamespace(modified_count=len(hits))
+
+    async def find_one_and_update(self, query, update, upsert=False, projection=None, return_document=None):
+        doc = next((d for d in self.docs if matches(d, query)), None)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = dict(query)
+            self.docs.append(doc)
+        if isinstance(update, list):
+            for stage in update:
+                doc.update({key: evaluate(expr, doc) for key, expr in stage["$set"].items()})
+        else:
+            for key, value in update["$inc"].items():
+                doc[key] = doc.get(key, 0) + value
+        return dict(doc)
+
+@pytest.fixture
+def db(monkeypatch):
+    database = SimpleNamespace(
+        vendors=FakeCollection([{"id": "v1"}, {"id": "v2"}]),
+        notifications=FakeCollection(),
+        broadcast_notifications=FakeCollection(),
+        counters=FakeCollection()
+    )
+    emitted = []
+
+    async def fake_notify_all_vendors(event_type, payload):
+        emitted.append(event_type)
+
+    async def fake_notify_vendor(vendor_id, event_type, payload, unread_count=None, critical=False, seq=None):
+        emitted.append((vendor_id, event_type, unread_count))
+
+    async def fake_append(vendor_id, event_type, payload):
+        return None
+
+    monkeypatch.setattr(vendor_notifications.socketio_manager, "notify_all_vendors", fake_notify_all_vendors)
+    monkeypatch.setattr(vendor_notifications.socketio_manager, "notify_vendor", fake_notify_vendor)
+    monkeypatch.setattr(vendor_notifications.vendor_outbox, "append", fake_append)
+    vendor_notifications.set_database(database)
+    database.emitted = emitted
+    return database
+
+async def add(vendor_id, created_at, **fields):
+    return await vendor_notifications.add_vendor_notification(vendor_id, {"type": "order", "created_at": created_at, **fields})
+
+@pytest.mark.asyncio
+async def test_broadcast_is_stored_once_and_merged_into_every_inbox(db):
+    await add("v1", "2026-01-01T00:00:00+00:00", id="n1")
+    await add("v2", "2026-01-01T00:00:00+00:00", id="n2")
+    broadcast = await vendor_notifications.create_broadcast({"type": "commission_change", "title": "Changed", "message": "10% -> 12%"})
+
+    assert db.broadcast_notifications.writes == 1
+    assert db.notifications.writes == 2
+    assert db.emitted == ["commission_change"]
+
+    for vendor_id, direct_id in (("v1", "n1"), ("v2", "n2")):
+        inbox = await vendor_notifications.get_vendor_notifications(vendor_id)
+        assert [n["id"] for n in inbox] == [broadcast["id"], direct_id]
+        assert inbox[0]["read"] is False
+        assert await vendor_notifications.get_unread_count(vendor_id) == 2
+
+@pytest.mark.asyncio
+async def test_read_cursor_is_per_vendor_and_only_moves_forward(db):
+    await vendor_notifications.create_broadcast({"type": "announcement", "title": "A", "message": "first"})
+    assert await vendor_notifications.mark_all_read("v1") == 0
+    await vendor_notifications.create_broadcast({"type": "announcement", "title": "B", "message": "second"})
+
+    assert await vendor_notifications.get_unread_count("v1") == 1
+    assert await vendor_notifications.get_unread_count("v2") == 2
+
+    await vendor_notifications.mark_read("v1", ids=[], broadcast_seq=0)
+    inbox = await vendor_notifications.get_vendor_notifications("v1", limit=2)
+    assert [n["read"] for n in inbox] == [False, True]
+
+@pytest.mark.asyncio
+async def test_broadcast_is_shown_in_the_vendor_language(db):
+    await vendor_notifications.create_broadcast({
+        "type": "commission_change", "title": "Changed", "message": "en",
+        "translations": {"te": {"title": "మార్చబడింది", "message": "te"}}
+    })
+
+    assert (await vendor_notifications.get_vendor_notifications("v1", locale="te"))[0]["message"] == "te"
+    assert (await vendor_notifications.get_vendor_notifications("v1", locale="hi"))[0]["message"] == "en"
+
+@pytest.mark.asyncio
+async def test_unread_count_is_kept_on_the_vendor_and_pushed_with_notifications(db):
+    await vendor_notifications.notify_vendor("v1", "order.new", {"orderId": "ORD-1", "summary": "2 file(s)"})
+    await vendor_notifications.notify_vendor("v1", "order.new", {"orderId": "ORD-2", "summary": "1 file(s)"})
+
+    assert db.emitted == [("v1", "order.new", 1), ("v1", "order.new", 2)]
+    assert db.vendors.docs[0]["unread_notifications"] == 2
+
+    first = (await vendor_notifications.get_vendor_notifications("v1"))[-1]
+    assert await vendor_notifications.mark_read("v1", ids=[first["id"], "unknown"]) == 1
+    assert await vendor_notifications.mark_read("v1", ids=[first["id"]]) == 1
+    assert await vendor_notifications.mark_all_read("v1") == 0
+
+    # Notifications stored before counting began never push the count below zero
+    await db.notifications.insert_one({"id": "legacy", "vendor_id": "v1", "read": False, "created_at": "2025-01-01"})
+    assert await vendor_notifications.mark_all_read("v1") == 0
+    assert db.vendors.docs[0]["unread_notifications"] == 0
+
+@pytest.mark.asyncio
+async def test_inbox_pages_through_direct_and_broadcast_notifications(db):
+    for day in range(1, 6):
+        await add("v1", f"2026-01-0{day}T00:00:00+00:00", id=f"n{day}")
+    db.broadcast_notifications.docs.append({"id": "broadcast_1", "seq": 1, "created_at": "2026-01-03T12:00:00+00:00"})
+
+    pages, before = [], None
+    while True:
+        page = await vendor_notifications.get_vendor_notifications("v1", limit=2, before=before)
+        pages.append([n["id"] for n in page])
+        if len(page) < 2:
+            break
+        before = vendor_notifications.page_cursor(page[-1])
+
+    assert pages == [["n5", "n4"], ["broadcast_1", "n3"], ["n2", "n1"], []]
+
+@pytest.mark.asyncio
+async def test_notifications_sharing_a_timestamp_are_not_skipped_between_pages(db):
+    for i in range(5):
+        await add("v1", "2026-01-01T00:00:00+00:00", id=f"n{i}")
+
+    seen, before = [], None
+    while True:
+        page = await vendor_notifications.get_vendor_notifications("v1", limit=2, before=before)
+        seen.extend(n["id"] for n in page)
+        if len(page) < 2:
+            break
+        before = vendor_notifications.page_cursor(page[-1])
+
+    assert seen == ["n4", "n3", "n2", "n1", "n0"]
+
+@pytest.mark.asyncio
+async def test_broadcast_cursor_cannot_pass_the_latest_broadcast(db):
+    await vendor_notifications.create_broadcast({"type": "announcement", "title": "A", "message": "first"})
+    assert await vendor_notifications.mark_read("v1", ids=[], broadcast_seq=10 ** 9) == 0
+
+    await vendor_notifications.create_broadcast({"type": "announcement", "title": "B", "message": "second"})
+    assert await vendor_notifications.get_unread_count("v1") == 1
+
+@pytest.mark.asyncio
+async def test_unread_state_migrated_once_from_the_old_layout():
+    database = MemoryClient()["test"]
+    await database.vendors.insert_many([{"id": "v1"}, {"id": "v2"}])
+    await database.vendor_notification_state.insert_one({"vendor_id": "v1", "broadcast_read_seq": 7})
+    await database.notifications.insert_many([
+        {"id": "n1", "vendor_id": "v2", "read": False},
+        {"id": "n2", "vendor_id": "v2", "read": False},
+        {"id": "n3", "vendor_id": "v2", "read": True}
+    ])
+    vendor_notifications.set_database(database)
+
+    assert await vendor_notifications.migrate_unread_state() is True
+    assert await vendor_notifications.migrate_unread_state() is False
+
+    v1, v2 = await database.vendors.find({}, {"_id": 0}).sort("id", 1).to_list(None)
+    assert v1 == {"id": "v1", "broadcast_read_seq": 7}
+    assert v2 == {"id": "v2", "unread_notifications": 2}
+
+@pytest.mark.asyncio
+async def test_new_vendor_starts_with_earlier_broadcasts_read(db):
+    await vendor_notifications.create_broadcast({"type": "announcement", "title": "A", "message": "before joining"})
+    db.vendors.docs.append({"id": "v3", **await vendor_notifications.initial_inbox_state()})
+
+    assert await vendor_notifications.get_unread_count("v3") == 0
+    await vendor_notifications.create_broadcast({"type": "announcement", "title": "B", "message": "after joining"})
+    assert await vendor_notifications.get_unread_count("v3") == 1
@@ -0,0 +1,164 @@
+import pytest
+from datetime import datetime, timezone, timedelta
+from types import SimpleNamespace
+from backend import socketio_manager, vendor_outbox
+from backend.connection_registry import ConnectionRegistry
+
+def matches(doc, query):
+    for key, cond in query.items():
+        value = doc.get(key)
+        if isinstance(cond, dict):
+            if value is None:
+                return False
+            if "$gte" in cond and not value >= cond["$gte"]:
+                return False
+            if "$gt" in cond and not value > cond["$gt"]:
+                return False
+            if "$lte" in cond and not value <= cond["$lte"]:
+                return False
+        elif value != cond:
+            return False
+    return True
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, key, direction):
+        self.docs = sorted(self.docs, key=lambda d: d[key], reverse=direction < 0)
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length):
+        return [dict(d) for d in self.docs[:length]]
+
+class FakeCollection:
+    def __init__(self, docs=None):
+        self.docs = list(docs or [])
+
+    def find(self, query, projection=None):
+        return FakeCursor([d for d in self.docs if matches(d, query)])
+
+    async def find_one(self, query, projection=None):
+        return next((dict(d) for d in self.docs if matches(d, query)), None)
+
+    async def insert_one(self, doc):
+        self.docs.append(doc)
+
+    async def delete_many(self, query):
+        self.docs = [d for d in self.docs if not matches(d, query)]
+
+    async def update_one(self, query, update):
+        matched = 0
+        for d in self.docs:
+            if matches(d, query):
+                matched += 1
+                for key, value in update["$max"].items():
+                    d[key] = max(d.get(key, value), value)
+        return SimpleNamespace(matched_count=matched)
+
+    async def find_one_and_update(self, query, update, projection=None, return_document=None):
+        doc = next((d for d in self.docs if matches(d, query)), None)
+        if doc is None:
+            return None
+        for key, value in update["$inc"].items():
+            doc[key] = doc.get(key, 0) + value
+        return dict(doc)
+
+@pytest.fixture
+def db(monkeypatch):
+    database = SimpleNamespace(vendors=FakeCollection([{"id": "v1"}]), vendor_outbox=FakeCollection())
+    vendor_outbox.set_database(database)
+    import vendor_outbox as server_vendor_outbox
+    server_vendor_outbox.set_database(database)
+    return database
+
+@pytest.mark.asyncio
+async def test_backlog_after_last_ack_skips_expired_offers(db):
+    assert await vendor_outbox.append("v1", "order.new", {"orderId": "A", "timeoutMinutes": 5}) == 1
+    assert await vendor_outbox.append("v1", "badge.upgrade", {"newBadge": "gold"}) == 2
+    assert await vendor_outbox.append("v1", "order.new", {"orderId": "B", "timeoutMinutes": 5}) == 3
+    assert await vendor_outbox.append("unknown", "order.new", {}) is None
+
+    # Offer A timed out while the vendor was away
+    db.vendor_outbox.docs[0]["expires_at"] = datetime.now(timezone.utc) - timedelta(seconds=1)
+
+    backlog, last_seq = await vendor_outbox.get_backlog("v1")
+    assert [(e["seq"], e["type"]) for e in backlog] == [(2, "badge.upgrade"), (3, "order.new")]
+    assert last_seq == 3
+
+    await vendor_outbox.ack("v1", 2)
+    backlog, last_seq = await vendor_outbox.get_backlog("v1")
+    assert [e["seq"] for e in backlog] == [3]
+    assert [d["seq"] for d in db.vendor_outbox.docs] == [3]
+
+    assert await vendor_outbox.get_backlog("v1", after_seq=3) == ([], 3)
+
+@pytest.mark.asyncio
+async def test_ack_past_the_last_seq_is_clamped(db):
+    await vendor_outbox.append("v1", "order.new", {"orderId": "A"})
+    await vendor_outbox.ack("v1", 1000)
+    assert db.vendors.docs[0]["outbox_acked_seq"] == 1
+
+    await vendor_outbox.append("v1", "order.new", {"orderId": "B"})
+    backlog, last_seq = await vendor_outbox.get_backlog("v1")
+    assert [e["data"]["orderId"] for e in backlog] == ["B"]
+    assert last_seq == 2
+
+    await vendor_outbox.ack("unknown", 5)
+
+@pytest.mark.asyncio
+async def test_storage_and_replay_stay_bounded(db, monkeypatch):
+    monkeypatch.setattr(vendor_outbox, "MAX_PER_VENDOR", 20)
+    monkeypatch.setattr(vendor_outbox, "MAX_REPLAY", 5)
+    monkeypatch.setattr(vendor_outbox, "TRIM_EVERY", 10)
+
+    for i in range(100):
+        await vendor_outbox.append("v1", "order.status", {"orderId": str(i)})
+
+    assert len(db.vendor_outbox.docs) <= 20 + 10
+    backlog, last_seq = await vendor_outbox.get_backlog("v1")
+    assert [e["seq"] for e in backlog] == [96, 97, 98, 99, 100]
+    assert last_seq == 100
+
+@pytest.mark.asyncio
+async def test_connect_replays_backlog_in_one_emit(db, monkeypatch):
+    import socket_auth
+    import vendor_notifications
+    from vendor_auth import create_vendor_token
+
+    emitted = []
+
+    async def fake_emit(event, data, room=None):
+        emitted.append((event, room, data))
+
+    async def fake_enter_room(sid, room):
+        pass
+
+    async def fake_unread_count(vendor_id):
+        return 2
+
+    async def fake_active_vendors(vendor_ids):
+        return set(vendor_ids)
+
+    monkeypatch.setattr(socketio_manager, "connections", ConnectionRegistry())
+    monkeypatch.setattr(socketio_manager.sio, "emit", fake_emit)
+    monkeypatch.setattr(socketio_manager.sio, "enter_room", fake_enter_room)
+    monkeypatch.setattr(vendor_notifications, "get_unread_count", fake_unread_count)
+    monkeypatch.setattr(socket_auth, "vendor_directory", socket_auth.VendorDirectory(fake_active_vendors))
+
+    await vendor_outbox.append("v1", "order.new", {"orderId": "A", "timeoutMinutes": 5})
+    await vendor_outbox.append("v1", "order.new", {"orderId": "B", "timeoutMinutes": 5})
+
+    await socketio_manager.connect("sid-1", {}, {"token": create_vendor_token("v1", "v1@example.com", "Vendor 1"), "last_seq": 1})
+
+    assert [(event, room) for event, room, _ in emitted] == [("notification_replay", "sid-1")]
+    replay = emitted[0][2]
+    assert [n["data"]["orderId"] for n in replay["notifications"]] == ["B"]
+    assert (replay["last_seq"], replay["unread_count"]) == (2, 2)
+
+    await socketio_manager.ack("sid-1", {"seq": 2})
+    assert db.vendor_outbox.docs == []